@@ -0,0 +1,349 @@
+"""GPX/TCX activity ingestion: distance, elevation gain and per-split EpH from a recorded track.
+
+Tracks are parsed incrementally through a callback parser so no DOM is built, reduced to coordinate
+arrays, and analysed with vectorized haversine / gain computations. Parsing
+and analysis run in a process pool so uploads never block the event loop.
+"""
+from __future__ import annotations
+from fastapi import APIRouter, Request, Query
+from pydantic import BaseModel
+from typing import List, Optional
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+import asyncio
+import io
+import math
+import os
+import xml.etree.ElementTree as ET
+
+from batch import eph_from_hours
+from boot import lazy_import
+from calculations import CalculationError, calculate_eph, hours_to_hms
+
+np = lazy_import("numpy")
+
+EARTH_RADIUS_KM = 6371.0088
+MAX_UPLOAD_BYTES = 50 * 1024 * 1024
+MAX_SMOOTHING_WINDOW = 301
+MAX_SPLITS = 10_000               # km-mode splits per track
+MAX_ABS_ELEVATION_M = 100_000.0   # altitudes beyond this are dropped like unparseable ones
+CLIMB_REVERSAL_M = 10.0           # dips smaller than this do not end a climb
+TRACK_WORKERS = int(os.environ.get("TRACK_WORKERS", os.cpu_count() or 1))
+
+# Error codes
+ERROR_UPLOAD_TOO_LARGE = "upload_too_large"
+ERROR_INVALID_TRACK = "invalid_track"
+ERROR_TOO_FEW_POINTS = "too_few_points"
+ERROR_NO_TIMESTAMPS = "no_timestamps"
+ERROR_INVALID_SPLIT = "invalid_split"
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+def get_pool() -> ProcessPoolExecutor:
+    """Process pool shared by all uploads, created on first use."""
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=TRACK_WORKERS)
+    return _pool
+
+def shutdown_pool() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+router = APIRouter(on_shutdown=[shutdown_pool])
+
+class SplitResult(BaseModel):
+    index: int
+    start_km: float
+    end_km: float
+    distance_km: float
+    elevation_gain_m: float
+    time: str
+    eph: Optional[float] = None
+
+class ActivityResponse(BaseModel):
+    point_count: int = 0
+    distance_km: float = 0.0
+    elevation_gain_m: float = 0.0
+    elapsed_time: str = ""
+    eph: Optional[float] = None
+    split: str = ""
+    splits: List[SplitResult] = []
+    error: str = ""              # Error code, empty string for no error
+
+POINT_TAGS = frozenset(("trkpt", "rtept", "Trackpoint"))
+FIELD_TAGS = frozenset(("ele", "time", "AltitudeMeters", "Time", "LatitudeDegrees", "LongitudeDegrees"))
+
+def parse_timestamp(text: Optional[str]) -> float:
+    if not text:
+        return math.nan
+    try:
+        moment = datetime.fromisoformat(text.strip())
+    except ValueError:
+        return math.nan
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.timestamp()
+
+def parse_float(text: Optional[str], limit: float = math.inf) -> float:
+    """float(text), or NaN for text that is not a finite number within +-limit ('inf', 'nan', junk)."""
+    try:
+        value = float(text)
+    except (TypeError, ValueError):
+        return math.nan
+    return value if abs(value) <= limit else math.nan
+
+class TrackPointTarget:
+    """XMLParser target collecting GPX trkpt/rtept and TCX Trackpoint fields.
+
+    Receives start/data/end callbacks as the document streams through the
+    parser, so no element tree is ever built; memory holds only the arrays.
+    """
+
+    def __init__(self):
+        self.lat, self.lon, self.ele, self.seconds = array("d"), array("d"), array("d"), array("d")
+        self.names = {}
+        self.fields = None
+        self.text = []
+
+    def local_name(self, tag: str) -> str:
+        name = self.names.get(tag)
+        if name is None:
+            name = self.names[tag] = tag.rpartition("}")[2]
+        return name
+
+    def start(self, tag, attrib):
+        name = self.local_name(tag)
+        if name in POINT_TAGS:
+            self.fields = {"lat": attrib.get("lat"), "lon": attrib.get("lon")}
+        elif self.fields is not None and name in FIELD_TAGS:
+            self.text = []
+
+    def data(self, data):
+        if self.fields is not None:
+            self.text.append(data)
+
+    def end(self, tag):
+        fields = self.fields
+        if fields is None:
+            return
+        name = self.local_name(tag)
+        if name in FIELD_TAGS:
+            fields[name] = "".join(self.text)
+            return
+        if name not in POINT_TAGS:
+            return
+        self.fields = None
+        lat = parse_float(fields.get("lat") or fields.get("LatitudeDegrees"), 90.0)
+        lon = parse_float(fields.get("lon") or fields.get("LongitudeDegrees"), 180.0)
+        if math.isnan(lat) or math.isnan(lon):
+            return
+        self.lat.append(lat)
+        self.lon.append(lon)
+        self.ele.append(parse_float(fields.get("ele") or fields.get("AltitudeMeters"), MAX_ABS_ELEVATION_M))
+        self.seconds.append(parse_timestamp(fields.get("time") or fields.get("Time")))
+
+    def close(self) -> dict:
+        return {
+            "lat": np.frombuffer(self.lat, dtype=np.float64),
+            "lon": np.frombuffer(self.lon, dtype=np.float64),
+            "ele": np.frombuffer(self.ele, dtype=np.float64),
+            "seconds": np.frombuffer(self.seconds, dtype=np.float64),
+        }
+
+def parse_track(source, chunk_size: int = 64 * 1024) -> dict:
+    """Stream a GPX/TCX document through a callback parser into lat, lon, ele and time arrays."""
+    parser = ET.XMLParser(target=TrackPointTarget())
+    for chunk in iter(lambda: source.read(chunk_size), b""):
+        parser.feed(chunk)
+    return parser.close()
+
+def haversine_km(lat: np.ndarray, lon: np.ndarray) -> np.ndarray:
+    """Great-circle distance in km between consecutive points."""
+    lat_rad, lon_rad = np.radians(lat), np.radians(lon)
+    a = (np.sin(np.diff(lat_rad) / 2) ** 2
+         + np.cos(lat_rad[:-1]) * np.cos(lat_rad[1:]) * np.sin(np.diff(lon_rad) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+def fill_gaps(values: np.ndarray) -> np.ndarray:
+    """Linearly interpolate NaN entries; all-NaN input becomes zeros."""
+    is_valid = ~np.isnan(values)
+    if is_valid.all():
+        return values
+    if not is_valid.any():
+        return np.zeros_like(values)
+    index = np.arange(len(values))
+    return np.interp(index, index[is_valid], values[is_valid])
+
+def smooth_elevation(ele: np.ndarray, window: int) -> np.ndarray:
+    """Centered moving average over window points to suppress barometric/GPS noise."""
+    if window <= 1 or len(ele) < 2:
+        return ele
+    window = min(window | 1, MAX_SMOOTHING_WINDOW)
+    half = window // 2
+    padded = np.pad(ele, half, mode="edge")
+    cumulative = np.concatenate(([0.0], np.cumsum(padded)))
+    return (cumulative[window:] - cumulative[:-window]) / window
+
+def distance_splits(cum_km: np.ndarray, step_km, step_gain, step_hours, split_km: float):
+    """Fixed-distance splits; each GPS step belongs to the split where it starts."""
+    total_km = cum_km[-1]
+    if not math.isfinite(total_km) or total_km / split_km > MAX_SPLITS:
+        raise CalculationError(ERROR_INVALID_SPLIT, f"split_km must give at most {MAX_SPLITS} splits")
+    count = max(int(np.ceil(total_km / split_km)), 1)
+    group_ids = np.minimum((cum_km[:-1] // split_km).astype(np.int64), count - 1)
+    km = np.bincount(group_ids, weights=step_km, minlength=count)
+    gain = np.bincount(group_ids, weights=step_gain, minlength=count)
+    hours = np.bincount(group_ids, weights=step_hours, minlength=count)
+    start_km = np.arange(count) * split_km
+    end_km = np.minimum(start_km + split_km, total_km)
+    return start_km, end_km, km, gain, hours
+
+def turning_points(ele: np.ndarray, reversal_m: float) -> List[int]:
+    """Indices of alternating low/high pivots, ignoring reversals smaller than reversal_m.
+
+    Local extrema are found vectorized; the hysteresis pass then only walks
+    those candidates, not every GPS point.
+    """
+    rise = np.diff(ele)
+    moving = np.flatnonzero(rise)
+    signs = np.sign(rise[moving])
+    changes = moving[np.flatnonzero(signs[1:] != signs[:-1]) + 1]
+    candidates = np.concatenate(([0], changes, [len(ele) - 1])).tolist()
+    values = ele[candidates].tolist()
+
+    pivots = []
+    lo = hi = extreme = 0
+    trend = 0
+    for k in range(1, len(values)):
+        v = values[k]
+        if trend == 0:
+            lo = k if v < values[lo] else lo
+            hi = k if v > values[hi] else hi
+            if values[hi] - values[lo] >= reversal_m:
+                trend = 1 if hi > lo else -1
+                pivots.append(lo if trend == 1 else hi)
+                extreme = hi if trend == 1 else lo
+        elif (v - values[extreme]) * trend > 0:
+            extreme = k
+        elif (values[extreme] - v) * trend >= reversal_m:
+            pivots.append(extreme)
+            extreme = k
+            trend = -trend
+    if trend != 0:
+        pivots.append(extreme)
+    return [candidates[k] for k in pivots]
+
+def climb_splits(cum_km: np.ndarray, cum_gain: np.ndarray, cum_hours: np.ndarray,
+                 ele: np.ndarray, min_climb_m: float):
+    """Low-to-high pivot segments of the smoothed profile that gain at least min_climb_m."""
+    pivots = np.asarray(turning_points(ele, CLIMB_REVERSAL_M), dtype=np.int64)
+    starts, ends = pivots[:-1], pivots[1:]
+    is_climb = ele[ends] > ele[starts]
+    starts, ends = starts[is_climb], ends[is_climb]
+    gain = cum_gain[ends] - cum_gain[starts]
+    keep = gain >= min_climb_m
+    starts, ends = starts[keep], ends[keep]
+    start_km, end_km = cum_km[starts], cum_km[ends]
+    return start_km, end_km, end_km - start_km, gain[keep], cum_hours[ends] - cum_hours[starts]
+
+def analyze_points(points: dict, split: str = "km", split_km: float = 1.0,
+                   smoothing: int = 5, min_climb_m: float = 50.0) -> dict:
+    """Distance, positive elevation gain, EpH and per-split EpH for parsed track arrays."""
+    lat, lon = points["lat"], points["lon"]
+    if len(lat) < 2:
+        return {"point_count": len(lat), "error": ERROR_TOO_FEW_POINTS}
+
+    ele = smooth_elevation(fill_gaps(points["ele"]), smoothing)
+    seconds = points["seconds"]
+    has_times = np.count_nonzero(~np.isnan(seconds)) >= 2
+    hours_at = fill_gaps(seconds) / 3600 if has_times else np.zeros(len(lat))
+
+    step_km = haversine_km(lat, lon)
+    rise = np.diff(ele)
+    step_gain = np.clip(rise, 0, None)
+    step_hours = np.clip(np.diff(hours_at), 0, None)
+    cum_km = np.concatenate(([0.0], np.cumsum(step_km)))
+
+    distance_km = float(cum_km[-1])
+    gain_m = float(step_gain.sum())
+    elapsed_hours = float(step_hours.sum())
+    if not (math.isfinite(distance_km) and math.isfinite(gain_m) and math.isfinite(elapsed_hours)):
+        return {"point_count": len(lat), "error": ERROR_INVALID_TRACK}
+    result = {
+        "point_count": len(lat),
+        "distance_km": round(distance_km, 3),
+        "elevation_gain_m": round(gain_m, 1),
+        "elapsed_time": hours_to_hms(elapsed_hours),
+        "split": split,
+        "splits": [],
+        "error": "",
+    }
+    if not has_times or elapsed_hours <= 0:
+        result["error"] = ERROR_NO_TIMESTAMPS
+        return result
+    result["eph"] = round(calculate_eph(distance_km, gain_m, result["elapsed_time"]), 2)
+
+    if split == "climb":
+        cum_gain = np.concatenate(([0.0], np.cumsum(step_gain)))
+        cum_hours = np.concatenate(([0.0], np.cumsum(step_hours)))
+        start_km, end_km, km, gain, hours = climb_splits(cum_km, cum_gain, cum_hours, ele, min_climb_m)
+    else:
+        try:
+            start_km, end_km, km, gain, hours = distance_splits(cum_km, step_km, step_gain, step_hours, split_km)
+        except CalculationError as e:
+            result["error"] = e.code
+            return result
+    eph = eph_from_hours(km, gain, hours)
+
+    result["splits"] = [
+        {
+            "index": i,
+            "start_km": round(s, 3),
+            "end_km": round(e, 3),
+            "distance_km": round(d, 3),
+            "elevation_gain_m": round(g, 1),
+            "time": hours_to_hms(h),
+            "eph": round(x, 2) if np.isfinite(x) else None,
+        }
+        for i, (s, e, d, g, h, x) in enumerate(zip(
+            start_km.tolist(), end_km.tolist(), km.tolist(), gain.tolist(), hours.tolist(), eph.tolist()))
+    ]
+    return result
+
+def valid_split_options(split: str, split_km: float, smoothing: int, min_climb_m: float) -> bool:
+    return (split in ("km", "climb") and math.isfinite(split_km) and split_km > 0 and smoothing >= 0
+            and math.isfinite(min_climb_m) and min_climb_m >= 0)
+
+def analyze_track(data: bytes, split: str = "km", split_km: float = 1.0,
+                  smoothing: int = 5, min_climb_m: float = 50.0) -> dict:
+    """Parse and analyse a GPX/TCX document; runs inside the process pool."""
+    try:
+        points = parse_track(io.BytesIO(data))
+    except ET.ParseError:
+        return {"error": ERROR_INVALID_TRACK}
+    return analyze_points(points, split, split_km, smoothing, min_climb_m)
+
+@router.post("/activity/analyze", response_model=ActivityResponse)
+async def analyze_activity(request: Request,
+                           split: str = Query("km", description="Split mode: km or climb"),
+                           split_km: float = Query(1.0, description="Split length in km for km mode"),
+                           smoothing: int = Query(5, description="Elevation moving-average window in points"),
+                           min_climb: float = Query(50.0, description="Minimum gain in m for climb mode")):
+    """Derive distance, elevation gain and EpH (total and per split) from an uploaded GPX/TCX track"""
+    if not valid_split_options(split, split_km, smoothing, min_climb):
+        return ActivityResponse(error=ERROR_INVALID_SPLIT)
+
+    body = bytearray()
+    async for chunk in request.stream():
+        body += chunk
+        if len(body) > MAX_UPLOAD_BYTES:
+            return ActivityResponse(error=ERROR_UPLOAD_TOO_LARGE)
+
+    loop = asyncio.get_running_loop()
+    result = await loop.run_in_executor(
+        get_pool(), analyze_track, bytes(body), split, split_km, smoothing, min_climb)
+    return ActivityResponse(**result)
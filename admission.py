@@ -0,0 +1,226 @@
+"""Admission control: a bounded number of requests in flight, admitted by priority.
+
+At most ADMISSION_MAX_IN_FLIGHT HTTP requests run at once in a worker.
+Excess requests wait in one FIFO queue per priority, and a freed slot always
+goes to the highest priority waiting. ADMISSION_RESERVED of the slots are
+kept for HIGH, so page renders and uploads can never take every slot from
+the cheap calculators; it must be below the limit, and a limit of 1 leaves
+no room for a reservation. EXEMPT requests (health checks, metrics, these stats,
+long-lived streams) are never queued or counted.
+
+The shedding signal is the queueing delay, the age of the oldest request
+waiting at the arriving request's priority or above. Once it passes ADMISSION_TARGET_MS times a per-priority factor, new
+requests of that priority are turned away at once with 503 and Retry-After,
+instead of joining a queue they would time out in. A request that does queue
+is shed after waiting a bounded multiple of the target. GET /admission/stats
+reports the queues, the recent queueing delays and the shed counts that
+drive these decisions. Limits apply per worker process.
+
+ADMISSION_MAX_IN_FLIGHT=0 disables admission control; app.py then does not
+install the middleware.
+"""
+from collections import deque
+from fastapi import APIRouter
+import asyncio
+import json
+import math
+import os
+import time
+
+from metrics import register_error_codes
+
+ADMISSION_MAX_IN_FLIGHT = int(os.environ.get("ADMISSION_MAX_IN_FLIGHT", "64"))
+_DEFAULT_RESERVED = max(1, ADMISSION_MAX_IN_FLIGHT // 8) if ADMISSION_MAX_IN_FLIGHT > 1 else 0
+ADMISSION_RESERVED = int(os.environ.get("ADMISSION_RESERVED", str(_DEFAULT_RESERVED)))
+ADMISSION_TARGET_MS = float(os.environ.get("ADMISSION_TARGET_MS", "50"))
+MAX_QUEUE = 1024                  # waiting requests per priority
+DELAY_WINDOW = 2048               # recent queueing delays kept for the stats
+MAX_RETRY_AFTER = 30              # seconds
+
+# Priorities, most important first
+EXEMPT, HIGH, NORMAL, LOW = range(4)
+PRIORITY_NAMES = ("exempt", "high", "normal", "low")
+SHED_FACTOR = (None, 4.0, 1.0, 0.5)   # shed on arrival once the queueing delay passes target * factor
+WAIT_FACTOR = (None, 10.0, 4.0, 2.0)  # shed a queued request after waiting target * factor
+
+EXEMPT_PATHS = frozenset(("/health", "/metrics", "/cache/stats", "/admission/stats"))
+HIGH_PATHS = frozenset(("/calculate", "/track/calculate", "/api/v1/eph", "/api/v1/track"))
+HIGH_PREFIXES = ("/static/",)
+LOW_PREFIXES = ("/results/", "/activity/", "/calculate/batch", "/jobs", "/debug/", "/api/v1/rankings/",
+                "/api/v1/events/sync")
+
+# Error code
+ERROR_OVERLOADED = "overloaded"
+register_error_codes(ERROR_OVERLOADED)
+
+def route_priority(method: str, path: str) -> int:
+    """Priority of a request, from its path alone so it is known before routing."""
+    if path in EXEMPT_PATHS:
+        return EXEMPT
+    if path in HIGH_PATHS or path.startswith(HIGH_PREFIXES):
+        return HIGH
+    if path.startswith(LOW_PREFIXES):
+        # A job's event stream stays open for the whole job; it would hold a slot for minutes
+        if method == "GET" and path.startswith("/jobs/") and path.endswith("/events"):
+            return EXEMPT
+        return LOW
+    return NORMAL
+
+class Shed(Exception):
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+class AdmissionController:
+    """Slots, per-priority wait queues and the queueing-delay statistics of one worker."""
+
+    def __init__(self, limit: int = ADMISSION_MAX_IN_FLIGHT, reserved: int = ADMISSION_RESERVED,
+                 target_ms: float = ADMISSION_TARGET_MS):
+        if limit > 0 and not 0 <= reserved < limit:
+            raise ValueError(f"reserved slots must be at least 0 and below the limit of {limit}")
+        self.limit = limit
+        self.target = target_ms / 1000
+        # Slots a priority may fill; HIGH alone may use the reserved ones
+        self.capacity = (limit, limit, limit - reserved, limit - reserved)
+        self.in_flight = 0
+        self.queues = tuple(deque() for _ in PRIORITY_NAMES)   # (enqueued_at, future), oldest first
+        self.delays = deque(maxlen=DELAY_WINDOW)               # seconds waited by recently admitted requests
+        self.admitted = [0] * len(PRIORITY_NAMES)
+        self.shed = {reason: [0] * len(PRIORITY_NAMES) for reason in ("delay", "timeout", "queue_full")}
+
+    def queue_delay(self, now: float, priority: int = LOW) -> float:
+        """Age of the oldest request waiting at priority or above, in seconds.
+
+        Those are the requests an arrival at priority waits behind; older
+        LOW requests do not make a HIGH request wait longer.
+        """
+        return max((now - queue[0][0] for queue in self.queues[HIGH:priority + 1] if queue), default=0.0)
+
+    def retry_after(self, delay: float) -> int:
+        return min(MAX_RETRY_AFTER, max(1, math.ceil(2 * max(delay, self.target))))
+
+    def reject(self, reason: str, priority: int, delay: float) -> Shed:
+        self.shed[reason][priority] += 1
+        return Shed(reason, self.retry_after(delay))
+
+    def has_waiting(self, priority: int) -> bool:
+        return any(self.queues[p] for p in range(HIGH, priority + 1))
+
+    async def acquire(self, priority: int) -> None:
+        """Wait for a slot, or raise Shed."""
+        if self.in_flight < self.capacity[priority] and not self.has_waiting(priority):
+            self.in_flight += 1
+            self.admitted[priority] += 1
+            self.delays.append(0.0)
+            return
+
+        now = time.perf_counter()
+        delay = self.queue_delay(now, priority)
+        if delay > self.target * SHED_FACTOR[priority]:
+            raise self.reject("delay", priority, delay)
+        queue = self.queues[priority]
+        if len(queue) >= MAX_QUEUE:
+            raise self.reject("queue_full", priority, delay)
+
+        entry = (now, asyncio.get_running_loop().create_future())
+        queue.append(entry)
+        try:
+            await asyncio.wait_for(entry[1], self.target * WAIT_FACTOR[priority])
+        except asyncio.TimeoutError:
+            if entry in queue:
+                queue.remove(entry)
+            raise self.reject("timeout", priority, time.perf_counter() - now)
+        except BaseException:
+            if entry in queue:
+                queue.remove(entry)
+            elif entry[1].done() and not entry[1].cancelled():
+                self.release()                                  # the slot was handed over; pass it on
+            raise
+        self.admitted[priority] += 1
+        self.delays.append(time.perf_counter() - now)
+
+    def release(self) -> None:
+        """Free a slot, handing it straight to the most important waiter that may use it."""
+        self.in_flight -= 1
+        for priority in range(HIGH, len(PRIORITY_NAMES)):
+            queue = self.queues[priority]
+            while queue and self.in_flight < self.capacity[priority]:
+                _, future = queue.popleft()
+                if not future.done():
+                    self.in_flight += 1
+                    future.set_result(None)
+                    return
+
+    def stats(self) -> dict:
+        now = time.perf_counter()
+        delays = sorted(self.delays)
+
+        def percentile(q: float) -> float:
+            return round(1000 * delays[min(len(delays) - 1, int(q * len(delays)))], 3) if delays else 0.0
+
+        return {
+            "limit": self.limit,
+            "reserved_for_high": self.limit - self.capacity[NORMAL],
+            "in_flight": self.in_flight,
+            "target_ms": round(1000 * self.target, 3),
+            "queue_delay_ms": round(1000 * self.queue_delay(now), 3),
+            "recent_delay_ms": {"window": len(delays), "p50": percentile(0.5), "p90": percentile(0.9),
+                                "p99": percentile(0.99), "max": percentile(1.0)},
+            "priorities": {
+                name: {"queued": len(self.queues[p]), "admitted": self.admitted[p],
+                       **{f"shed_{reason}": counts[p] for reason, counts in self.shed.items()}}
+                for p, name in enumerate(PRIORITY_NAMES)
+            },
+        }
+
+controller = AdmissionController()
+
+def admission_enabled() -> bool:
+    return ADMISSION_MAX_IN_FLIGHT > 0
+
+class AdmissionMiddleware:
+    """Pure ASGI middleware admitting HTTP requests through the controller."""
+
+    def __init__(self, app, controller: AdmissionController = controller):
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        priority = route_priority(scope["method"], scope["path"])
+        if priority == EXEMPT:
+            self.controller.admitted[EXEMPT] += 1
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            await self.controller.acquire(priority)
+        except Shed as e:
+            scope.setdefault("state", {})["error_code"] = ERROR_OVERLOADED
+            await send_overloaded(send, e)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.release()
+
+async def send_overloaded(send, shed: Shed) -> None:
+    body = json.dumps({"error": {"code": ERROR_OVERLOADED,
+                                 "message": f"Server is busy ({shed.reason}), retry in {shed.retry_after} s"}}).encode()
+    await send({"type": "http.response.start", "status": 503, "headers": [
+        (b"content-type", b"application/json"),
+        (b"content-length", str(len(body)).encode()),
+        (b"retry-after", str(shed.retry_after).encode()),
+        (b"cache-control", b"no-store"),
+    ]})
+    await send({"type": "http.response.body", "body": body})
+
+router = APIRouter()
+
+@router.get("/admission/stats")
+async def admission_stats():
+    """In-flight requests, wait queues, recent queueing delays and shed counts of this worker"""
+    return {"enabled": admission_enabled(), **controller.stats()}
@@ -0,0 +1,57 @@
+"""Ahead-of-time snapshots of the data the app precomputes at startup.
+
+Rendering and compressing the pages and serializing the pace tables is most
+of a cold start. Running `python aot.py` at image build time stores both in
+AOT_DIR; at boot they are loaded instead of rebuilt, as long as the key they
+were saved under (a hash of their sources) still matches.
+"""
+import hashlib
+import os
+import pickle
+import sys
+import time
+from typing import Any, Optional
+
+AOT_DIR = os.environ.get("AOT_DIR", "build")
+
+def file_key(*paths: str) -> str:
+    """Content hash of source files."""
+    digest = hashlib.sha256()
+    for path in paths:
+        with open(path, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+def snapshot_path(name: str) -> str:
+    return os.path.join(AOT_DIR, f"{name}.pickle")
+
+def load(name: str, key: str) -> Optional[Any]:
+    """Snapshot value saved under key, or None when missing, stale or unreadable."""
+    try:
+        with open(snapshot_path(name), "rb") as f:
+            saved_key, value = pickle.load(f)
+    except (OSError, EOFError, ValueError, TypeError, pickle.UnpicklingError, AttributeError, ImportError):
+        return None
+    return value if saved_key == key else None
+
+def save(name: str, key: str, value: Any) -> None:
+    os.makedirs(AOT_DIR, exist_ok=True)
+    path = snapshot_path(name)
+    with open(path + ".tmp", "wb") as f:
+        pickle.dump((key, value), f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(path + ".tmp", path)
+
+def main() -> None:
+    """Build every snapshot from the current sources."""
+    start = time.perf_counter()
+    import app
+    import lookup
+
+    lookup.build_pace_table(use_snapshot=False)
+    lookup.save_pace_table()
+    app.page_cache.build(use_snapshot=False)
+    app.page_cache.save_snapshot()
+    print(f"Wrote snapshots to {AOT_DIR}/ in {time.perf_counter() - start:.2f}s", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Versioned JSON API (/api/v1) for the calculators.
+
+Bodies are validated straight from bytes with pydantic-core and responses
+are serialized by it as well, skipping multipart form parsing and the
+jsonable_encoder round trip of the form endpoints. Errors carry stable codes.
+"""
+from fastapi import APIRouter, Request
+from fastapi.responses import Response
+from pydantic import BaseModel, ValidationError
+import math
+
+from calculations import CalculationError, ERROR_INVALID_MODE, ERROR_TIME_REQUIRED, ERROR_EPH_REQUIRED
+from models import EpHRequest, PaceRequest, ApiError, EpHApiResponse, PaceApiResponse
+from lookup import cached_calculate_eph, cached_calculate_time, pace_api_json
+from metrics import record_error, register_error_codes
+
+ERROR_INVALID_REQUEST = "invalid_request"
+register_error_codes(ERROR_INVALID_REQUEST)
+
+router = APIRouter(prefix="/api/v1")
+
+def json_response(model: BaseModel, status_code: int = 200) -> Response:
+    return Response(content=model.model_dump_json(), status_code=status_code, media_type="application/json")
+
+def request_body_schema(model) -> dict:
+    """OpenAPI requestBody for routes that validate the raw body themselves."""
+    return {"requestBody": {"required": True, "content": {"application/json": {"schema": model.model_json_schema()}}}}
+
+def validation_message(error: ValidationError) -> str:
+    first = error.errors()[0]
+    location = ".".join(str(part) for part in first["loc"])
+    return f"{location}: {first['msg']}" if location else first["msg"]
+
+@router.post("/eph", response_model=EpHApiResponse, openapi_extra=request_body_schema(EpHRequest))
+async def eph_v1(request: Request):
+    """Calculate EpH or estimated time from a JSON body"""
+    try:
+        payload = EpHRequest.model_validate_json(await request.body())
+    except ValidationError as e:
+        record_error(request, ERROR_INVALID_REQUEST)
+        return json_response(EpHApiResponse(error=ApiError(code=ERROR_INVALID_REQUEST, message=validation_message(e))), 400)
+
+    mode = payload.mode
+    try:
+        if mode == 'eph':
+            if not payload.time:
+                record_error(request, ERROR_TIME_REQUIRED)
+                return json_response(EpHApiResponse(mode=mode, error=ApiError(
+                    code=ERROR_TIME_REQUIRED, message="Time is required for EpH calculation")), 400)
+            eph = cached_calculate_eph(payload.distance, payload.elevation, payload.time)
+            if not math.isfinite(eph):
+                raise OverflowError("EpH out of range")
+            return json_response(EpHApiResponse(mode=mode, eph=eph, result=f"EpH = {eph:.2f}"))
+
+        if mode == 'time':
+            if payload.eph is None:
+                record_error(request, ERROR_EPH_REQUIRED)
+                return json_response(EpHApiResponse(mode=mode, error=ApiError(
+                    code=ERROR_EPH_REQUIRED, message="EpH value is required for time calculation")), 400)
+            time = cached_calculate_time(payload.distance, payload.elevation, payload.eph)
+            return json_response(EpHApiResponse(mode=mode, time=time, result=f"Estimated Time = {time}"))
+
+    except CalculationError as e:
+        record_error(request, e.code)
+        return json_response(EpHApiResponse(mode=mode, error=ApiError(code=e.code, message=str(e))), 400)
+    except (ValueError, OverflowError):
+        # Finite inputs whose result does not fit, as the form route answers them
+        record_error(request, ERROR_INVALID_REQUEST)
+        return json_response(EpHApiResponse(mode=mode, error=ApiError(
+            code=ERROR_INVALID_REQUEST, message="Please enter valid values")), 400)
+
+    record_error(request, ERROR_INVALID_MODE)
+    return json_response(EpHApiResponse(mode=mode, error=ApiError(
+        code=ERROR_INVALID_MODE, message="Invalid calculation mode")), 400)
+
+@router.post("/track", response_model=PaceApiResponse, openapi_extra=request_body_schema(PaceRequest))
+async def track_v1(request: Request):
+    """Calculate 400m time and splits from a JSON pace"""
+    try:
+        payload = PaceRequest.model_validate_json(await request.body())
+    except ValidationError as e:
+        record_error(request, ERROR_INVALID_REQUEST)
+        return json_response(PaceApiResponse(error=ApiError(code=ERROR_INVALID_REQUEST, message=validation_message(e))), 400)
+
+    try:
+        return Response(content=pace_api_json(payload.pace), media_type="application/json")
+    except CalculationError as e:
+        record_error(request, e.code)
+        return json_response(PaceApiResponse(error=ApiError(code=e.code, message=str(e))), 400)
@@ -1,12 +1,38 @@
 from fastapi import FastAPI, Request, Form, Query
-from fastapi.responses import HTMLResponse
-from fastapi.staticfiles import StaticFiles
-from fastapi.templating import Jinja2Templates
-from pydantic import BaseModel
+from fastapi.responses import HTMLResponse, Response
 from typing import Optional
-import re
 import os
 import uvicorn
+from calculations import (
+    hms_to_hours,
+    hours_to_hms,
+    parse_pace,
+    calculate_times,
+    format_time,
+    calculate_eph,
+    calculate_time,
+    ERROR_INVALID_MODE,
+    ERROR_TIME_REQUIRED,
+    ERROR_EPH_REQUIRED,
+)
+from models import EpHRequest, EpHResponse, PaceRequest, PaceResponse
+from pages import AssetStaticFiles, PageCache
+from lookup import build_pace_table, pace_response_json, cached_calculate_eph, cached_calculate_time, cache_stats
+from batch import router as batch_router
+from ingest import router as ingest_router
+from activity import router as activity_router
+from api import router as api_router
+from splits import router as splits_router
+from planner import router as planner_router
+from jobs import router as jobs_router
+from history import router as history_router
+from rankings import router as rankings_router
+from events import router as events_router
+from predictions import prediction_cache_stats, router as predictions_router
+from live import router as live_router
+from admission import AdmissionMiddleware, admission_enabled, router as admission_router
+from metrics import MetricsMiddleware, metrics_response, record_error
+from profiling import ProfilingMiddleware, profiling_enabled, router as profiling_router
 
 app = FastAPI(
     title="RunCals Pro",
@@ -14,9 +40,28 @@ app = FastAPI(
     version="1.2.0"
 )
 
-# Mount static files and templates
-templates = Jinja2Templates(directory="templates")
-app.mount("/static", StaticFiles(directory="static"), name="static")
+# Mount static files
+app.mount("/static", AssetStaticFiles(directory="static"), name="static")
+app.include_router(batch_router)
+app.include_router(ingest_router)
+app.include_router(activity_router)
+app.include_router(api_router)
+app.include_router(splits_router)
+app.include_router(planner_router)
+app.include_router(jobs_router)
+app.include_router(history_router)
+app.include_router(rankings_router)
+app.include_router(events_router)
+app.include_router(predictions_router)
+app.include_router(live_router)
+app.include_router(profiling_router)
+app.include_router(admission_router)
+if profiling_enabled():
+    app.add_middleware(ProfilingMiddleware)
+if admission_enabled():
+    app.add_middleware(AdmissionMiddleware)
+app.add_middleware(MetricsMiddleware)
+app.add_event_handler("startup", build_pace_table)
 
 # Translation dictionary for English and Traditional Chinese
 TRANSLATIONS = {
@@ -100,173 +145,28 @@ TRACK_TRANSLATIONS = {
     }
 }
 
-# Pydantic models for request validation
-class EpHRequest(BaseModel):
-    mode: str                    # 'eph' or 'time'
-    distance: float             # Distance in kilometers
-    elevation: float            # Elevation gain in meters
-    time: Optional[str]         # Time in hh:mm:ss format
-    eph: Optional[float]        # EpH value
-
-class EpHResponse(BaseModel):
-    result: str                 # Calculation result
-    error: str = ""            # Error message if any (empty string for no error)
-    
-    class Config:
-        # Ensure all fields are properly handled
-        extra = "forbid"
-        validate_assignment = True
-    
-    def __init__(self, **data):
-        # Ensure all fields are properly set
-        if 'result' not in data:
-            data['result'] = ""
-        if 'error' not in data:
-            data['error'] = ""
-        super().__init__(**data)
-
-# Track Calculator Models
-class PaceRequest(BaseModel):
-    pace: str
-
-class PaceResponse(BaseModel):
-    total_time_min: str = ""
-    total_time_sec: int = 0
-    split_100m: int = 0
-    split_200m: int = 0
-    split_300m: int = 0
-    split_400m: int = 0
-    error: str = ""
-    
-    class Config:
-        # Ensure all fields are properly handled
-        extra = "forbid"
-        validate_assignment = True
-    
-    def __init__(self, **data):
-        # Ensure all fields are properly set
-        if 'total_time_min' not in data:
-            data['total_time_min'] = ""
-        if 'total_time_sec' not in data:
-            data['total_time_sec'] = 0
-        if 'split_100m' not in data:
-            data['split_100m'] = 0
-        if 'split_200m' not in data:
-            data['split_200m'] = 0
-        if 'split_300m' not in data:
-            data['split_300m'] = 0
-        if 'split_400m' not in data:
-            data['split_400m'] = 0
-        if 'error' not in data:
-            data['error'] = ""
-        super().__init__(**data)
-
-def hms_to_hours(time_str: str) -> float:
-    """Convert hh:mm:ss or hh:mm format to hours (decimal)"""
-    pattern = r'^(\d+)(?::(\d{1,2}))?(?::(\d{1,2}))?$'
-    match = re.match(pattern, time_str.strip())
-    if not match:
-        raise ValueError("Invalid time format")
-    
-    hours = int(match.group(1))
-    minutes = int(match.group(2)) if match.group(2) else 0
-    seconds = int(match.group(3)) if match.group(3) else 0
-    
-    return hours + minutes/60 + seconds/3600
-
-def hours_to_hms(hours_decimal: float) -> str:
-    """Convert hours (decimal) to hh:mm:ss format"""
-    total_seconds = int(round(hours_decimal * 3600))
-    hours = total_seconds // 3600
-    minutes = (total_seconds % 3600) // 60
-    seconds = total_seconds % 60
-    return f"{hours:02d}:{minutes:02d}:{seconds:02d}"
-
-# Track Calculator Functions
-def parse_pace(pace_str: str) -> int:
-    """Convert pace string (M:SS or M) to seconds per kilometer."""
-    try:
-        if ":" in pace_str:
-            minutes, seconds = map(int, pace_str.split(":"))
-            
-            # Validate minutes and seconds
-            if minutes < 0:
-                raise ValueError("Minutes cannot be negative")
-            if minutes > 60:
-                raise ValueError("Minutes cannot exceed 60")
-            if seconds < 0 or seconds > 59:
-                raise ValueError("Seconds must be between 0 and 59")
-            
-            return minutes * 60 + seconds
-        else:
-            minutes = int(pace_str)
-            if minutes < 0:
-                raise ValueError("Minutes cannot be negative")
-            if minutes > 60:
-                raise ValueError("Minutes cannot exceed 60")
-            return minutes * 60
-    except ValueError as e:
-        if "invalid literal" in str(e):
-            raise ValueError("Invalid pace format. Use M:SS (e.g., '4:30') or M (e.g., '7').")
-        raise e
-
-def calculate_times(pace_seconds: int, distance_km: float = 0.4, split_distance_km: float = 0.1):
-    """Calculate total time for 400m and time per 100m."""
-    # Total time for 400 meters
-    total_seconds = pace_seconds * distance_km
-    total_minutes = int(total_seconds // 60)
-    total_rem_seconds = int(total_seconds % 60)
-    
-    # Time per 100 meters
-    split_seconds = pace_seconds * split_distance_km
-    
-    return total_seconds, total_minutes, total_rem_seconds, split_seconds
-
-def format_time(minutes: int, seconds: int) -> str:
-    """Format time as M:SS."""
-    return f"{minutes}:{seconds:02d}"
-
-def calculate_eph(distance_km: float, elevation_m: float, time_str: str) -> float:
-    """Calculate EpH given distance, elevation, and time"""
-    hours = hms_to_hours(time_str)
-    if hours <= 0:
-        raise ValueError("Time must be greater than 0")
-    
-    total_ep = distance_km + elevation_m / 100
-    return total_ep / hours
-
-def calculate_time(distance_km: float, elevation_m: float, eph: float) -> str:
-    """Calculate estimated time given distance, elevation, and EpH"""
-    if eph <= 0:
-        raise ValueError("EpH must be greater than 0")
-    
-    total_ep = distance_km + elevation_m / 100
-    hours = total_ep / eph
-    return hours_to_hms(hours)
+# Pages are rendered once per language and rebuilt only when templates or translations change
+page_cache = PageCache("templates", {
+    "index": ("index.html", TRANSLATIONS),
+    "track": ("index_track.html", TRACK_TRANSLATIONS),
+})
+app.add_event_handler("startup", page_cache.build)
 
 @app.get("/", response_class=HTMLResponse)
 async def index(request: Request, lang: str = Query("zh", description="Language preference")):
     """Main EpH Calculator page endpoint"""
     if lang not in ['en', 'zh']:
         lang = 'zh'
-    translations = TRANSLATIONS[lang]
     
-    return templates.TemplateResponse(
-        "index.html", 
-        {"request": request, "translations": translations, "lang": lang}
-    )
+    return page_cache.response("index", lang, request.headers)
 
 @app.get("/track", response_class=HTMLResponse)
 async def track_index(request: Request, lang: str = Query("zh", description="Language preference")):
     """400m Track Calculator page endpoint"""
     if lang not in ['en', 'zh']:
         lang = 'zh'
-    translations = TRACK_TRANSLATIONS[lang]
     
-    return templates.TemplateResponse(
-        "index_track.html", 
-        {"request": request, "translations": translations, "lang": lang}
-    )
+    return page_cache.response("track", lang, request.headers)
 
 @app.post("/calculate", response_model=EpHResponse)
 async def calculate(request: Request, mode: str = Form(...), 
@@ -278,22 +178,24 @@ async def calculate(request: Request, mode: str = Form(...),
     try:
         if mode == 'eph':
             if not time:
+                record_error(request, ERROR_TIME_REQUIRED)
                 return EpHResponse(result="", error="Time is required for EpH calculation")
-            result = calculate_eph(distance, elevation, time)
+            result = cached_calculate_eph(distance, elevation, time)
             return EpHResponse(result=f"EpH = {result:.2f}", error="")
         
         elif mode == 'time':
             if not eph:
+                record_error(request, ERROR_EPH_REQUIRED)
                 return EpHResponse(result="", error="EpH value is required for time calculation")
-            result = calculate_time(distance, elevation, eph)
+            result = cached_calculate_time(distance, elevation, eph)
             return EpHResponse(result=f"Estimated Time = {result}", error="")
         
         else:
+            record_error(request, ERROR_INVALID_MODE)
             return EpHResponse(result="", error="Invalid calculation mode")
     
     except ValueError as e:
-        if "Invalid time format" in str(e):
-            return EpHResponse(result="", error="Invalid time format")
+        record_error(request, getattr(e, "code", "other"))
         return EpHResponse(result="", error=str(e))
     
     except Exception as e:
@@ -303,25 +205,11 @@ async def calculate(request: Request, mode: str = Form(...),
 async def track_calculate(request: Request, pace: str = Form(...)):
     """Calculate 400m time and splits from pace"""
     try:
-        pace_seconds = parse_pace(pace)
-        total_seconds, total_minutes, total_rem_seconds, split_seconds = calculate_times(pace_seconds)
-        
-        # Calculate split times
-        split_100m = int(split_seconds)
-        split_200m = split_100m * 2
-        split_300m = split_100m * 3
-        split_400m = int(total_seconds)
-        
-        return PaceResponse(
-            total_time_min=format_time(total_minutes, total_rem_seconds),
-            total_time_sec=int(total_seconds),
-            split_100m=split_100m,
-            split_200m=split_200m,
-            split_300m=split_300m,
-            split_400m=split_400m
-        )
+        # Every reachable pace is pre-rendered at startup
+        return Response(content=pace_response_json(pace), media_type="application/json")
         
     except ValueError as e:
+        record_error(request, getattr(e, "code", "other"))
         return PaceResponse(
             total_time_min="",
             total_time_sec=0,
@@ -348,6 +236,16 @@ async def health_check():
     """Health check endpoint"""
     return {"status": "healthy", "service": "EpH Calculator Suite"}
 
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics: per-route request counts, error counts and latency histograms"""
+    return metrics_response()
+
+@app.get("/cache/stats")
+async def cache_statistics():
+    """Hit/miss counters for the calculator result caches"""
+    return {**cache_stats(), "predictions": prediction_cache_stats()}
+
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 8080))
     host = os.environ.get("HOST", "0.0.0.0")
@@ -0,0 +1,374 @@
+"""Offline batch runs over result archives: EpH, predicted times and track splits.
+
+    python archive.py eph results/20*.csv -o eph.csv
+    python archive.py time runners.ndjson --eph 7.5 -o predicted.ndjson
+    python archive.py splits plans.csv --lap-m 200 --split-m 50 -o splits.csv
+
+Every input file is cut at line boundaries into shards of at most --shard-mb,
+and a pool of --workers processes scores the shards with the vectorized
+calculators of the API (batch.py, splits.py). A worker reads its shard
+BLOCK_LINES lines at a time and appends each scored block to a part file of
+its own, so its memory is bounded by one block whatever the archive size.
+The master concatenates the part files in input order as shards finish and
+reports progress and throughput on stderr.
+
+Each output row is its input row with the result columns appended (CSV) or
+added as keys (NDJSON), in input order; rows that fail carry an error code
+instead of results. Distances may carry a unit ("50km", "26.2mi"). CSV inputs must
+share one header and quoted fields must not span lines. Gzipped inputs
+(.gz) cannot be cut and are one shard each.
+"""
+from __future__ import annotations
+import argparse
+import csv
+import gzip
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import List, NamedTuple, Optional
+
+from boot import lazy_import
+from batch import ERROR_INVALID_VALUE, calculate_eph_batch, calculate_time_batch
+from ingest import ERROR_MALFORMED_ROW
+from parsing import parse_distances, parse_paces
+from splits import format_clock, validate_plan
+
+np = lazy_import("numpy")
+
+MB = 1024 * 1024
+BLOCK_LINES = 20_000              # lines scored at a time by a worker
+SHARDS_PER_WORKER = 4             # on small inputs, cut shards finer so every worker gets some
+MIN_SHARD_BYTES = 1 * MB
+PROGRESS_INTERVAL = 1.0           # seconds between progress lines
+
+MODE_COLUMNS = {
+    "eph": ("distance", "elevation", "time"),
+    "time": ("distance", "elevation", "eph"),
+    "splits": ("pace", "distance_m"),
+}
+RESULT_COLUMNS = {
+    "eph": ("eph", "error"),
+    "time": ("predicted_time", "error"),
+    "splits": ("total_seconds", "total_time", "lap_seconds", "split_seconds", "split_count", "error"),
+}
+
+class Shard(NamedTuple):
+    index: int                    # position in the merged output
+    path: str
+    start: int                    # byte offset; the line containing it belongs to the previous shard
+    end: Optional[int]            # lines starting before end belong to this shard; None reads to EOF
+    size: int                     # bytes counted toward progress, the header included
+
+class Job(NamedTuple):
+    mode: str
+    input_format: str
+    columns: Optional[List[int]]  # CSV column indices of MODE_COLUMNS[mode]
+    eph: Optional[float]          # time mode: one target EpH for every row
+    lap_m: int
+    split_m: int
+    part_dir: str
+
+def input_format_of(path: str) -> str:
+    name = path[:-3] if path.endswith(".gz") else path
+    return "csv" if name.lower().endswith(".csv") else "ndjson"
+
+def open_input(path: str):
+    return gzip.open(path, "rb") if path.endswith(".gz") else open(path, "rb")
+
+def read_header(path: str) -> tuple:
+    """(header line as bytes, column names) of a CSV file."""
+    with open_input(path) as f:
+        line = f.readline()
+    names = next(csv.reader([line.decode("utf-8-sig")]), [])
+    return line, [name.strip().lower() for name in names]
+
+def plan_shards(paths: List[str], shard_bytes: int, header_bytes: dict) -> List[Shard]:
+    shards: List[Shard] = []
+    for path in paths:
+        size = os.path.getsize(path)
+        start = len(header_bytes.get(path, b""))
+        if path.endswith(".gz"):
+            shards.append(Shard(len(shards), path, start, None, size))
+            continue
+        offset, counted = start, 0
+        while True:
+            end = min(offset + shard_bytes, size)
+            shards.append(Shard(len(shards), path, offset, end, end - counted))
+            offset = counted = end
+            if end >= size:
+                break
+    return shards
+
+def iter_shard_lines(shard: Shard):
+    """Lines that start within [start, end), read through the file's buffer."""
+    with open_input(shard.path) as f:
+        if shard.end is None:
+            if shard.start:
+                f.readline()
+            yield from f
+            return
+        position = shard.start
+        if position > 0:
+            # Finish the line running across the boundary; it belongs to the previous shard
+            f.seek(position - 1)
+            position += len(f.readline()) - 1
+        while position < shard.end:
+            line = f.readline()
+            if not line:
+                break
+            position += len(line)
+            yield line
+
+def iter_blocks(lines, size: int):
+    block = []
+    for line in lines:
+        block.append(line)
+        if len(block) == size:
+            yield block
+            block = []
+    if block:
+        yield block
+
+def score_splits(pace: list, distance: list, lap_m: int, split_m: int) -> List[tuple]:
+    pace_seconds, codes = parse_paces(pace)
+    distance_m, distance_codes = parse_distances(distance, unit="m")
+    for i, meters in enumerate(distance_m.tolist()):
+        if codes[i] is None:
+            codes[i] = distance_codes[i] or validate_plan(meters, lap_m, split_m)
+
+    valid = np.array([code is None for code in codes], dtype=bool)
+    total = distance_m * pace_seconds / 1000
+    full = np.floor_divide(distance_m, split_m)
+    count = full + (distance_m - full * split_m > 1e-9)
+    clocks = iter(format_clock(total[valid]))
+    results = []
+    for i, code in enumerate(codes):
+        if code is not None:
+            results.append(("", "", "", "", "", code))
+            continue
+        results.append((round(float(total[i]), 2), next(clocks), round(lap_m * pace_seconds[i] / 1000, 2),
+                        round(split_m * pace_seconds[i] / 1000, 2), int(count[i]), ""))
+    return results
+
+def score(job: Job, values: List[list]) -> List[tuple]:
+    """Result tuples (RESULT_COLUMNS[job.mode]) for columns of raw input values."""
+    if job.mode == "eph":
+        distance, elevation, times = values
+        distance, distance_codes = parse_distances(distance)
+        eph, codes = calculate_eph_batch(distance, elevation, times)
+        codes = [distance_code or code for distance_code, code in zip(distance_codes, codes)]
+        return [("", code) if code else (value, "") for value, code in zip(eph.tolist(), codes)]
+    if job.mode == "time":
+        distance, elevation, eph = values
+        distance, distance_codes = parse_distances(distance)
+        if job.eph is not None:
+            eph = [job.eph] * len(distance)
+        times, codes = calculate_time_batch(distance, elevation, eph)
+        codes = [distance_code or code for distance_code, code in zip(distance_codes, codes)]
+        return [("", code) if code else (value, "") for value, code in zip(times, codes)]
+    return score_splits(*values, job.lap_m, job.split_m)
+
+def score_rows(job: Job, values: List[list]) -> List[tuple]:
+    """score, falling back to one row at a time when a block fails as a whole.
+
+    A row that fails on its own gets invalid_value, so one bad value never
+    costs the rest of its block or the shard.
+    """
+    try:
+        return score(job, values)
+    except Exception:
+        pass
+    failed = (*("",) * (len(RESULT_COLUMNS[job.mode]) - 1), ERROR_INVALID_VALUE)
+    results = []
+    for row in zip(*values):
+        try:
+            results.extend(score(job, [[value] for value in row]))
+        except Exception:
+            results.append(failed)
+    return results
+
+def process_csv_block(job: Job, lines: List[bytes]) -> tuple:
+    texts = [line.decode("utf-8", "replace").rstrip("\r\n") for line in lines]
+    texts = [text for text in texts if text.strip()]
+    width = max(job.columns)
+    # Results by input position; malformed rows get theirs now, the others once the block is scored
+    results: List[Optional[tuple]] = [None] * len(texts)
+    malformed = (*("",) * (len(RESULT_COLUMNS[job.mode]) - 1), ERROR_MALFORMED_ROW)
+    kept, values = [], [[] for _ in job.columns]
+    for i, fields in enumerate(csv.reader(texts)):
+        if len(fields) <= width:
+            results[i] = malformed
+            continue
+        kept.append(i)
+        for column, index in zip(values, job.columns):
+            column.append(fields[index])
+    for i, result in zip(kept, score_rows(job, values) if kept else []):
+        results[i] = result
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    for text, result in zip(texts, results):
+        buffer.write(text)
+        buffer.write(",")
+        writer.writerow(result)
+    return buffer.getvalue(), len(texts), len(texts) - len(kept)
+
+def process_ndjson_block(job: Job, lines: List[bytes]) -> tuple:
+    names = MODE_COLUMNS[job.mode]
+    # Output lines by input position; malformed rows get theirs now, records once the block is scored
+    out: List[Optional[str]] = []
+    kept, records = [], []
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            record = None
+        if isinstance(record, dict):
+            kept.append(len(out))
+            records.append(record)
+            out.append(None)
+        else:
+            text = line.decode("utf-8", "replace").strip()
+            out.append(json.dumps({"input": text, "error": ERROR_MALFORMED_ROW}, ensure_ascii=False))
+
+    result_names = RESULT_COLUMNS[job.mode]
+    values = [[record.get(name) for record in records] for name in names]
+    for i, record, result in zip(kept, records, score_rows(job, values) if records else []):
+        record.update((name, value if value != "" else None) for name, value in zip(result_names, result))
+        out[i] = json.dumps(record, ensure_ascii=False)
+    return "".join(line + "\n" for line in out), len(out), len(out) - len(records)
+
+def run_shard(job: Job, shard: Shard) -> tuple:
+    """Score one shard into its part file. Returns (shard, part path, rows, malformed rows)."""
+    process = process_csv_block if job.input_format == "csv" else process_ndjson_block
+    part = os.path.join(job.part_dir, f"{shard.index:08d}.part")
+    rows = malformed = 0
+    with open(part, "w", encoding="utf-8", newline="") as out:
+        for block in iter_blocks(iter_shard_lines(shard), BLOCK_LINES):
+            text, count, failed = process(job, block)
+            out.write(text)
+            rows += count
+            malformed += failed
+    return shard, part, rows, malformed
+
+class Progress:
+    def __init__(self, total_bytes: int, stream=sys.stderr):
+        self.total_bytes = total_bytes
+        self.stream = stream
+        self.started = time.perf_counter()
+        self.last = self.started
+        self.bytes = self.rows = self.malformed = 0
+
+    def add(self, size: int, rows: int, malformed: int) -> None:
+        self.bytes += size
+        self.rows += rows
+        self.malformed += malformed
+        now = time.perf_counter()
+        if now - self.last >= PROGRESS_INTERVAL and self.bytes < self.total_bytes:
+            self.last = now
+            self.report(final=False)
+
+    def report(self, final: bool) -> None:
+        elapsed = max(time.perf_counter() - self.started, 1e-9)
+        rate = self.bytes / elapsed
+        line = (f"{self.bytes / MB:,.1f}/{self.total_bytes / MB:,.1f} MB "
+                f"({100 * self.bytes / max(self.total_bytes, 1):.0f}%)  {self.rows:,} rows  "
+                f"{rate / MB:,.1f} MB/s  {self.rows / elapsed:,.0f} rows/s")
+        if final:
+            line += f"  {self.malformed:,} malformed  {elapsed:.1f} s"
+        elif rate > 0:
+            line += f"  eta {(self.total_bytes - self.bytes) / rate:.0f} s"
+        print(line, file=self.stream, flush=True)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Score result archives with the EpH, predicted time or split calculators.")
+    parser.add_argument("mode", choices=sorted(MODE_COLUMNS))
+    parser.add_argument("inputs", nargs="+", help="CSV (.csv) or NDJSON files, optionally gzipped")
+    parser.add_argument("-o", "--output", default="-", help="output file, '-' for stdout (default)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--shard-mb", type=float, default=64.0, help="largest shard a worker takes at once")
+    parser.add_argument("--eph", type=float, help="time mode: target EpH for every row instead of an eph column")
+    parser.add_argument("--lap-m", type=int, default=400, help="splits mode: lap length in meters")
+    parser.add_argument("--split-m", type=int, default=100, help="splits mode: split length in meters")
+    parser.add_argument("--quiet", action="store_true", help="no progress output")
+    args = parser.parse_args(argv)
+
+    formats = {input_format_of(path) for path in args.inputs}
+    if len(formats) > 1:
+        parser.error("inputs must be all CSV or all NDJSON")
+    args.input_format = formats.pop()
+    for path in args.inputs:
+        if not os.path.isfile(path):
+            parser.error(f"{path}: no such file")
+    if args.workers < 1 or args.shard_mb <= 0:
+        parser.error("--workers and --shard-mb must be positive")
+    return parser, args
+
+def main(argv=None) -> int:
+    parser, args = parse_args(argv)
+    required = [name for name in MODE_COLUMNS[args.mode] if not (name == "eph" and args.eph is not None)]
+
+    header_bytes, columns = {}, None
+    if args.input_format == "csv":
+        names = None
+        for path in args.inputs:
+            header_bytes[path], file_names = read_header(path)
+            if names is not None and file_names != names:
+                parser.error(f"{path}: header differs from {args.inputs[0]}")
+            names = file_names
+        missing = [name for name in required if name not in names]
+        if missing:
+            parser.error(f"{args.inputs[0]}: missing columns {', '.join(missing)}")
+        columns = [names.index(name) if name in names else 0 for name in MODE_COLUMNS[args.mode]]
+
+    total_bytes = sum(os.path.getsize(path) for path in args.inputs)
+    shard_bytes = max(MIN_SHARD_BYTES, min(int(args.shard_mb * MB), -(-total_bytes // (args.workers * SHARDS_PER_WORKER))))
+    shards = plan_shards(args.inputs, shard_bytes, header_bytes)
+
+    output_dir = os.path.dirname(os.path.abspath(args.output)) if args.output != "-" else None
+    part_dir = tempfile.mkdtemp(prefix="archive-", dir=output_dir)
+    job = Job(args.mode, args.input_format, columns, args.eph, args.lap_m, args.split_m, part_dir)
+    progress = Progress(total_bytes, stream=open(os.devnull, "w") if args.quiet else sys.stderr)
+
+    out = sys.stdout.buffer if args.output == "-" else open(args.output, "wb")
+    pool = ProcessPoolExecutor(max_workers=min(args.workers, len(shards)))
+    try:
+        if args.input_format == "csv":
+            header = next(iter(header_bytes.values())).decode("utf-8-sig").rstrip("\r\n")
+            out.write(f"{header},{','.join(RESULT_COLUMNS[args.mode])}\n".encode())
+
+        pending = {pool.submit(run_shard, job, shard) for shard in shards}
+        finished, next_index = {}, 0
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                shard, part, rows, malformed = future.result()
+                finished[shard.index] = part
+                progress.add(shard.size, rows, malformed)
+            # Append parts in input order as soon as the next one is ready
+            while next_index in finished:
+                part = finished.pop(next_index)
+                with open(part, "rb") as f:
+                    shutil.copyfileobj(f, out, 4 * MB)
+                os.remove(part)
+                next_index += 1
+        progress.report(final=True)
+    except BaseException:
+        pool.shutdown(wait=False, cancel_futures=True)
+        raise
+    finally:
+        pool.shutdown()
+        if out is not sys.stdout.buffer:
+            out.close()
+        shutil.rmtree(part_dir, ignore_errors=True)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,150 @@
+"""Vectorized batch EpH / estimated time calculations for whole race fields."""
+from __future__ import annotations
+from fastapi import APIRouter
+from pydantic import BaseModel
+from typing import Any, List, Optional
+
+from boot import lazy_import
+from calculations import (
+    ERROR_EPH_REQUIRED,
+    ERROR_NON_POSITIVE_TIME,
+    ERROR_NON_POSITIVE_EPH,
+)
+from parsing import parse_durations
+
+np = lazy_import("numpy")
+
+router = APIRouter()
+
+MAX_BATCH_ROWS = 100_000
+HMS_SECONDS_LIMIT = 2.0 ** 63       # hh:mm:ss formatting goes through int64 seconds
+
+# Per-row error code in addition to the calculation codes
+ERROR_INVALID_VALUE = "invalid_value"
+
+class BatchRequest(BaseModel):
+    mode: str                                   # 'eph' or 'time'
+    distance: List[Any]                         # Distances in kilometers
+    elevation: List[Any]                        # Elevation gains in meters
+    time: Optional[List[Any]] = None            # Times in hh:mm:ss format (mode 'eph')
+    eph: Optional[List[Any]] = None             # Target EpH values (mode 'time')
+
+class BatchResponse(BaseModel):
+    mode: str = ""
+    count: int = 0
+    error_count: int = 0
+    results: List[Any] = []                     # EpH floats or hh:mm:ss strings, None for failed rows
+    errors: List[Optional[str]] = []            # Per-row error code, None for valid rows
+    error: str = ""                             # Whole-request error, empty string for no error
+
+def to_float_array(values: List[Any]) -> np.ndarray:
+    """Convert a column to float64, mapping unparseable entries to NaN."""
+    try:
+        return np.asarray(values, dtype=np.float64)
+    except (TypeError, ValueError, OverflowError):
+        pass
+
+    column = np.empty(len(values), dtype=np.float64)
+    for i, value in enumerate(values):
+        try:
+            column[i] = float(value)
+        except (TypeError, ValueError, OverflowError):
+            column[i] = np.nan
+    return column
+
+def formattable_hours(hours: np.ndarray) -> np.ndarray:
+    """Mask of hours that hours_to_hms_array can format: finite, non-negative and within int64 seconds."""
+    with np.errstate(invalid="ignore", over="ignore"):
+        return np.isfinite(hours) & (hours >= 0) & (hours * 3600 < HMS_SECONDS_LIMIT)
+
+def hours_to_hms_array(hours: np.ndarray) -> List[Optional[str]]:
+    """Vectorized counterpart of hours_to_hms; None for hours outside formattable_hours."""
+    valid = formattable_hours(hours)
+    all_valid = bool(valid.all())
+    total_seconds = np.rint((hours if all_valid else np.where(valid, hours, 0.0)) * 3600).astype(np.int64)
+    h, rem = np.divmod(total_seconds, 3600)
+    m, s = np.divmod(rem, 60)
+    formatted = [f"{a:02d}:{b:02d}:{c:02d}" for a, b, c in zip(h.tolist(), m.tolist(), s.tolist())]
+    if all_valid:
+        return formatted
+    return [text if ok else None for text, ok in zip(formatted, valid.tolist())]
+
+def eph_from_hours(distance_km: np.ndarray, elevation_m: np.ndarray, hours: np.ndarray) -> np.ndarray:
+    """Vectorized EpH model, (distance + elevation/100) / hours; NaN or inf where hours <= 0."""
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        return (distance_km + elevation_m / 100) / hours
+
+def merge_codes(codes: List[Optional[str]], mask: np.ndarray, code: str) -> None:
+    """Set code on every row in mask that has no earlier error."""
+    for i in np.flatnonzero(mask).tolist():
+        if codes[i] is None:
+            codes[i] = code
+
+def calculate_eph_batch(distance: List[Any], elevation: List[Any], times: List[Any]):
+    """Vectorized calculate_eph over columns. Returns (eph, codes); eph is NaN for failed rows."""
+    distance_km = to_float_array(distance)
+    elevation_m = to_float_array(elevation)
+    hours, codes = parse_durations(times)
+
+    merge_codes(codes, ~(np.isfinite(distance_km) & np.isfinite(elevation_m)), ERROR_INVALID_VALUE)
+    merge_codes(codes, hours <= 0, ERROR_NON_POSITIVE_TIME)
+
+    eph = eph_from_hours(distance_km, elevation_m, hours)
+    merge_codes(codes, ~np.isfinite(eph), ERROR_INVALID_VALUE)
+    eph[[code is not None for code in codes]] = np.nan
+    return eph, codes
+
+def calculate_time_batch(distance: List[Any], elevation: List[Any], eph: List[Any]):
+    """Vectorized calculate_time over columns. Returns (times, codes); times is None for failed rows."""
+    distance_km = to_float_array(distance)
+    elevation_m = to_float_array(elevation)
+    eph_values = to_float_array(eph)
+    codes: List[Optional[str]] = [None] * len(eph_values)
+
+    merge_codes(codes, ~(np.isfinite(distance_km) & np.isfinite(elevation_m)), ERROR_INVALID_VALUE)
+    merge_codes(codes, np.isnan(eph_values), ERROR_EPH_REQUIRED)
+    merge_codes(codes, eph_values <= 0, ERROR_NON_POSITIVE_EPH)
+
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        hours = (distance_km + elevation_m / 100) / eph_values
+    merge_codes(codes, ~formattable_hours(hours), ERROR_INVALID_VALUE)
+
+    is_valid = np.array([code is None for code in codes], dtype=bool)
+    times: List[Optional[str]] = [None] * len(codes)
+    for i, formatted in zip(np.flatnonzero(is_valid).tolist(), hours_to_hms_array(hours[is_valid])):
+        times[i] = formatted
+    return times, codes
+
+def run_batch(payload: BatchRequest) -> BatchResponse:
+    count = len(payload.distance)
+    if count > MAX_BATCH_ROWS:
+        return BatchResponse(mode=payload.mode, error=f"Batch exceeds {MAX_BATCH_ROWS} rows")
+    if len(payload.elevation) != count:
+        return BatchResponse(mode=payload.mode, error="Column lengths do not match")
+
+    if payload.mode == 'eph':
+        if payload.time is None or len(payload.time) != count:
+            return BatchResponse(mode=payload.mode, error="Time column is required for EpH calculation")
+        eph, codes = calculate_eph_batch(payload.distance, payload.elevation, payload.time)
+        results = [None if code else value for value, code in zip(eph.tolist(), codes)]
+
+    elif payload.mode == 'time':
+        if payload.eph is None or len(payload.eph) != count:
+            return BatchResponse(mode=payload.mode, error="EpH column is required for time calculation")
+        results, codes = calculate_time_batch(payload.distance, payload.elevation, payload.eph)
+
+    else:
+        return BatchResponse(mode=payload.mode, error="Invalid calculation mode")
+
+    return BatchResponse(
+        mode=payload.mode,
+        count=count,
+        error_count=sum(code is not None for code in codes),
+        results=results,
+        errors=codes,
+    )
+
+@router.post("/calculate/batch", response_model=BatchResponse)
+async def calculate_batch(payload: BatchRequest):
+    """Calculate EpH or estimated time for whole columns of rows"""
+    return run_batch(payload)
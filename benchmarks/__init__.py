@@ -0,0 +1 @@
+"""Performance benchmarks. Run modules from the repository root, e.g. `python -m benchmarks.bench_batch`."""
@@ -0,0 +1,105 @@
+"""Minimal in-process ASGI driver: calls the app directly, no sockets or HTTP client."""
+import asyncio
+import time
+from typing import Callable, Iterable, Optional, Tuple
+
+class Result:
+    __slots__ = ("status", "headers", "body", "first_byte", "elapsed")
+
+    def __init__(self):
+        self.status = 0
+        self.headers = []
+        self.body = b""
+        self.first_byte = None
+        self.elapsed = 0.0
+
+async def request(
+    app,
+    method: str,
+    path: str,
+    query: str = "",
+    headers: Iterable[Tuple[str, str]] = (),
+    body_chunks: Iterable[bytes] = (),
+    on_body: Optional[Callable[[bytes], None]] = None,
+    keep_body: bool = True,
+) -> Result:
+    """Run one request through the ASGI app.
+
+    body_chunks is consumed lazily so large uploads never have to exist in
+    memory; on_body sees every response chunk, keep_body=False discards them.
+    """
+    result = Result()
+    chunks = iter(body_chunks)
+    pending = next(chunks, None)
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0", "spec_version": "2.3"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": query.encode(),
+        "root_path": "",
+        "headers": [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in headers],
+        "client": ("127.0.0.1", 50000),
+        "server": ("127.0.0.1", 8080),
+    }
+    body_parts = []
+    is_body_sent = False
+    response_done = asyncio.Event()
+    start = time.perf_counter()
+
+    async def receive():
+        nonlocal pending, is_body_sent
+        if is_body_sent:
+            await response_done.wait()
+            return {"type": "http.disconnect"}
+        chunk, pending = (pending or b""), next(chunks, None)
+        is_body_sent = pending is None
+        return {"type": "http.request", "body": chunk, "more_body": not is_body_sent}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            result.status = message["status"]
+            result.headers = message.get("headers", [])
+            return
+        if message["type"] != "http.response.body":
+            return
+        body = message.get("body", b"")
+        if body and result.first_byte is None:
+            result.first_byte = time.perf_counter() - start
+        if on_body is not None:
+            on_body(body)
+        if keep_body:
+            body_parts.append(body)
+        if not message.get("more_body", False):
+            response_done.set()
+
+    await app(scope, receive, send)
+    result.elapsed = time.perf_counter() - start
+    result.body = b"".join(body_parts)
+    return result
+
+class Lifespan:
+    """Runs the app's ASGI lifespan startup on enter and shutdown on exit."""
+
+    def __init__(self, app):
+        self.app = app
+        self.incoming: asyncio.Queue = asyncio.Queue()
+        self.outgoing: asyncio.Queue = asyncio.Queue()
+        self.task = None
+
+    async def __aenter__(self):
+        scope = {"type": "lifespan", "asgi": {"version": "3.0", "spec_version": "2.0"}, "state": {}}
+        self.task = asyncio.create_task(self.app(scope, self.incoming.get, self.outgoing.put))
+        await self.incoming.put({"type": "lifespan.startup"})
+        message = await self.outgoing.get()
+        if message["type"] != "lifespan.startup.complete":
+            raise RuntimeError(f"Lifespan startup failed: {message}")
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.incoming.put({"type": "lifespan.shutdown"})
+        await self.outgoing.get()
+        await self.task
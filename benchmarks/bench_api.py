@@ -0,0 +1,46 @@
+"""Per-request CPU cost of the JSON API against the form-encoded endpoints."""
+import asyncio
+import json
+import time
+from urllib.parse import urlencode
+
+from app import app
+from benchmarks.asgi import request
+from benchmarks.stats import summarize
+from lookup import build_pace_table
+
+REQUESTS = 3000
+
+FORM = [("content-type", "application/x-www-form-urlencoded")]
+JSON = [("content-type", "application/json")]
+
+CASES = {
+    "form /calculate": ("/calculate", FORM, urlencode({"mode": "eph", "distance": 50, "elevation": 2500, "time": "7:30"})),
+    "json /api/v1/eph": ("/api/v1/eph", JSON, json.dumps({"mode": "eph", "distance": 50, "elevation": 2500, "time": "7:30"})),
+    "form /track/calculate": ("/track/calculate", FORM, urlencode({"pace": "4:30"})),
+    "json /api/v1/track": ("/api/v1/track", JSON, json.dumps({"pace": "4:30"})),
+}
+
+async def measure(path: str, headers, body: str, count: int) -> dict:
+    payload = body.encode()
+    samples = []
+    cpu_start = time.process_time()
+    for _ in range(count):
+        result = await request(app, "POST", path, headers=headers, body_chunks=[payload])
+        samples.append(result.elapsed)
+    stats = summarize(samples)
+    stats["cpu_us_per_request"] = (time.process_time() - cpu_start) / count * 1e6
+    return stats
+
+def run(count: int = REQUESTS) -> dict:
+    build_pace_table()
+    return {name: asyncio.run(measure(path, headers, body, count)) for name, (path, headers, body) in CASES.items()}
+
+def main():
+    results = run()
+    print(f"Form vs JSON API, {REQUESTS} sequential requests each")
+    for name, stats in results.items():
+        print(f"  {name:<22} cpu {stats['cpu_us_per_request']:7.1f} us/req   p50 {stats['p50_us']:7.1f} us   p99 {stats['p99_us']:7.1f} us")
+
+if __name__ == "__main__":
+    main()
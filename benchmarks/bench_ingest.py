@@ -0,0 +1,82 @@
+"""Time-to-first-row, throughput and peak memory of the streaming results upload."""
+import asyncio
+import random
+import time
+import tracemalloc
+
+from app import app
+from benchmarks.asgi import request
+
+CHUNK_SIZE = 64 * 1024
+ROWS = 200_000
+MEMORY_ROWS = (20_000, 200_000)
+
+def csv_chunks(rows: int, seed: int = 7):
+    """Generate a results export lazily in CHUNK_SIZE pieces."""
+    rng = random.Random(seed)
+    tails = [
+        f"{rng.uniform(20, 170):.1f},{rng.randint(500, 10000)},{rng.randint(3, 46)}:{rng.randint(0, 59):02d}:{rng.randint(0, 59):02d}\n"
+        for _ in range(1024)
+    ]
+    buffer = ["bib,distance,elevation,time\n"]
+    size = len(buffer[0])
+    for bib in range(1, rows + 1):
+        line = f"{bib},{tails[bib % 1024]}"
+        buffer.append(line)
+        size += len(line)
+        if size >= CHUNK_SIZE:
+            yield "".join(buffer).encode()
+            buffer, size = [], 0
+    if buffer:
+        yield "".join(buffer).encode()
+
+async def upload(rows: int, output: str = "ndjson"):
+    """Returns (time to first result row, total elapsed) in seconds."""
+    header_lines = 1 if output == "csv" else 0
+    lines_seen = 0
+    first_row = None
+    start = time.perf_counter()
+
+    def on_body(body: bytes):
+        nonlocal lines_seen, first_row
+        lines_seen += body.count(b"\n")
+        if first_row is None and lines_seen > header_lines:
+            first_row = time.perf_counter() - start
+
+    result = await request(
+        app, "POST", "/results/stream", query=f"output={output}",
+        headers=[("content-type", "text/csv")],
+        body_chunks=csv_chunks(rows), on_body=on_body, keep_body=False,
+    )
+    return first_row, result.elapsed
+
+async def peak_memory(rows: int) -> int:
+    tracemalloc.start()
+    await upload(rows)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+def run(rows: int = ROWS) -> dict:
+    asyncio.run(upload(1000))  # warm up imports and code paths
+    results = {}
+    for output in ("ndjson", "csv"):
+        first_row, elapsed = asyncio.run(upload(rows, output))
+        results[output] = {
+            "time_to_first_row_ms": first_row * 1000,
+            "rows_per_sec": rows / elapsed,
+        }
+    results["peak_memory_bytes"] = {rows: asyncio.run(peak_memory(rows)) for rows in MEMORY_ROWS}
+    return results
+
+def main():
+    results = run()
+    print(f"Streaming results upload, {ROWS} rows in {CHUNK_SIZE // 1024} KiB chunks")
+    for output in ("ndjson", "csv"):
+        stats = results[output]
+        print(f"  {output:<7} first row {stats['time_to_first_row_ms']:7.2f} ms   {stats['rows_per_sec']:>12,.0f} rows/sec")
+    for rows, peak in results["peak_memory_bytes"].items():
+        print(f"  peak memory at {rows:>7,} rows: {peak / 1024:,.0f} KiB")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""Per-call latency of the pace lookup table and the LRU result caches against recomputing."""
+import asyncio
+import random
+import time
+from urllib.parse import urlencode
+
+from app import app
+from benchmarks.asgi import request
+from benchmarks.stats import summarize
+from calculations import parse_pace, calculate_eph
+from lookup import build_pace_table, build_pace_response, pace_response_json, cached_calculate_eph
+
+CALLS = 20_000
+ROUTE_CALLS = 2_000
+
+def time_calls(fn, inputs) -> list:
+    samples = []
+    clock = time.perf_counter
+    for value in inputs:
+        start = clock()
+        fn(value)
+        samples.append(clock() - start)
+    return samples
+
+def race_day_paces(count: int, seed: int = 3) -> list:
+    rng = random.Random(seed)
+    return [f"{rng.randint(3, 8)}:{rng.randint(0, 59):02d}" for _ in range(count)]
+
+def race_day_eph_inputs(count: int, seed: int = 5) -> list:
+    """Popular races and finish times repeat heavily, as on race morning."""
+    rng = random.Random(seed)
+    races = [(21.1, 1000), (50.0, 2500), (100.0, 5000), (170.0, 10000)]
+    return [(*rng.choice(races), f"{rng.randint(2, 30)}:{rng.choice((0, 15, 30, 45)):02d}") for _ in range(count)]
+
+async def route_latencies(paces: list) -> list:
+    samples = []
+    for pace in paces:
+        body = urlencode({"pace": pace}).encode()
+        result = await request(app, "POST", "/track/calculate",
+                               headers=[("content-type", "application/x-www-form-urlencoded")],
+                               body_chunks=[body])
+        samples.append(result.elapsed)
+    return samples
+
+def run() -> dict:
+    build_pace_table()
+    paces = race_day_paces(CALLS)
+    eph_inputs = race_day_eph_inputs(CALLS)
+    return {
+        "pace_recompute": summarize(time_calls(
+            lambda pace: build_pace_response(parse_pace(pace)).model_dump_json().encode(), paces)),
+        "pace_lookup": summarize(time_calls(pace_response_json, paces)),
+        "eph_recompute": summarize(time_calls(lambda args: calculate_eph(*args), eph_inputs)),
+        "eph_cached": summarize(time_calls(lambda args: cached_calculate_eph(*args), eph_inputs)),
+        "track_calculate_route": summarize(asyncio.run(route_latencies(paces[:ROUTE_CALLS]))),
+    }
+
+def main():
+    results = run()
+    print(f"Lookup table and result caches, {CALLS} calls")
+    for name, stats in results.items():
+        print(f"  {name:<22} p50 {stats['p50_us']:8.2f} us   p95 {stats['p95_us']:8.2f} us   p99 {stats['p99_us']:8.2f} us")
+    print(f"  pace p99 improvement: {results['pace_recompute']['p99_us'] / results['pace_lookup']['p99_us']:.1f}x")
+    print(f"  eph  p99 improvement: {results['eph_recompute']['p99_us'] / results['eph_cached']['p99_us']:.1f}x")
+
+if __name__ == "__main__":
+    main()
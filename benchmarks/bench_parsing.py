@@ -0,0 +1,238 @@
+"""Equivalence and speed of parsing.py against the implementations it replaced.
+
+The previous parsers are kept below verbatim as the reference. Every input
+of a generated corpus (valid values, edge cases, junk, non-ASCII digits) must
+give the same value or the same error code from both; any mismatch is
+printed and the run exits with status 1. Then per-call scalar latency and
+bulk column throughput are compared.
+"""
+import random
+import re
+import sys
+import time
+
+import numpy as np
+
+from benchmarks.bench_batch import best_rows_per_sec
+from parsing import (
+    CalculationError,
+    ERROR_INVALID_PACE_FORMAT,
+    ERROR_INVALID_TIME_FORMAT,
+    ERROR_PACE_OUT_OF_RANGE,
+    ERROR_TIME_REQUIRED,
+    parse_distance,
+    parse_distances,
+    parse_duration,
+    parse_durations,
+    parse_pace,
+    parse_paces,
+)
+
+CALLS = 200_000
+COLUMN_ROWS = 100_000
+REPEAT = 5
+
+# --- Reference implementations (calculations.py, batch.py, test2.py before parsing.py) ---
+
+def legacy_hms_to_hours(time_str: str) -> float:
+    pattern = r'^(\d+)(?::(\d{1,2}))?(?::(\d{1,2}))?$'
+    match = re.match(pattern, time_str.strip())
+    if not match:
+        raise CalculationError(ERROR_INVALID_TIME_FORMAT, "Invalid time format")
+
+    hours = int(match.group(1))
+    minutes = int(match.group(2)) if match.group(2) else 0
+    seconds = int(match.group(3)) if match.group(3) else 0
+
+    return hours + minutes/60 + seconds/3600
+
+def legacy_parse_pace(pace_str: str) -> int:
+    try:
+        if ":" in pace_str:
+            minutes, seconds = map(int, pace_str.split(":"))
+        else:
+            minutes, seconds = int(pace_str), 0
+    except ValueError:
+        raise CalculationError(ERROR_INVALID_PACE_FORMAT, "Invalid pace format. Use M:SS (e.g., '4:30') or M (e.g., '7').")
+
+    if minutes < 0:
+        raise CalculationError(ERROR_PACE_OUT_OF_RANGE, "Minutes cannot be negative")
+    if minutes > 60:
+        raise CalculationError(ERROR_PACE_OUT_OF_RANGE, "Minutes cannot exceed 60")
+    if seconds < 0 or seconds > 59:
+        raise CalculationError(ERROR_PACE_OUT_OF_RANGE, "Seconds must be between 0 and 59")
+
+    return minutes * 60 + seconds
+
+TIME_PATTERN = re.compile(r'^(\d+)(?::(\d{1,2}))?(?::(\d{1,2}))?$')
+
+def legacy_hms_to_hours_array(times):
+    hours = np.full(len(times), np.nan, dtype=np.float64)
+    codes = [None] * len(times)
+    match = TIME_PATTERN.match
+    for i, time_str in enumerate(times):
+        if time_str is None or time_str == "":
+            codes[i] = ERROR_TIME_REQUIRED
+            continue
+        parts = match(time_str.strip()) if isinstance(time_str, str) else None
+        if not parts:
+            codes[i] = ERROR_INVALID_TIME_FORMAT
+            continue
+        h, m, s = parts.groups()
+        hours[i] = int(h) + (int(m) if m else 0) / 60 + (int(s) if s else 0) / 3600
+    return hours, codes
+
+def legacy_parse_distance(distance_str):
+    """test2.py; only well-formed km inputs are compared, it accepts junk like '3kmkm'."""
+    distance_str = distance_str.lower().replace('km', '').strip()
+    return float(distance_str)
+
+# --- Corpus ---
+
+def duration_corpus(seed: int = 11) -> list:
+    rng = random.Random(seed)
+    values = [f"{rng.randint(0, 99)}:{rng.randint(0, 59):02d}:{rng.randint(0, 59):02d}" for _ in range(3000)]
+    values += [f"{rng.randint(0, 30)}:{rng.randint(0, 99)}" for _ in range(500)]
+    values += [str(rng.randint(0, 10 ** rng.randint(1, 18))) for _ in range(300)]
+    values += ["", " ", "  7:30 ", "\t1:02:03\n", "1:2:3", "1:", ":30", "1::2", "1:2:3:4", "1:234", "12:3:456",
+               "0", "00:00:00", "-1:00", "+1:00", "1.5", "1:30 ", "1 :30", "a", "1:3a", "١:٣٠", "１２:３０",
+               "²:30", "1:00\x00", "\x001:00", "1:0\x000", "99999999999999999999:00", "1" * 40, "7:30:00\n",
+               "1\n:30", "٣", "1_0:00"]
+    return values
+
+def pace_corpus(seed: int = 12) -> list:
+    rng = random.Random(seed)
+    values = [f"{rng.randint(0, 70)}:{rng.randint(0, 75):02d}" for _ in range(3000)]
+    values += [str(rng.randint(0, 80)) for _ in range(300)]
+    values += ["", " ", "4:30", " 4:30 ", "4 : 30", "+4:30", "-1:30", "4:-5", "4:3", "4:005", "4:30:00", ":30",
+               "4:", "60:59", "61:00", "60", "61", "4.5", "abc", "٤:٣٠", "４:３０", "1_0:00", "4:3_0", "²:30",
+               "4:30\n", "\t7"]
+    return values
+
+def distance_corpus(seed: int = 13) -> list:
+    rng = random.Random(seed)
+    values = [f"{round(rng.uniform(0.1, 200), rng.randint(0, 3))}{rng.choice(['', 'km', 'KM', 'Km', ' km', ' KM'])}"
+              for _ in range(2000)]
+    return values + ["3KM", "8km", "10 km", " 42.195km ", "5", "0.4KM", "100"]
+
+def outcome(fn, value):
+    try:
+        return fn(value), None
+    except CalculationError as e:
+        return None, e.code
+    except (AttributeError, TypeError) as e:
+        return None, type(e).__name__
+
+def check_scalar(name: str, new, old, values: list) -> int:
+    mismatches = 0
+    for value in values:
+        expected, got = outcome(old, value), outcome(new, value)
+        if expected != got:
+            mismatches += 1
+            if mismatches <= 10:
+                print(f"  MISMATCH {name}({value!r}): expected {expected}, got {got}")
+    return mismatches
+
+def same_column(a: np.ndarray, b: np.ndarray) -> bool:
+    return bool(np.array_equal(a, b, equal_nan=True))
+
+def check_bulk(values: list) -> int:
+    mismatches = 0
+    columns = [values, values + [None, 5, 7.5], list(reversed(values))]
+    for column in columns:
+        expected, got = legacy_hms_to_hours_array(column), parse_durations(column)
+        if not same_column(expected[0], got[0]) or expected[1] != got[1]:
+            mismatches += 1
+            for i, (a, b) in enumerate(zip(zip(*expected), zip(*got))):
+                if not (a[1] == b[1] and (a[0] == b[0] or (a[0] != a[0] and b[0] != b[0]))):
+                    print(f"  MISMATCH parse_durations({column[i]!r}): expected {a}, got {b}")
+                    break
+    return mismatches
+
+def check_paces_bulk(values: list) -> int:
+    seconds, codes = parse_paces(values)
+    mismatches = 0
+    for value, got, code in zip(values, seconds.tolist(), codes):
+        expected = outcome(legacy_parse_pace, value.strip())
+        if expected != (None if code else int(got), code):
+            mismatches += 1
+            if mismatches <= 10:
+                print(f"  MISMATCH parse_paces({value!r}): expected {expected}, got {(got, code)}")
+    return mismatches
+
+# Columns numpy would convert on its own but the scalar parser decides differently for
+MIXED_DISTANCE_COLUMNS = [["-0", "10"], ["-0", "10km"], [True, 5], [False], [-0.0, 5], [5, 2.5, "3km"],
+                          ["10", "1e3", " 7 "], [float("nan"), 1], [10 ** 400, 1], ["-1", 2]]
+
+def check_distances_bulk(columns: list) -> int:
+    mismatches = 0
+    for column in columns:
+        values, codes = parse_distances(column)
+        for value, got, code in zip(column, values.tolist(), codes):
+            expected = outcome(parse_distance, value if isinstance(value, str) else str(value))
+            if expected != (None if code else got, code):
+                mismatches += 1
+                print(f"  MISMATCH parse_distances({column!r}) at {value!r}: expected {expected}, got {(got, code)}")
+    return mismatches
+
+def check_equivalence() -> int:
+    durations, paces, distances = duration_corpus(), pace_corpus(), distance_corpus()
+    mismatches = check_scalar("parse_duration", parse_duration, legacy_hms_to_hours, durations + [None])
+    mismatches += check_scalar("parse_pace", parse_pace, legacy_parse_pace, paces + [None])
+    mismatches += check_scalar("parse_distance", parse_distance, legacy_parse_distance, distances)
+    mismatches += check_bulk(durations)
+    mismatches += check_paces_bulk(paces)
+    values, codes = parse_distances(distances)
+    mismatches += sum(got != legacy_parse_distance(value) for value, got in zip(distances, values.tolist()))
+    mismatches += any(codes)
+    mismatches += check_distances_bulk(MIXED_DISTANCE_COLUMNS)
+    print(f"Equivalence: {len(durations)} durations, {len(paces)} paces, {len(distances)} distances, "
+          f"{mismatches} mismatches")
+    return mismatches
+
+def micro_ns(fn, value, calls: int = CALLS) -> float:
+    best = float("inf")
+    for _ in range(REPEAT):
+        start = time.perf_counter_ns()
+        for _ in range(calls):
+            fn(value)
+        best = min(best, (time.perf_counter_ns() - start) / calls)
+    return best
+
+def race_times(rows: int, seed: int = 42) -> list:
+    rng = random.Random(seed)
+    return [f"{rng.randint(3, 46)}:{rng.randint(0, 59):02d}:{rng.randint(0, 59):02d}" for _ in range(rows)]
+
+def run(calls: int = CALLS, rows: int = COLUMN_ROWS) -> dict:
+    times = race_times(rows)
+    paces = [f"{random.Random(i).randint(3, 9)}:{i % 60:02d}" for i in range(rows)]
+    return {
+        "scalar ns": {
+            "hms_to_hours (regex)": micro_ns(legacy_hms_to_hours, "12:34:56", calls),
+            "parse_duration": micro_ns(parse_duration, "12:34:56", calls),
+            "parse_pace (old)": micro_ns(legacy_parse_pace, "4:30", calls),
+            "parse_pace": micro_ns(parse_pace, "4:30", calls),
+            "parse_distance (test2)": micro_ns(legacy_parse_distance, "10KM", calls),
+            "parse_distance": micro_ns(parse_distance, "10KM", calls),
+        },
+        "bulk rows/sec": {
+            "hms_to_hours_array (regex loop)": best_rows_per_sec(lambda: legacy_hms_to_hours_array(times), rows, REPEAT),
+            "parse_durations": best_rows_per_sec(lambda: parse_durations(times), rows, REPEAT),
+            "parse_pace loop": best_rows_per_sec(lambda: [legacy_parse_pace(p) for p in paces], rows, REPEAT),
+            "parse_paces": best_rows_per_sec(lambda: parse_paces(paces), rows, REPEAT),
+        },
+    }
+
+def main():
+    mismatches = check_equivalence()
+    results = run()
+    print(f"Scalar parsers, best of {REPEAT} x {CALLS} calls")
+    for name, ns in results["scalar ns"].items():
+        print(f"  {name:<34} {ns:8.1f} ns")
+    print(f"Bulk parsers, {COLUMN_ROWS} rows (best of {REPEAT})")
+    for name, rows_per_sec in results["bulk rows/sec"].items():
+        print(f"  {name:<34} {rows_per_sec:>14,.0f} rows/sec")
+    sys.exit(1 if mismatches else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""Cold-start report: import-time breakdown and time to first byte of serve.py.
+
+Time to first byte is measured from spawning a fresh `serve.py --workers 1`
+until the first byte of GET / arrives, with the AOT snapshots in AOT_DIR
+and with an empty snapshot directory (everything rendered at boot). Run
+`python aot.py` first to write the snapshots.
+"""
+import argparse
+import os
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+from benchmarks.bench_workers import free_port
+
+RUNS = 5
+TOP_PACKAGES = 12
+
+def import_breakdown() -> list:
+    """(package, cumulative ms) of the packages app imports, slowest first."""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import app"],
+                            capture_output=True, text=True, check=True)
+    totals = defaultdict(float)
+    pattern = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+    for line in result.stderr.splitlines():
+        match = pattern.match(line)
+        if match:
+            # Self time summed per top-level package gives a breakdown that adds up
+            totals[match.group(4).split(".")[0]] += int(match.group(1)) / 1000
+    return sorted(totals.items(), key=lambda item: -item[1])
+
+def first_byte(aot_dir: str) -> float:
+    """Seconds from spawning the server until the first byte of GET /."""
+    port = free_port()
+    env = dict(os.environ, AOT_DIR=aot_dir)
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "serve.py", "--workers", "1", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        env=env, stderr=subprocess.DEVNULL,
+    )
+    try:
+        while True:
+            try:
+                with socket.create_connection(("127.0.0.1", port), timeout=5) as sock:
+                    sock.sendall(b"GET / HTTP/1.1\r\nHost: bench\r\nAccept-Encoding: br, gzip\r\nConnection: close\r\n\r\n")
+                    if sock.recv(1):
+                        return time.perf_counter() - start
+            except OSError:
+                time.sleep(0.005)
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=RUNS)
+    args = parser.parse_args(argv)
+
+    breakdown = import_breakdown()
+    print(f"import app: {sum(ms for _, ms in breakdown):.0f} ms")
+    for package, ms in breakdown[:TOP_PACKAGES]:
+        print(f"  {package:<24} {ms:8.1f} ms")
+
+    from aot import AOT_DIR
+    with tempfile.TemporaryDirectory() as empty:
+        for label, aot_dir in (("with snapshots", AOT_DIR), ("without snapshots", empty)):
+            samples = sorted(first_byte(aot_dir) for _ in range(args.runs))
+            print(f"time to first byte {label:<18} median {samples[len(samples) // 2] * 1000:7.0f} ms   "
+                  f"min {samples[0] * 1000:7.0f} ms")
+
+if __name__ == "__main__":
+    main()
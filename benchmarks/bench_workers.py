@@ -0,0 +1,101 @@
+"""Throughput of serve.py over real sockets as the worker count grows.
+
+For each worker count a pre-forked server is started on a free port and
+driven by client processes that each keep one HTTP/1.1 connection alive and
+send requests back to back. Scaling efficiency is throughput relative to
+workers x single-worker throughput. Clients need CPU too, so on a host with
+C cores only counts up to about C/2 workers are meaningful.
+"""
+import argparse
+import multiprocessing
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+
+DURATION = 5.0
+PATH = "/track/calculate"
+BODY = b"pace=4%3A30"
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def wait_ready(port: int, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=1) as sock:
+                sock.sendall(b"GET /health HTTP/1.1\r\nHost: bench\r\nConnection: close\r\n\r\n")
+                if sock.recv(64).startswith(b"HTTP/1.1 200"):
+                    return
+        except OSError:
+            pass
+        time.sleep(0.1)
+    raise RuntimeError(f"server on port {port} did not become ready")
+
+def client(port: int, duration: float, counts) -> None:
+    """Send requests on one keep-alive connection until duration elapses."""
+    request = (f"POST {PATH} HTTP/1.1\r\nHost: bench\r\nContent-Type: application/x-www-form-urlencoded\r\n"
+               f"Content-Length: {len(BODY)}\r\n\r\n").encode() + BODY
+    sock = socket.create_connection(("127.0.0.1", port))
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    done = 0
+    deadline = time.monotonic() + duration
+    buffer = b""
+    while time.monotonic() < deadline:
+        sock.sendall(request)
+        while True:
+            head, sep, rest = buffer.partition(b"\r\n\r\n")
+            if sep:
+                length = int(head.lower().split(b"content-length:")[1].split(b"\r\n")[0])
+                if len(rest) >= length:
+                    buffer = rest[length:]
+                    break
+            buffer += sock.recv(65536)
+        done += 1
+    sock.close()
+    counts.put(done)
+
+def measure(workers: int, clients: int, duration: float) -> float:
+    port = free_port()
+    server = subprocess.Popen(
+        [sys.executable, "serve.py", "--workers", str(workers), "--port", str(port),
+         "--host", "127.0.0.1", "--log-level", "warning"],
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        wait_ready(port)
+        counts = multiprocessing.Queue()
+        procs = [multiprocessing.Process(target=client, args=(port, duration, counts)) for _ in range(clients)]
+        for proc in procs:
+            proc.start()
+        total = sum(counts.get() for _ in procs)
+        for proc in procs:
+            proc.join()
+        return total / duration
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait(timeout=60)
+
+def main(argv=None) -> None:
+    cores = os.cpu_count() or 1
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+",
+                        default=sorted({1, max(1, cores // 4), max(1, cores // 2)}))
+    parser.add_argument("--clients-per-worker", type=int, default=4)
+    parser.add_argument("--duration", type=float, default=DURATION)
+    args = parser.parse_args(argv)
+
+    print(f"serve.py scaling on {cores} cores, POST {PATH}, {args.duration:.0f}s per run")
+    base = None
+    for workers in args.workers:
+        rps = measure(workers, workers * args.clients_per_worker, args.duration)
+        base = base or rps / workers
+        print(f"  {workers:>3} workers  {rps:10.0f} req/s   efficiency {rps / (workers * base):6.1%}")
+
+if __name__ == "__main__":
+    main()
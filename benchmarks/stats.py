@@ -0,0 +1,19 @@
+"""Latency summary helpers shared by the benchmarks."""
+from typing import Dict, List
+
+def percentile(sorted_samples: List[float], q: float) -> float:
+    """Nearest-rank percentile of an already sorted sample list."""
+    if not sorted_samples:
+        return 0.0
+    rank = min(len(sorted_samples) - 1, max(0, int(round(q / 100 * len(sorted_samples) + 0.5)) - 1))
+    return sorted_samples[rank]
+
+def summarize(samples_sec: List[float]) -> Dict[str, float]:
+    """p50/p95/p99/max in microseconds."""
+    ordered = sorted(samples_sec)
+    return {
+        "p50_us": percentile(ordered, 50) * 1e6,
+        "p95_us": percentile(ordered, 95) * 1e6,
+        "p99_us": percentile(ordered, 99) * 1e6,
+        "max_us": (ordered[-1] if ordered else 0.0) * 1e6,
+    }
@@ -0,0 +1,205 @@
+"""In-process benchmark suite with baseline comparison.
+
+Drives the ASGI app directly (no network) for every page and calculator
+route at several concurrency levels, adds micro-benchmarks of the core
+parsing/calculation functions plus the batch and streaming-ingest
+throughput, writes all metrics as JSON and compares them with a baseline.
+
+    python -m benchmarks.suite                      # run, compare with baseline if present
+    python -m benchmarks.suite --save-baseline      # run and store as the new baseline
+    python -m benchmarks.suite --threshold 0.15     # fail on >15% regressions (p95/p99: --tail-threshold)
+
+Exits with status 1 when any metric regresses past the threshold, or when
+--threshold is given explicitly (as in CI) and there is no baseline to
+compare with.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import sys
+import time
+from urllib.parse import urlencode
+
+from app import app
+from benchmarks import bench_batch, bench_ingest
+from benchmarks.asgi import Lifespan, request
+from benchmarks.stats import summarize
+from calculations import hms_to_hours, parse_pace, calculate_times
+from parsing import parse_distance
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+DEFAULT_OUTPUT = os.path.join(RESULTS_DIR, "latest.json")
+DEFAULT_BASELINE = os.path.join(RESULTS_DIR, "baseline.json")
+DEFAULT_THRESHOLD = 0.25
+DEFAULT_TAIL_THRESHOLD = 0.5     # p95/p99 are noisier than throughput and medians
+TAIL_METRICS = ("p95_us", "p99_us")
+CONCURRENCY_LEVELS = (1, 8, 64)
+REQUESTS_PER_LEVEL = 2000
+MICRO_CALLS = 100_000
+MICRO_REPEAT = 5
+
+FORM = [("content-type", "application/x-www-form-urlencoded")]
+JSON = [("content-type", "application/json")]
+BROWSER = [("accept-encoding", "gzip, deflate, br")]
+
+# name -> (method, path, query, headers, body)
+ROUTES = {
+    "/": ("GET", "/", "lang=en", BROWSER, b""),
+    "/track": ("GET", "/track", "lang=zh", BROWSER, b""),
+    "/calculate": ("POST", "/calculate", "", FORM,
+                   urlencode({"mode": "eph", "distance": 50, "elevation": 2500, "time": "7:30:00"}).encode()),
+    "/track/calculate": ("POST", "/track/calculate", "", FORM, urlencode({"pace": "4:30"}).encode()),
+    "/api/v1/eph": ("POST", "/api/v1/eph", "", JSON,
+                    json.dumps({"mode": "eph", "distance": 50, "elevation": 2500, "time": "7:30:00"}).encode()),
+    "/api/v1/track": ("POST", "/api/v1/track", "", JSON, json.dumps({"pace": "4:30"}).encode()),
+    "/track/splits": ("GET", "/track/splits", "pace=4:30&distance_m=100000&split_m=100&limit=500", [], b""),
+    "/health": ("GET", "/health", "", [], b""),
+}
+
+# Every metric records which direction is better
+HIGHER = "higher"
+LOWER = "lower"
+
+async def drive_route(method, path, query, headers, body, concurrency: int, total: int) -> dict:
+    """Issue total requests from concurrency workers; report throughput and latency percentiles."""
+    samples = []
+    remaining = total
+
+    async def worker():
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            result = await request(app, method, path, query=query, headers=headers,
+                                   body_chunks=[body] if body else [])
+            if result.status >= 500:
+                raise RuntimeError(f"{method} {path} returned {result.status}")
+            samples.append(result.elapsed)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    stats = summarize(samples)
+    stats["rps"] = len(samples) / elapsed
+    return stats
+
+async def run_routes(total: int) -> dict:
+    metrics = {}
+    async with Lifespan(app):
+        for name, (method, path, query, headers, body) in ROUTES.items():
+            await drive_route(method, path, query, headers, body, 1, 50)  # warm up
+            for concurrency in CONCURRENCY_LEVELS:
+                stats = await drive_route(method, path, query, headers, body, concurrency, total)
+                prefix = f"route {name} c{concurrency}"
+                metrics[f"{prefix} rps"] = (stats["rps"], HIGHER)
+                for key in ("p50_us", "p95_us", "p99_us"):
+                    metrics[f"{prefix} {key}"] = (stats[key], LOWER)
+    return metrics
+
+def micro_ns(fn, arg, calls: int = MICRO_CALLS, repeat: int = MICRO_REPEAT) -> float:
+    """Best-of-repeat nanoseconds per call."""
+    best = float("inf")
+    loop = range(calls)
+    for _ in range(repeat):
+        start = time.perf_counter_ns()
+        for _ in loop:
+            fn(arg)
+        best = min(best, (time.perf_counter_ns() - start) / calls)
+    return best
+
+def run_micro(calls: int) -> dict:
+    return {
+        "micro hms_to_hours ns": (micro_ns(hms_to_hours, "12:34:56", calls), LOWER),
+        "micro parse_pace ns": (micro_ns(parse_pace, "4:30", calls), LOWER),
+        "micro calculate_times ns": (micro_ns(calculate_times, 270, calls), LOWER),
+        "micro parse_distance ns": (micro_ns(parse_distance, "10km", calls), LOWER),
+    }
+
+def run_throughput(quick: bool) -> dict:
+    batch = bench_batch.run(bench_batch.ROWS)
+    ingest_rows = 20_000 if quick else 100_000
+    asyncio.run(bench_ingest.upload(1000))
+    first_row, elapsed = asyncio.run(bench_ingest.upload(ingest_rows, "ndjson"))
+    return {
+        "batch eph rows/sec": (batch["eph_batch"], HIGHER),
+        "batch time rows/sec": (batch["time_batch"], HIGHER),
+        "ingest rows/sec": (ingest_rows / elapsed, HIGHER),
+        "ingest time_to_first_row_ms": (first_row * 1000, LOWER),
+    }
+
+def run_suite(quick: bool = False) -> dict:
+    total = REQUESTS_PER_LEVEL // 4 if quick else REQUESTS_PER_LEVEL
+    calls = MICRO_CALLS // 10 if quick else MICRO_CALLS
+    metrics = {}
+    metrics.update(asyncio.run(run_routes(total)))
+    metrics.update(run_micro(calls))
+    metrics.update(run_throughput(quick))
+    return {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "metrics": {name: {"value": round(value, 3), "better": better} for name, (value, better) in metrics.items()},
+    }
+
+def compare(current: dict, baseline: dict, threshold: float, tail_threshold: float) -> list:
+    """Metrics that moved in the worse direction by more than their threshold."""
+    regressions = []
+    for name, base in baseline["metrics"].items():
+        metric = current["metrics"].get(name)
+        if metric is None or base["value"] <= 0:
+            continue
+        change = (metric["value"] - base["value"]) / base["value"]
+        worse = -change if base["better"] == HIGHER else change
+        if worse > (tail_threshold if name.endswith(TAIL_METRICS) else threshold):
+            regressions.append((name, base["value"], metric["value"], worse))
+    return regressions
+
+def write_json(path: str, data: dict) -> None:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="where to write this run's metrics")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="baseline metrics to compare against")
+    parser.add_argument("--threshold", type=float, default=None,
+                        help=f"allowed relative slowdown (default {DEFAULT_THRESHOLD:.0%}); "
+                             "when given, a missing baseline fails the run")
+    parser.add_argument("--tail-threshold", type=float, default=DEFAULT_TAIL_THRESHOLD,
+                        help="allowed relative slowdown for p95/p99 latencies")
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as the baseline")
+    parser.add_argument("--quick", action="store_true", help="fewer iterations, for smoke runs")
+    args = parser.parse_args(argv)
+    threshold = DEFAULT_THRESHOLD if args.threshold is None else args.threshold
+
+    results = run_suite(quick=args.quick)
+    write_json(args.output, results)
+    for name, metric in results["metrics"].items():
+        print(f"  {name:<44} {metric['value']:>14,.2f}")
+    print(f"Wrote {args.output}")
+
+    if args.save_baseline:
+        write_json(args.baseline, results)
+        print(f"Saved baseline {args.baseline}")
+        return 0
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --save-baseline to create one",
+              file=sys.stderr if args.threshold is not None else sys.stdout)
+        return 1 if args.threshold is not None else 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline, threshold, args.tail_threshold)
+    if not regressions:
+        print(f"No regressions beyond {threshold:.0%} against {args.baseline}")
+        return 0
+    print(f"REGRESSIONS beyond {threshold:.0%} against {args.baseline}:", file=sys.stderr)
+    for name, base, current, worse in regressions:
+        print(f"  {name:<44} {base:>12,.2f} -> {current:>12,.2f}  ({worse:+.0%} worse)", file=sys.stderr)
+    return 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,48 @@
+"""Cold-start helpers: deferred imports and a startup phase report."""
+import importlib.util
+import os
+import sys
+import time
+
+PHASES = []                       # (phase, seconds) in boot order
+_last_mark = time.perf_counter()
+
+def lazy_import(name: str):
+    """Module whose code only runs on first attribute access.
+
+    For heavy dependencies (numpy) that only the batch, upload and planner
+    routes use; pages and the single calculators never pay for them.
+    Modules using it must not touch the module at import time, which is why
+    they postpone annotation evaluation.
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+def mark(phase: str) -> None:
+    """Record the time spent since the previous mark under phase."""
+    global _last_mark
+    now = time.perf_counter()
+    PHASES.append((phase, now - _last_mark))
+    _last_mark = now
+
+def process_age() -> float:
+    """Seconds since this process started, from /proc; NaN where unavailable."""
+    try:
+        with open(f"/proc/{os.getpid()}/stat") as f:
+            start_ticks = int(f.read().rpartition(")")[2].split()[19])
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+    except (OSError, ValueError, IndexError):
+        return float("nan")
+    return uptime - start_ticks / os.sysconf("SC_CLK_TCK")
+
+def report() -> str:
+    phases = ", ".join(f"{phase} {seconds * 1000:.0f} ms" for phase, seconds in PHASES)
+    return f"boot {process_age() * 1000:.0f} ms since process start ({phases})"
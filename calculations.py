@@ -0,0 +1,59 @@
+"""Core EpH and track pace calculations shared by the web app and tools."""
+from parsing import (
+    CalculationError,
+    ERROR_TIME_REQUIRED,
+    ERROR_INVALID_TIME_FORMAT,
+    ERROR_INVALID_PACE_FORMAT,
+    ERROR_PACE_OUT_OF_RANGE,
+    parse_duration as hms_to_hours,  # hh:mm:ss or hh:mm to hours (decimal)
+    parse_pace,
+)
+
+# Error codes
+ERROR_INVALID_MODE = "invalid_mode"
+ERROR_EPH_REQUIRED = "eph_required"
+ERROR_NON_POSITIVE_TIME = "non_positive_time"
+ERROR_NON_POSITIVE_EPH = "non_positive_eph"
+
+def hours_to_hms(hours_decimal: float) -> str:
+    """Convert hours (decimal) to hh:mm:ss format"""
+    total_seconds = int(round(hours_decimal * 3600))
+    hours = total_seconds // 3600
+    minutes = (total_seconds % 3600) // 60
+    seconds = total_seconds % 60
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d}"
+
+# Track Calculator Functions
+def calculate_times(pace_seconds: int, distance_km: float = 0.4, split_distance_km: float = 0.1):
+    """Calculate total time for 400m and time per 100m."""
+    # Total time for 400 meters
+    total_seconds = pace_seconds * distance_km
+    total_minutes = int(total_seconds // 60)
+    total_rem_seconds = int(total_seconds % 60)
+    
+    # Time per 100 meters
+    split_seconds = pace_seconds * split_distance_km
+    
+    return total_seconds, total_minutes, total_rem_seconds, split_seconds
+
+def format_time(minutes: int, seconds: int) -> str:
+    """Format time as M:SS."""
+    return f"{minutes}:{seconds:02d}"
+
+def calculate_eph(distance_km: float, elevation_m: float, time_str: str) -> float:
+    """Calculate EpH given distance, elevation, and time"""
+    hours = hms_to_hours(time_str)
+    if hours <= 0:
+        raise CalculationError(ERROR_NON_POSITIVE_TIME, "Time must be greater than 0")
+    
+    total_ep = distance_km + elevation_m / 100
+    return total_ep / hours
+
+def calculate_time(distance_km: float, elevation_m: float, eph: float) -> str:
+    """Calculate estimated time given distance, elevation, and EpH"""
+    if eph <= 0:
+        raise CalculationError(ERROR_NON_POSITIVE_EPH, "EpH must be greater than 0")
+    
+    total_ep = distance_km + elevation_m / 100
+    hours = total_ep / eph
+    return hours_to_hms(hours)
@@ -0,0 +1,393 @@
+"""Race events catalog with in-memory indexes and versioned delta sync.
+
+Events are stored in SQLite (WAL mode). Every write stamps the changed rows
+with the next catalog version and deletions are kept as tombstones, so a
+client holding version N fetches only what changed after N. Each process
+serves searches from an immutable in-memory index built from the store:
+columns sorted by date (a date range is a binary search), distance, band and
+elevation filters vectorized over that range, and an inverted token index
+for text search. A background task picks up writes made by other processes.
+
+Each event's JSON, including predicted finish times over EPH_GRID (the
+calculate_time model), is built once when the event changes, so responses
+are joined from prebuilt strings.
+"""
+from __future__ import annotations
+from datetime import date
+from fastapi import APIRouter, Query, Request
+from fastapi.responses import Response
+from pydantic import BaseModel, Field, ValidationError
+from typing import Dict, List, Optional, Tuple
+import asyncio
+import bisect
+import hmac
+import json
+import os
+import re
+import sqlite3
+import threading
+
+from api import ERROR_INVALID_REQUEST, json_response, request_body_schema, validation_message
+from batch import hours_to_hms_array
+from boot import lazy_import
+from metrics import record_error, register_error_codes
+from models import ApiError
+from rankings import BAND_EDGES, BAND_LABELS
+
+np = lazy_import("numpy")
+
+EVENTS_DB = os.environ.get("EVENTS_DB", os.path.join("data", "events.sqlite3"))
+EVENTS_ADMIN_TOKEN = os.environ.get("EVENTS_ADMIN_TOKEN", "")     # writes are disabled when unset
+EPH_GRID = tuple(x / 2 for x in range(4, 31))                      # 2.0 to 15.0 EpH
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+MAX_EVENTS_PER_WRITE = 50_000
+REFRESH_INTERVAL = 1.0            # seconds between checks for writes by other processes
+EVENT_ID = re.compile(r"[A-Za-z0-9][A-Za-z0-9_.-]{0,63}")
+TOKEN = re.compile(r"\w+")
+
+# Error codes
+ERROR_UNAUTHORIZED = "unauthorized"
+ERROR_INVALID_EVENT = "invalid_event"
+ERROR_UNKNOWN_EVENT = "unknown_event"
+ERROR_INVALID_DATE = "invalid_date"
+ERROR_INVALID_BAND = "invalid_band"
+register_error_codes(
+    ERROR_UNAUTHORIZED,
+    ERROR_INVALID_EVENT,
+    ERROR_UNKNOWN_EVENT,
+    ERROR_INVALID_DATE,
+    ERROR_INVALID_BAND,
+)
+
+class EventIn(BaseModel):
+    id: str = Field(min_length=1, max_length=64)
+    name: str = Field(min_length=1, max_length=200)
+    date: str                                       # YYYY-MM-DD
+    location: str = Field("", max_length=200)
+    distance_km: float = Field(gt=0, le=1000)
+    elevation_m: float = Field(0.0, ge=0, le=50_000)
+    url: str = Field("", max_length=500)
+
+class EventsWrite(BaseModel):
+    events: List[EventIn]
+
+class EventOut(EventIn):
+    version: int
+    band: str
+    finish_times: List[str]                         # Predicted finish time for each EpH of eph_grid
+
+class EventsWriteResponse(BaseModel):
+    version: int = 0
+    count: int = 0
+    error: Optional[ApiError] = None
+
+class EventsPage(BaseModel):
+    version: int = 0                                # Catalog version the results reflect
+    eph_grid: List[float] = []
+    total: int = 0
+    events: List[EventOut] = []
+    error: Optional[ApiError] = None
+
+class EventsDelta(BaseModel):
+    version: int = 0                                # Send as since next time
+    eph_grid: List[float] = []
+    events: List[EventOut] = []                     # Added or changed since the given version
+    deleted: List[str] = []                         # Ids deleted since the given version
+    error: Optional[ApiError] = None
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id TEXT PRIMARY KEY,
+    version INTEGER NOT NULL,
+    deleted INTEGER NOT NULL DEFAULT 0,
+    day INTEGER,                  -- date as a proleptic Gregorian ordinal
+    distance_km REAL,
+    elevation_m REAL,
+    band INTEGER,                 -- index into BAND_LABELS
+    tokens TEXT,                  -- lower-cased words of name and location, space separated
+    json TEXT                     -- EventOut, finish times included
+) WITHOUT ROWID;
+CREATE UNIQUE INDEX IF NOT EXISTS events_version ON events (version);
+"""
+
+def event_rows(events: List[EventIn], first_version: int) -> list:
+    """Store rows for events, versions counting up from first_version.
+
+    Finish times are computed here, once per write, in one vectorized pass,
+    so loading the catalog never has to recompute or re-validate anything.
+    """
+    if not events:
+        return []
+    effort = np.array([event.distance_km + event.elevation_m / 100 for event in events])
+    times = hours_to_hms_array((effort[:, None] / np.array(EPH_GRID)[None, :]).ravel())
+    bands = np.searchsorted(BAND_EDGES, [event.distance_km for event in events]).tolist()
+    width = len(EPH_GRID)
+    rows = []
+    for i, event in enumerate(events):
+        version = first_version + i
+        out = EventOut(**event.model_dump(), version=version, band=BAND_LABELS[bands[i]],
+                       finish_times=times[i * width:(i + 1) * width])
+        tokens = " ".join(sorted(set(TOKEN.findall(f"{event.name} {event.location}".lower()))))
+        rows.append((event.id, version, 0, date.fromisoformat(event.date).toordinal(), event.distance_km,
+                     event.elevation_m, bands[i], tokens, out.model_dump_json()))
+    return rows
+
+class EventStore:
+    """Event rows; writes are one transaction numbered after the current catalog version."""
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.db = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("PRAGMA busy_timeout=5000")
+        self.db.executescript(SCHEMA)
+
+    def close(self) -> None:
+        self.db.close()
+
+    def write(self, upserts: List[EventIn], deletes: List[str]) -> int:
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            version = self.db.execute("SELECT COALESCE(MAX(version), 0) FROM events").fetchone()[0]
+            rows = event_rows(upserts, version + 1)
+            rows += [(event_id, version + len(upserts) + i, 1, None, None, None, None, None, None)
+                     for i, event_id in enumerate(deletes, 1)]
+            self.db.executemany(
+                "INSERT OR REPLACE INTO events (id, version, deleted, day, distance_km, elevation_m, band, tokens, json) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            self.db.execute("COMMIT")
+        except BaseException:
+            self.db.execute("ROLLBACK")
+            raise
+        return version + len(rows)
+
+    def rows_since(self, version: int) -> list:
+        return self.db.execute(
+            "SELECT id, version, deleted, day, distance_km, elevation_m, band, tokens, json FROM events "
+            "WHERE version > ? ORDER BY version", (version,)).fetchall()
+
+class CatalogIndex:
+    """Immutable search structures over one catalog version."""
+
+    def __init__(self, rows: Dict[str, tuple], version: int):
+        self.version = version
+        live = [row for row in rows.values() if not row[2]]
+        days = np.array([row[3] for row in live], dtype=np.int64)
+        order = np.argsort(days, kind="stable")
+        live = [live[i] for i in order.tolist()]
+        self.ids = [row[0] for row in live]
+        self.dates = days[order]
+        self.distance = np.array([row[4] for row in live], dtype=np.float64)
+        self.elevation = np.array([row[5] for row in live], dtype=np.float64)
+        self.bands = np.array([row[6] for row in live], dtype=np.int8)
+        self.json = [row[8] for row in live]
+        self.json_by_id = dict(zip(self.ids, self.json))
+
+        # Inverted index as one flat array of positions grouped by token (in vocabulary order),
+        # so the postings of every token sharing a prefix are one contiguous slice
+        tokens, positions = [], []
+        for position, row in enumerate(live):
+            words = row[7].split()
+            tokens.extend(words)
+            positions.extend([position] * len(words))
+        self.vocabulary, token_ids, counts = np.unique(np.array(tokens, dtype=str), return_inverse=True, return_counts=True)
+        self.vocabulary = self.vocabulary.tolist()
+        self.postings = np.array(positions, dtype=np.int64)[np.argsort(token_ids, kind="stable")]
+        self.offsets = np.concatenate(([0], np.cumsum(counts)))
+
+        all_ids = list(rows)
+        versions = np.array([row[1] for row in rows.values()], dtype=np.int64)
+        order = np.argsort(versions)
+        self.change_versions = versions[order]
+        self.change_ids = [all_ids[i] for i in order.tolist()]
+
+    def token_hits(self, token: str) -> np.ndarray:
+        """Positions whose name or location has a word starting with token (may repeat)."""
+        start = bisect.bisect_left(self.vocabulary, token)
+        stop = bisect.bisect_left(self.vocabulary, token + "\U0010ffff", start)
+        return self.postings[self.offsets[start]:self.offsets[stop]]
+
+    def search(self, q: str, date_from: Optional[int], date_to: Optional[int], band: Optional[int],
+               distance_min: Optional[float], distance_max: Optional[float],
+               elevation_min: Optional[float], elevation_max: Optional[float]) -> np.ndarray:
+        """Matching positions, in date order.
+
+        The date range is a slice of the date-sorted columns; every other
+        filter, text included, narrows a boolean mask over that slice only.
+        """
+        lo = 0 if date_from is None else int(np.searchsorted(self.dates, date_from, side="left"))
+        hi = len(self.ids) if date_to is None else int(np.searchsorted(self.dates, date_to, side="right"))
+        mask = np.ones(max(hi - lo, 0), dtype=bool)
+        for token in set(TOKEN.findall(q.lower())):
+            hits = self.token_hits(token)
+            hits = hits[(hits >= lo) & (hits < hi)] - lo
+            token_mask = np.zeros_like(mask)
+            token_mask[hits] = True
+            mask &= token_mask
+        if band is not None:
+            mask &= self.bands[lo:hi] == band
+        if distance_min is not None:
+            mask &= self.distance[lo:hi] >= distance_min
+        if distance_max is not None:
+            mask &= self.distance[lo:hi] <= distance_max
+        if elevation_min is not None:
+            mask &= self.elevation[lo:hi] >= elevation_min
+        if elevation_max is not None:
+            mask &= self.elevation[lo:hi] <= elevation_max
+        return np.flatnonzero(mask) + lo
+
+    def changes_since(self, since: int) -> Tuple[List[str], List[str]]:
+        """(changed event JSON, deleted ids) after version since."""
+        start = int(np.searchsorted(self.change_versions, since, side="right"))
+        changed, deleted = [], []
+        for event_id in self.change_ids[start:]:
+            record = self.json_by_id.get(event_id)
+            if record is None:
+                deleted.append(event_id)
+            else:
+                changed.append(record)
+        return changed, deleted
+
+class EventCatalog:
+    """Store plus the current index; refresh() folds in rows written since the index's version."""
+
+    def __init__(self, path: str = EVENTS_DB):
+        self.store = EventStore(path)
+        self.rows: Dict[str, tuple] = {}   # id -> latest store row, tombstones included
+        self.index = CatalogIndex({}, 0)
+        self.lock = threading.Lock()      # refreshes and writes run in worker threads
+
+    def refresh(self) -> None:
+        with self.lock:
+            rows = self.store.rows_since(self.index.version)
+            if not rows:
+                return
+            self.rows.update((row[0], row) for row in rows)
+            # Readers keep using the previous index until the new one is swapped in
+            self.index = CatalogIndex(self.rows, rows[-1][1])
+
+    def write(self, upserts: List[EventIn], deletes: List[str]) -> int:
+        with self.lock:
+            version = self.store.write(upserts, deletes)
+        self.refresh()
+        return version
+
+catalog: Optional[EventCatalog] = None
+refresh_task: Optional[asyncio.Task] = None
+
+async def refresh_periodically() -> None:
+    while True:
+        await asyncio.sleep(REFRESH_INTERVAL)
+        # Rebuilding the index after a large write elsewhere takes a while; keep it off the event loop
+        await asyncio.to_thread(catalog.refresh)
+
+def open_catalog() -> None:
+    global catalog, refresh_task
+    catalog = EventCatalog(EVENTS_DB)
+    catalog.refresh()
+    refresh_task = asyncio.get_running_loop().create_task(refresh_periodically())
+
+def close_catalog() -> None:
+    if refresh_task is not None:
+        refresh_task.cancel()
+    if catalog is not None:
+        catalog.store.close()
+
+router = APIRouter(prefix="/api/v1", on_startup=[open_catalog], on_shutdown=[close_catalog])
+
+def etag_response(request: Request, body: str, version: int) -> Response:
+    """JSON body tagged with the catalog version; 304 when the client already has it."""
+    etag = f'"events-{version}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+def error_response(request: Request, model, code: str, message: str, status_code: int = 400) -> Response:
+    record_error(request, code)
+    return json_response(model(error=ApiError(code=code, message=message)), status_code)
+
+def parse_date(value: Optional[str]) -> Optional[int]:
+    return date.fromisoformat(value).toordinal() if value else None
+
+def authorized(request: Request) -> bool:
+    supplied = request.headers.get("authorization", "").removeprefix("Bearer ").strip()
+    return bool(EVENTS_ADMIN_TOKEN) and hmac.compare_digest(supplied, EVENTS_ADMIN_TOKEN)
+
+@router.get("/events", response_model=EventsPage)
+async def search_events(request: Request, q: str = "", date_from: Optional[str] = None, date_to: Optional[str] = None,
+                        band: Optional[str] = None, distance_min: Optional[float] = None,
+                        distance_max: Optional[float] = None, elevation_min: Optional[float] = None,
+                        elevation_max: Optional[float] = None, offset: int = Query(0, ge=0),
+                        limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE)):
+    """Search events by text, date range (YYYY-MM-DD), distance band or range and elevation range, in date order"""
+    try:
+        start, end = parse_date(date_from), parse_date(date_to)
+    except ValueError:
+        return error_response(request, EventsPage, ERROR_INVALID_DATE, "Dates must be YYYY-MM-DD")
+    if band is not None and band not in BAND_LABELS:
+        return error_response(request, EventsPage, ERROR_INVALID_BAND, f"band must be one of {', '.join(BAND_LABELS)}")
+
+    index = catalog.index
+    positions = index.search(q, start, end, None if band is None else BAND_LABELS.index(band),
+                             distance_min, distance_max, elevation_min, elevation_max)
+    page = positions[offset:offset + limit].tolist()
+    body = (f'{{"version":{index.version},"eph_grid":{json.dumps(EPH_GRID)},"total":{len(positions)},'
+            f'"events":[{",".join(index.json[i] for i in page)}],"error":null}}')
+    return etag_response(request, body, index.version)
+
+@router.get("/events/sync", response_model=EventsDelta)
+async def sync_events(request: Request, since: int = Query(0, ge=0)):
+    """Events added, changed or deleted after catalog version since (0 for everything)"""
+    index = catalog.index
+    changed, deleted = index.changes_since(since)
+    body = (f'{{"version":{index.version},"eph_grid":{json.dumps(EPH_GRID)},"events":[{",".join(changed)}],'
+            f'"deleted":{json.dumps(deleted)},"error":null}}')
+    return etag_response(request, body, index.version)
+
+@router.get("/events/{event_id}", response_model=EventOut)
+async def get_event(request: Request, event_id: str):
+    """One event with its predicted finish times"""
+    record = catalog.index.json_by_id.get(event_id)
+    if record is None:
+        return error_response(request, EventsPage, ERROR_UNKNOWN_EVENT, "Unknown event", 404)
+    return Response(content=record, media_type="application/json")
+
+@router.put("/events", response_model=EventsWriteResponse, openapi_extra=request_body_schema(EventsWrite))
+async def put_events(request: Request):
+    """Add or replace events in bulk (requires the EVENTS_ADMIN_TOKEN bearer token)"""
+    if not authorized(request):
+        return error_response(request, EventsWriteResponse, ERROR_UNAUTHORIZED, "Admin token required", 401)
+    try:
+        payload = EventsWrite.model_validate_json(await request.body())
+    except ValidationError as e:
+        return error_response(request, EventsWriteResponse, ERROR_INVALID_REQUEST, validation_message(e))
+    if len(payload.events) > MAX_EVENTS_PER_WRITE:
+        return error_response(request, EventsWriteResponse, ERROR_INVALID_REQUEST,
+                              f"At most {MAX_EVENTS_PER_WRITE} events per request")
+    for i, event in enumerate(payload.events):
+        try:
+            date.fromisoformat(event.date)
+        except ValueError:
+            return error_response(request, EventsWriteResponse, ERROR_INVALID_DATE, f"events.{i}.date: must be YYYY-MM-DD")
+        if not EVENT_ID.fullmatch(event.id):
+            return error_response(request, EventsWriteResponse, ERROR_INVALID_EVENT,
+                                  f"events.{i}.id: letters, digits, '.', '-' or '_' only")
+    if len({event.id for event in payload.events}) != len(payload.events):
+        return error_response(request, EventsWriteResponse, ERROR_INVALID_EVENT, "Each event id may appear once")
+
+    version = await asyncio.to_thread(catalog.write, payload.events, [])
+    return json_response(EventsWriteResponse(version=version, count=len(payload.events)))
+
+@router.delete("/events/{event_id}", response_model=EventsWriteResponse)
+async def delete_event(request: Request, event_id: str):
+    """Delete an event; clients receive the id in deleted on their next sync"""
+    if not authorized(request):
+        return error_response(request, EventsWriteResponse, ERROR_UNAUTHORIZED, "Admin token required", 401)
+    if event_id not in catalog.index.json_by_id:
+        return error_response(request, EventsWriteResponse, ERROR_UNKNOWN_EVENT, "Unknown event", 404)
+    version = await asyncio.to_thread(catalog.write, [], [event_id])
+    return json_response(EventsWriteResponse(version=version, count=1))
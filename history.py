@@ -0,0 +1,311 @@
+"""Calculation history per user, stored server-side with incremental sync.
+
+Every history item is its own row in SQLite (WAL mode), so saving or
+deleting one item writes that row only. Rows carry a per-user version that
+grows with every change; a client keeps the highest version it has seen as
+its sync cursor and exchanges only the rows changed since. Deletions are
+kept as tombstones so that other devices of the same user learn about them.
+
+A user id is claimed by requesting its token once; every read, sync and
+delete must then present that token as a bearer token. Only a hash of the
+token is stored.
+"""
+from fastapi import APIRouter, Query, Request
+from fastapi.responses import Response
+from pydantic import BaseModel, Field, ValidationError
+from typing import Any, Dict, List, Optional
+import asyncio
+import hashlib
+import hmac
+import json
+import os
+import re
+import secrets
+import sqlite3
+import threading
+import time
+
+from api import ERROR_INVALID_REQUEST, json_response, request_body_schema, validation_message
+from metrics import record_error, register_error_codes
+from models import ApiError
+
+HISTORY_DB = os.environ.get("HISTORY_DB", os.path.join("data", "history.sqlite3"))
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+MAX_SYNC_CHANGES = 1000           # changes accepted per sync request
+SYNC_PAGE_SIZE = 1000             # changes returned per sync response
+MAX_ITEM_BYTES = 4096
+HISTORY_KINDS = ("eph", "track")
+USER_ID = re.compile(r"[A-Za-z0-9_-]{1,64}")
+SQLITE_INT_LIMIT = 2 ** 63        # SQLite integers are signed 64-bit
+
+# Error codes
+ERROR_INVALID_USER = "invalid_user"
+ERROR_INVALID_CURSOR = "invalid_cursor"
+ERROR_TOO_MANY_CHANGES = "too_many_changes"
+ERROR_UNAUTHORIZED = "unauthorized"
+ERROR_USER_TAKEN = "user_taken"
+register_error_codes(ERROR_INVALID_USER, ERROR_INVALID_CURSOR, ERROR_TOO_MANY_CHANGES, ERROR_UNAUTHORIZED,
+                     ERROR_USER_TAKEN)
+
+class HistoryItem(BaseModel):
+    id: str                                   # Client-generated, unique per user
+    kind: str                                 # 'eph' or 'track'
+    created_at: int                           # Unix time in milliseconds
+    version: int = 0
+    deleted: bool = False
+    item: Optional[Dict[str, Any]] = None     # EpHHistoryItem / TrackHistoryItem of the app; None when deleted
+
+class HistoryPage(BaseModel):
+    items: List[HistoryItem] = []
+    next_cursor: Optional[str] = None         # Pass as ?before= for the next (older) page
+    error: Optional[ApiError] = None
+
+class HistoryChange(BaseModel):
+    id: str = Field(min_length=1, max_length=64)
+    kind: str = "eph"
+    created_at: Optional[int] = Field(None, ge=0, lt=SQLITE_INT_LIMIT)  # Defaults to the time the server receives it
+    deleted: bool = False
+    item: Optional[Dict[str, Any]] = None
+
+class SyncRequest(BaseModel):
+    since: int = Field(0, ge=0, lt=SQLITE_INT_LIMIT)  # Cursor from the previous sync; 0 for a full download
+    changes: List[HistoryChange] = []
+
+class TokenResponse(BaseModel):
+    user_id: str = ""
+    token: str = ""                           # Send as "Authorization: Bearer <token>"; shown only once
+    error: Optional[ApiError] = None
+
+class SyncResponse(BaseModel):
+    cursor: int = 0                           # Send as since next time
+    more: bool = False                        # More changes after cursor; sync again right away
+    changes: List[HistoryItem] = []
+    error: Optional[ApiError] = None
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS history (
+    user_id TEXT NOT NULL,
+    item_id TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    created_at INTEGER NOT NULL,
+    version INTEGER NOT NULL,
+    deleted INTEGER NOT NULL DEFAULT 0,
+    data TEXT,
+    PRIMARY KEY (user_id, item_id)
+) WITHOUT ROWID;
+CREATE UNIQUE INDEX IF NOT EXISTS history_user_version ON history (user_id, version);
+CREATE INDEX IF NOT EXISTS history_user_created ON history (user_id, created_at, item_id) WHERE deleted = 0;
+CREATE INDEX IF NOT EXISTS history_user_kind_created ON history (user_id, kind, created_at, item_id) WHERE deleted = 0;
+CREATE TABLE IF NOT EXISTS history_users (
+    user_id TEXT PRIMARY KEY,
+    token_hash TEXT NOT NULL
+) WITHOUT ROWID;
+"""
+
+def hash_token(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+class HistoryStore:
+    """History rows of all users. Reads are single indexed range scans; a sync is one write transaction.
+
+    Routes call it through asyncio.to_thread, since a write can wait up to
+    busy_timeout on another process; the lock serializes the shared connection.
+    """
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("PRAGMA busy_timeout=5000")
+        self.db.executescript(SCHEMA)
+
+    def close(self) -> None:
+        with self.lock:
+            self.db.close()
+
+    def page(self, user_id: str, kind: Optional[str], before: Optional[tuple], limit: int) -> list:
+        """Live items newest first, strictly older than the (created_at, item_id) key before."""
+        sql = "SELECT item_id, kind, created_at, version, deleted, data FROM history WHERE user_id = ? AND deleted = 0"
+        args: list = [user_id]
+        if kind:
+            sql += " AND kind = ?"
+            args.append(kind)
+        if before:
+            sql += " AND (created_at, item_id) < (?, ?)"
+            args.extend(before)
+        sql += " ORDER BY created_at DESC, item_id DESC LIMIT ?"
+        args.append(limit)
+        with self.lock:
+            return self.db.execute(sql, args).fetchall()
+
+    def apply(self, user_id: str, changes: List[HistoryChange]) -> None:
+        """Upsert changes, numbering them after the user's current version."""
+        now = int(time.time() * 1000)
+        with self.lock:
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                version = self.db.execute("SELECT COALESCE(MAX(version), 0) FROM history WHERE user_id = ?",
+                                          (user_id,)).fetchone()[0]
+                self.db.executemany(
+                    "INSERT INTO history (user_id, item_id, kind, created_at, version, deleted, data) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT (user_id, item_id) DO UPDATE SET "
+                    "kind = excluded.kind, created_at = excluded.created_at, version = excluded.version, "
+                    "deleted = excluded.deleted, data = excluded.data",
+                    [
+                        (user_id, change.id, change.kind, change.created_at if change.created_at is not None else now,
+                         version + i, int(change.deleted), None if change.deleted else json.dumps(change.item))
+                        for i, change in enumerate(changes, 1)
+                    ],
+                )
+                self.db.execute("COMMIT")
+            except BaseException:
+                self.db.execute("ROLLBACK")
+                raise
+
+    def get(self, user_id: str, item_id: str) -> Optional[tuple]:
+        with self.lock:
+            return self.db.execute(
+                "SELECT item_id, kind, created_at, version, deleted, data FROM history WHERE user_id = ? AND item_id = ?",
+                (user_id, item_id)).fetchone()
+
+    def changes_since(self, user_id: str, since: int, limit: int) -> list:
+        with self.lock:
+            return self.db.execute(
+                "SELECT item_id, kind, created_at, version, deleted, data FROM history "
+                "WHERE user_id = ? AND version > ? ORDER BY version LIMIT ?",
+                (user_id, since, limit)).fetchall()
+
+    def token_hash(self, user_id: str) -> Optional[str]:
+        with self.lock:
+            row = self.db.execute("SELECT token_hash FROM history_users WHERE user_id = ?", (user_id,)).fetchone()
+        return row[0] if row else None
+
+    def claim(self, user_id: str, token_hash: str) -> bool:
+        """Register the token of an unclaimed user id; False if it already has one."""
+        with self.lock:
+            return self.db.execute("INSERT OR IGNORE INTO history_users (user_id, token_hash) VALUES (?, ?)",
+                                   (user_id, token_hash)).rowcount == 1
+
+def history_item(row: tuple) -> HistoryItem:
+    item_id, kind, created_at, version, deleted, data = row
+    return HistoryItem(id=item_id, kind=kind, created_at=created_at, version=version, deleted=bool(deleted),
+                       item=json.loads(data) if data is not None else None)
+
+def validate_changes(changes: List[HistoryChange]) -> Optional[str]:
+    """Error message for the first invalid change, if any."""
+    if len(changes) > MAX_SYNC_CHANGES:
+        return f"At most {MAX_SYNC_CHANGES} changes per sync"
+    for i, change in enumerate(changes):
+        if change.kind not in HISTORY_KINDS:
+            return f"changes.{i}.kind: must be one of {', '.join(HISTORY_KINDS)}"
+        if not change.deleted and change.item is None:
+            return f"changes.{i}.item: required unless deleted"
+        if change.item is not None and len(json.dumps(change.item)) > MAX_ITEM_BYTES:
+            return f"changes.{i}.item: larger than {MAX_ITEM_BYTES} bytes"
+    if len({change.id for change in changes}) != len(changes):
+        return "Each item id may appear once per sync"
+    return None
+
+def parse_cursor(cursor: str) -> tuple:
+    created_at, _, item_id = cursor.partition(":")
+    created_at = int(created_at)
+    if not 0 <= created_at < SQLITE_INT_LIMIT:
+        raise ValueError("cursor out of range")
+    return created_at, item_id
+
+store: Optional[HistoryStore] = None
+
+def open_history() -> None:
+    global store
+    store = HistoryStore(HISTORY_DB)
+
+def close_history() -> None:
+    global store
+    if store is not None:
+        store.close()
+        store = None
+
+router = APIRouter(prefix="/api/v1", on_startup=[open_history], on_shutdown=[close_history])
+
+def error_response(request: Request, model, code: str, message: str, status_code: int = 400):
+    record_error(request, code)
+    return json_response(model(error=ApiError(code=code, message=message)), status_code)
+
+async def authorized(request: Request, user_id: str) -> bool:
+    """Whether the request carries the bearer token issued for user_id."""
+    supplied = request.headers.get("authorization", "").removeprefix("Bearer ").strip()
+    if not supplied:
+        return False
+    expected = await asyncio.to_thread(store.token_hash, user_id)
+    return expected is not None and hmac.compare_digest(hash_token(supplied), expected)
+
+@router.post("/history/{user_id}/token", response_model=TokenResponse)
+async def issue_token(request: Request, user_id: str):
+    """Claim a user id and receive its access token; each id can be claimed once"""
+    if not USER_ID.fullmatch(user_id):
+        return error_response(request, TokenResponse, ERROR_INVALID_USER, "user_id must be 1-64 letters, digits, '-' or '_'")
+    token = secrets.token_urlsafe(32)
+    if not await asyncio.to_thread(store.claim, user_id, hash_token(token)):
+        return error_response(request, TokenResponse, ERROR_USER_TAKEN, "user_id is already claimed", 409)
+    return json_response(TokenResponse(user_id=user_id, token=token))
+
+@router.get("/history/{user_id}", response_model=HistoryPage)
+async def list_history(request: Request, user_id: str, kind: Optional[str] = None, before: Optional[str] = None,
+                       limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE)):
+    """A page of a user's history, newest first; follow next_cursor for older items"""
+    if not USER_ID.fullmatch(user_id):
+        return error_response(request, HistoryPage, ERROR_INVALID_USER, "user_id must be 1-64 letters, digits, '-' or '_'")
+    if not await authorized(request, user_id):
+        return error_response(request, HistoryPage, ERROR_UNAUTHORIZED, "Token for this user_id required", 401)
+    if kind is not None and kind not in HISTORY_KINDS:
+        return error_response(request, HistoryPage, ERROR_INVALID_REQUEST, f"kind must be one of {', '.join(HISTORY_KINDS)}")
+    try:
+        key = parse_cursor(before) if before else None
+    except ValueError:
+        return error_response(request, HistoryPage, ERROR_INVALID_CURSOR, "Invalid cursor")
+
+    rows = await asyncio.to_thread(store.page, user_id, kind, key, limit)
+    items = [history_item(row) for row in rows]
+    next_cursor = f"{items[-1].created_at}:{items[-1].id}" if len(items) == limit else None
+    return json_response(HistoryPage(items=items, next_cursor=next_cursor))
+
+@router.post("/history/{user_id}/sync", response_model=SyncResponse, openapi_extra=request_body_schema(SyncRequest))
+async def sync_history(request: Request, user_id: str):
+    """Upload local changes (new, edited or deleted items) and receive every change after the since cursor"""
+    if not USER_ID.fullmatch(user_id):
+        return error_response(request, SyncResponse, ERROR_INVALID_USER, "user_id must be 1-64 letters, digits, '-' or '_'")
+    if not await authorized(request, user_id):
+        return error_response(request, SyncResponse, ERROR_UNAUTHORIZED, "Token for this user_id required", 401)
+    try:
+        payload = SyncRequest.model_validate_json(await request.body())
+    except ValidationError as e:
+        return error_response(request, SyncResponse, ERROR_INVALID_REQUEST, validation_message(e))
+    message = validate_changes(payload.changes)
+    if message:
+        code = ERROR_TOO_MANY_CHANGES if len(payload.changes) > MAX_SYNC_CHANGES else ERROR_INVALID_REQUEST
+        return error_response(request, SyncResponse, code, message)
+
+    if payload.changes:
+        await asyncio.to_thread(store.apply, user_id, payload.changes)
+    rows = await asyncio.to_thread(store.changes_since, user_id, payload.since, SYNC_PAGE_SIZE + 1)
+    more = len(rows) > SYNC_PAGE_SIZE
+    changes = [history_item(row) for row in rows[:SYNC_PAGE_SIZE]]
+    cursor = changes[-1].version if changes else payload.since
+    return json_response(SyncResponse(cursor=cursor, more=more, changes=changes))
+
+@router.delete("/history/{user_id}/{item_id}", status_code=204)
+async def delete_history_item(request: Request, user_id: str, item_id: str):
+    """Delete one item; other devices receive the deletion on their next sync"""
+    if not USER_ID.fullmatch(user_id):
+        return error_response(request, SyncResponse, ERROR_INVALID_USER, "user_id must be 1-64 letters, digits, '-' or '_'")
+    if not await authorized(request, user_id):
+        return error_response(request, SyncResponse, ERROR_UNAUTHORIZED, "Token for this user_id required", 401)
+    row = await asyncio.to_thread(store.get, user_id, item_id)
+    if row is not None and not row[4]:
+        change = HistoryChange(id=item_id, kind=row[1], created_at=row[2], deleted=True)
+        await asyncio.to_thread(store.apply, user_id, [change])
+    return Response(status_code=204)
@@ -0,0 +1,205 @@
+"""Streaming CSV/NDJSON race-results ingestion with constant memory.
+
+The request body is decoded chunk by chunk, each chunk's complete lines are
+scored with the vectorized batch calculator, and the results are streamed
+back before the next chunk is read, so memory stays bounded by the chunk size
+regardless of the upload size.
+"""
+from fastapi import APIRouter, Request, Query
+from fastapi.responses import StreamingResponse
+from typing import AsyncIterator, Callable, List, Optional
+import codecs
+import csv
+import io
+import json
+
+from batch import ERROR_INVALID_VALUE, calculate_eph_batch
+from boot import lazy_import
+
+np = lazy_import("numpy")
+
+router = APIRouter()
+
+MAX_LINE_LENGTH = 64 * 1024
+BLOCK_LINES = 512                 # rows scored per output block, bounds time to first row
+REQUIRED_COLUMNS = ("bib", "distance", "elevation", "time")
+
+# Row error codes in addition to the batch codes
+ERROR_MALFORMED_ROW = "malformed_row"
+ERROR_MISSING_COLUMNS = "missing_columns"
+ERROR_LINE_TOO_LONG = "line_too_long"
+
+class IngestStreamResponse(StreamingResponse):
+    """StreamingResponse that lets the body iterator own receive().
+
+    The stock StreamingResponse listens for disconnects by calling receive()
+    concurrently, which would steal request body chunks while the upload is
+    still being read. Here disconnects surface through request.stream().
+    """
+
+    async def __call__(self, scope, receive, send) -> None:
+        await self.stream_response(send)
+
+class IngestError(ValueError):
+    """Aborts the stream; code is reported as the final result row."""
+    code = ERROR_MALFORMED_ROW
+
+class LineTooLong(IngestError):
+    code = ERROR_LINE_TOO_LONG
+
+class MissingColumns(IngestError):
+    code = ERROR_MISSING_COLUMNS
+
+async def iter_line_blocks(chunks: AsyncIterator[bytes]) -> AsyncIterator[List[str]]:
+    """Yield the complete lines contained in each incoming chunk."""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+    pending = ""
+    async for chunk in chunks:
+        lines = (pending + decoder.decode(chunk)).split("\n")
+        pending = lines.pop()
+        if len(pending) > MAX_LINE_LENGTH:
+            raise LineTooLong()
+        for start in range(0, len(lines), BLOCK_LINES):
+            yield lines[start:start + BLOCK_LINES]
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield [pending]
+
+class RowParser:
+    """Turns lines into (line_no, bib, distance, elevation, time) rows; errors carry a code instead."""
+
+    def __init__(self, input_format: str):
+        self.input_format = input_format
+        self.line_no = 0
+        self.header = None
+        self.width = 0
+
+    def parse(self, lines: List[str]):
+        rows, failed = [], []
+        if self.input_format == "csv":
+            parsed = (self.parse_csv(fields) for fields in csv.reader(lines))
+        else:
+            parsed = (self.parse_ndjson(line) for line in lines)
+        for row in parsed:
+            self.line_no += 1
+            if row is None:
+                continue
+            if isinstance(row, str):
+                failed.append((self.line_no, None, row))
+                continue
+            rows.append((self.line_no, *row))
+        return rows, failed
+
+    def parse_csv(self, fields: List[str]):
+        if not fields:
+            return None
+        if self.header is None:
+            names = [name.strip().lower() for name in fields]
+            missing = [name for name in REQUIRED_COLUMNS if name not in names]
+            if missing:
+                raise MissingColumns()
+            self.header = [names.index(name) for name in REQUIRED_COLUMNS]
+            self.width = max(self.header)
+            return None
+        if len(fields) <= self.width:
+            return ERROR_MALFORMED_ROW
+        bib, distance, elevation, time = self.header
+        return fields[bib].strip(), fields[distance], fields[elevation], fields[time]
+
+    def parse_ndjson(self, line: str):
+        if not line.strip():
+            return None
+        try:
+            record = json.loads(line)
+        except ValueError:
+            return ERROR_MALFORMED_ROW
+        if not isinstance(record, dict):
+            return ERROR_MALFORMED_ROW
+        return tuple(record.get(name) for name in REQUIRED_COLUMNS)
+
+def score_block(distance: list, elevation: list, times: list):
+    """calculate_eph_batch over a block; if the block fails as a whole, score it row by row.
+
+    A row that fails on its own is reported as invalid_value, so one bad value
+    never costs the rest of its block.
+    """
+    try:
+        return calculate_eph_batch(distance, elevation, times)
+    except Exception:
+        pass
+    eph = np.full(len(times), np.nan, dtype=np.float64)
+    codes: List[Optional[str]] = [ERROR_INVALID_VALUE] * len(times)
+    for i, row in enumerate(zip(distance, elevation, times)):
+        try:
+            row_eph, row_codes = calculate_eph_batch(*([value] for value in row))
+        except Exception:
+            continue
+        eph[i], codes[i] = row_eph[0], row_codes[0]
+    return eph, codes
+
+def format_ndjson(line_no: int, bib, eph, error) -> str:
+    return json.dumps({"line": line_no, "bib": bib, "eph": eph, "error": error}, ensure_ascii=False) + "\n"
+
+def format_csv_rows(records) -> str:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerows(
+        (line_no, "" if bib is None else bib, "" if eph is None else eph, error or "")
+        for line_no, bib, eph, error in records
+    )
+    return buffer.getvalue()
+
+async def eph_result_stream(chunks: AsyncIterator[bytes], input_format: str, output_format: str,
+                            on_scored: Optional[Callable] = None) -> AsyncIterator[str]:
+    """Score every row of the upload and yield formatted results block by block.
+
+    on_scored(distance, eph) is called with each block's distance column and
+    EpH array (NaN for failed rows) as it is scored.
+    """
+    parser = RowParser(input_format)
+    if output_format == "csv":
+        yield "line,bib,eph,error\n"
+
+    try:
+        async for lines in iter_line_blocks(chunks):
+            rows, failed = parser.parse(lines)
+            records = [(line_no, None, None, code) for line_no, _, code in failed]
+            if rows:
+                line_numbers, bibs, distance, elevation, times = zip(*rows)
+                eph, codes = score_block(list(distance), list(elevation), list(times))
+                if on_scored is not None:
+                    on_scored(distance, eph)
+                records.extend(
+                    (line_no, bib, None if code else value, code)
+                    for line_no, bib, value, code in zip(line_numbers, bibs, eph.tolist(), codes)
+                )
+                if failed:
+                    records.sort(key=lambda record: record[0])
+            if not records:
+                continue
+            if output_format == "csv":
+                yield format_csv_rows(records)
+            else:
+                yield "".join(format_ndjson(*record) for record in records)
+    except IngestError as e:
+        records = [(parser.line_no, None, None, e.code)]
+        yield format_csv_rows(records) if output_format == "csv" else format_ndjson(*records[0])
+
+@router.post("/results/stream")
+async def stream_results(request: Request, output: str = Query("ndjson", description="Output format: ndjson or csv"),
+                         race: Optional[str] = Query(None, description="Also add the results to this race's EpH ranking")):
+    """Stream EpH for every row of an uploaded CSV or NDJSON results export"""
+    on_scored = None
+    if race:
+        from rankings import RACE_ID, record_scored
+        if RACE_ID.fullmatch(race):
+            on_scored = record_scored(race)
+    content_type = request.headers.get("content-type", "")
+    input_format = "ndjson" if "json" in content_type else "csv"
+    output_format = "csv" if output == "csv" else "ndjson"
+    media_type = "text/csv" if output_format == "csv" else "application/x-ndjson"
+
+    return IngestStreamResponse(
+        eph_result_stream(request.stream(), input_format, output_format, on_scored),
+        media_type=media_type,
+    )
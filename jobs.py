@@ -0,0 +1,538 @@
+"""Background jobs for heavy calculations: submit, poll or stream status, fetch the result.
+
+Each job runs in its own process forked from the job runner, so the event
+loop never computes anything heavier than a status update. A running job can
+be terminated on cancel. Job metadata lives in SQLite (WAL mode), and inputs
+and results are files next to it, so queued and finished jobs survive a
+restart; jobs that were running are re-queued.
+
+A single uvicorn process runs jobs itself. Under serve.py the web workers
+only queue and read jobs, and one dedicated runner process owned by the
+master runs them, so recycling or reloading web workers never interrupts a
+job.
+
+The store is shared by every server process using the same JOBS_DIR. Jobs
+are claimed with a single conditional UPDATE, so JOB_WORKERS bounds the
+number of concurrent jobs across all of them. A claim is a lease held by a
+token unique to the claiming runner, renewed while the runner is alive; a
+running job whose lease expired (its server was killed or hung) is
+re-queued by whichever server notices first.
+"""
+from fastapi import APIRouter, Request
+from fastapi.responses import FileResponse, Response, StreamingResponse
+from pydantic import BaseModel
+from typing import Dict, Optional
+import asyncio
+import json
+import multiprocessing
+import os
+import signal
+import sqlite3
+import threading
+import time
+import uuid
+
+from activity import ERROR_UPLOAD_TOO_LARGE, MAX_UPLOAD_BYTES
+from calculations import CalculationError
+from metrics import record_error, register_error_codes
+from models import ApiError
+
+JOBS_DIR = os.environ.get("JOBS_DIR", "jobs")
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", max(1, (os.cpu_count() or 1) // 2)))
+JOB_TTL_SECONDS = float(os.environ.get("JOB_TTL_SECONDS", 24 * 3600))
+MAX_QUEUED_JOBS = 1000
+POLL_INTERVAL = 1.0               # seconds between store checks for changes made by other processes
+LEASE_SECONDS = 30.0              # a running job is re-queued when its runner stops renewing for this long
+CLEANUP_INTERVAL = 60.0
+
+# Whether this server process runs jobs itself; serve.py clears it before
+# forking web workers and calls run_dedicated_runner in a process of its own
+INLINE_RUNNER = True
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED = (DONE, FAILED, CANCELLED)
+
+# Error codes
+ERROR_UNKNOWN_JOB_KIND = "unknown_job_kind"
+ERROR_UNKNOWN_JOB = "unknown_job"
+ERROR_JOB_NOT_FINISHED = "job_not_finished"
+ERROR_JOB_FAILED = "job_failed"
+ERROR_QUEUE_FULL = "queue_full"
+ERROR_INVALID_PARAMS = "invalid_params"
+ERROR_JOB_CRASHED = "job_crashed"
+register_error_codes(
+    ERROR_UNKNOWN_JOB_KIND,
+    ERROR_UNKNOWN_JOB,
+    ERROR_JOB_NOT_FINISHED,
+    ERROR_JOB_FAILED,
+    ERROR_QUEUE_FULL,
+    ERROR_INVALID_PARAMS,
+    ERROR_JOB_CRASHED,
+    ERROR_UPLOAD_TOO_LARGE,
+)
+
+class JobStatus(BaseModel):
+    id: str = ""
+    kind: str = ""
+    status: str = ""                          # queued, running, done, failed or cancelled
+    created_at: Optional[float] = None        # Unix timestamps
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    expires_at: Optional[float] = None        # Result and job are deleted after this
+    result_url: Optional[str] = None
+    error: Optional[ApiError] = None
+
+# Job kinds: each reads its input file and writes its result file
+
+def param(params: dict, name: str, kind, default):
+    try:
+        return kind(params.get(name, default))
+    except (TypeError, ValueError):
+        raise CalculationError(ERROR_INVALID_PARAMS, f"Invalid value for {name}")
+
+def run_batch_job(params: dict, data: bytes, out) -> None:
+    from batch import BatchRequest, run_batch
+
+    out.write(run_batch(BatchRequest.model_validate_json(data)).model_dump_json().encode())
+
+def run_results_job(params: dict, data: bytes, out) -> None:
+    from ingest import eph_result_stream
+
+    async def chunks():
+        yield data
+
+    async def score():
+        async for block in eph_result_stream(chunks(), params.get("input", "csv"), params.get("output", "ndjson")):
+            out.write(block.encode())
+
+    asyncio.run(score())
+
+def run_activity_job(params: dict, data: bytes, out) -> None:
+    from activity import ActivityResponse, ERROR_INVALID_SPLIT, analyze_track, valid_split_options
+
+    split = params.get("split", "km")
+    split_km = param(params, "split_km", float, 1.0)
+    smoothing = param(params, "smoothing", int, 5)
+    min_climb = param(params, "min_climb", float, 50.0)
+    if not valid_split_options(split, split_km, smoothing, min_climb):
+        result = {"error": ERROR_INVALID_SPLIT}
+    else:
+        result = analyze_track(data, split, split_km, smoothing, min_climb)
+    out.write(ActivityResponse(**result).model_dump_json().encode())
+
+def run_splits_job(params: dict, data: bytes, out) -> None:
+    from lookup import lookup_pace_seconds
+    from splits import split_table_stream, validate_plan
+
+    pace_seconds = lookup_pace_seconds(params.get("pace", ""))
+    distance_m = param(params, "distance_m", float, 400)
+    lap_m = param(params, "lap_m", int, 400)
+    split_m = param(params, "split_m", int, 100)
+    code = validate_plan(distance_m, lap_m, split_m)
+    if code:
+        raise CalculationError(code, "Invalid distance, lap or split length")
+    for block in split_table_stream(pace_seconds, distance_m, lap_m, split_m, params.get("output", "ndjson")):
+        out.write(block.encode())
+
+def output_media_type(params: dict) -> str:
+    return "text/csv" if params.get("output") == "csv" else "application/x-ndjson"
+
+# kind -> (runner, media type of the result)
+JOB_KINDS = {
+    "batch": (run_batch_job, lambda params: "application/json"),
+    "results": (run_results_job, output_media_type),
+    "activity": (run_activity_job, lambda params: "application/json"),
+    "splits": (run_splits_job, output_media_type),
+}
+
+def execute_job(kind: str, params: dict, input_path: str, result_path: str) -> None:
+    """Job process entry point; failures are written next to the result as {code, message}."""
+    try:
+        with open(input_path, "rb") as f:
+            data = f.read()
+        with open(result_path + ".tmp", "wb") as out:
+            JOB_KINDS[kind][0](params, data, out)
+        os.replace(result_path + ".tmp", result_path)
+    except Exception as e:
+        error = {"code": getattr(e, "code", ERROR_JOB_FAILED), "message": str(e) or type(e).__name__}
+        with open(result_path + ".error", "w") as f:
+            json.dump(error, f)
+        os._exit(1)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    params TEXT NOT NULL,
+    media_type TEXT NOT NULL,
+    status TEXT NOT NULL,
+    owner TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    expires_at REAL,
+    error_code TEXT,
+    error_message TEXT,
+    lease_until REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created_at);
+CREATE INDEX IF NOT EXISTS jobs_expires ON jobs (expires_at);
+"""
+
+class JobStore:
+    """SQLite job table; every call is a single short statement.
+
+    Calls can wait up to busy_timeout on another process's write, so the
+    server makes them in worker threads (asyncio.to_thread); the lock keeps
+    them from sharing the connection at the same time.
+    """
+
+    def __init__(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(os.path.join(directory, "jobs.sqlite3"), isolation_level=None,
+                                  check_same_thread=False)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("PRAGMA busy_timeout=5000")
+        self.db.executescript(SCHEMA)
+        columns = {row["name"] for row in self.db.execute("PRAGMA table_info(jobs)")}
+        if "lease_until" not in columns:
+            # Stores created before leases; their running jobs have none and are re-queued
+            self.db.execute("ALTER TABLE jobs ADD COLUMN lease_until REAL")
+
+    def close(self) -> None:
+        with self.lock:
+            self.db.close()
+
+    def insert(self, job_id: str, kind: str, params: dict, media_type: str) -> None:
+        with self.lock:
+            self.db.execute(
+                "INSERT INTO jobs (id, kind, params, media_type, status, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (job_id, kind, json.dumps(params), media_type, QUEUED, time.time()))
+
+    def get(self, job_id: str) -> Optional[sqlite3.Row]:
+        with self.lock:
+            return self.db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+
+    def count(self, status: str) -> int:
+        with self.lock:
+            return self.db.execute("SELECT COUNT(*) FROM jobs WHERE status = ?", (status,)).fetchone()[0]
+
+    def claim_next(self, owner: str, limit: int) -> Optional[sqlite3.Row]:
+        """Lease the oldest queued job to owner, unless limit jobs hold a live lease anywhere."""
+        with self.lock:
+            now = time.time()
+            row = self.db.execute(
+                "UPDATE jobs SET status = ?, owner = ?, started_at = ?, lease_until = ? "
+                "WHERE id = (SELECT id FROM jobs WHERE status = ? ORDER BY created_at LIMIT 1) "
+                "AND (SELECT COUNT(*) FROM jobs WHERE status = ? AND lease_until >= ?) < ? RETURNING *",
+                (RUNNING, owner, now, now + LEASE_SECONDS, QUEUED, RUNNING, now, limit)).fetchone()
+            return row
+
+    def renew(self, owner: str) -> None:
+        with self.lock:
+            self.db.execute("UPDATE jobs SET lease_until = ? WHERE owner = ? AND status = ?",
+                            (time.time() + LEASE_SECONDS, owner, RUNNING))
+
+    def requeue_expired(self, now: float) -> int:
+        """Re-queue running jobs whose owner stopped renewing their lease."""
+        with self.lock:
+            return self.db.execute(
+                "UPDATE jobs SET status = ?, owner = NULL, started_at = NULL, lease_until = NULL "
+                "WHERE status = ? AND (lease_until IS NULL OR lease_until < ?)", (QUEUED, RUNNING, now)).rowcount
+
+    def finish(self, job_id: str, owner: str, status: str, error: Optional[dict] = None) -> None:
+        with self.lock:
+            now = time.time()
+            self.db.execute(
+                "UPDATE jobs SET status = ?, finished_at = ?, expires_at = ?, error_code = ?, error_message = ?, "
+                "lease_until = NULL WHERE id = ? AND status = ? AND owner = ?",
+                (status, now, now + JOB_TTL_SECONDS, error and error["code"], error and error["message"],
+                 job_id, RUNNING, owner))
+
+    def cancel(self, job_id: str) -> None:
+        with self.lock:
+            now = time.time()
+            self.db.execute(
+                "UPDATE jobs SET status = ?, finished_at = ?, expires_at = ? WHERE id = ? AND status IN (?, ?)",
+                (CANCELLED, now, now + JOB_TTL_SECONDS, job_id, QUEUED, RUNNING))
+
+    def requeue(self, job_ids, owner: str) -> None:
+        with self.lock:
+            self.db.executemany(
+                "UPDATE jobs SET status = ?, owner = NULL, started_at = NULL, lease_until = NULL "
+                "WHERE id = ? AND status = ? AND owner = ?",
+                [(QUEUED, job_id, RUNNING, owner) for job_id in job_ids])
+
+    def expired(self, now: float) -> list:
+        with self.lock:
+            return [row["id"] for row in self.db.execute("SELECT id FROM jobs WHERE expires_at < ?", (now,))]
+
+    def delete(self, job_ids) -> None:
+        with self.lock:
+            self.db.executemany("DELETE FROM jobs WHERE id = ?", [(job_id,) for job_id in job_ids])
+
+class JobRunner:
+    """Queues jobs for the routes; once started, also claims them, runs each in a
+    forked process and records the outcome."""
+
+    def __init__(self, directory: str = JOBS_DIR, workers: int = JOB_WORKERS):
+        self.directory = directory
+        self.workers = workers
+        self.store = JobStore(directory)
+        self.owner = uuid.uuid4().hex     # lease token of this runner, new on every start
+        self.processes: Dict[str, multiprocessing.Process] = {}
+        self.wakeup = asyncio.Event()
+        self.changed = asyncio.Event()
+        self.tasks = set()
+
+    def path(self, job_id: str, suffix: str) -> str:
+        return os.path.join(self.directory, f"{job_id}.{suffix}")
+
+    def notify(self) -> None:
+        """Wake every status stream; each waits on the event current when it started waiting."""
+        self.changed.set()
+        self.changed = asyncio.Event()
+
+    async def start(self) -> None:
+        await asyncio.to_thread(self.store.requeue_expired, time.time())
+        self.spawn(self.dispatch())
+        self.spawn(self.cleanup())
+
+    def spawn(self, coroutine) -> None:
+        task = asyncio.create_task(coroutine)
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def stop(self) -> None:
+        for task in list(self.tasks):
+            task.cancel()
+        for process in self.processes.values():
+            process.terminate()
+        for process in self.processes.values():
+            await asyncio.to_thread(process.join)
+        # Interrupted jobs run again after the restart
+        await asyncio.to_thread(self.store.requeue, list(self.processes), self.owner)
+        self.processes.clear()
+        await asyncio.to_thread(self.store.close)
+
+    def enqueue(self, job_id: str, kind: str, params: dict, data: bytes) -> None:
+        with open(self.path(job_id, "input"), "wb") as f:
+            f.write(data)
+        self.store.insert(job_id, kind, params, JOB_KINDS[kind][1](params))
+
+    async def submit(self, kind: str, params: dict, data: bytes) -> str:
+        job_id = uuid.uuid4().hex
+        await asyncio.to_thread(self.enqueue, job_id, kind, params, data)
+        self.wakeup.set()
+        self.notify()
+        return job_id
+
+    async def cancel(self, job_id: str) -> None:
+        """Mark a job cancelled; the runner holding it terminates its process."""
+        await asyncio.to_thread(self.store.cancel, job_id)
+        process = self.processes.get(job_id)
+        if process is not None:
+            process.terminate()
+        self.notify()
+
+    async def dispatch(self) -> None:
+        context = multiprocessing.get_context("fork")
+        renewed = 0.0
+        while True:
+            self.wakeup.clear()
+            now = time.time()
+            if now - renewed >= LEASE_SECONDS / 3:
+                await asyncio.to_thread(self.store.renew, self.owner)
+                renewed = now
+            if await asyncio.to_thread(self.store.requeue_expired, now):
+                self.notify()
+            # Jobs cancelled through another server process, or whose lease this runner lost
+            for job_id, process in list(self.processes.items()):
+                row = await asyncio.to_thread(self.store.get, job_id)
+                if row is None or row["status"] != RUNNING or row["owner"] != self.owner:
+                    process.terminate()
+            while True:
+                row = await asyncio.to_thread(self.store.claim_next, self.owner, self.workers)
+                if row is None:
+                    break
+                job_id = row["id"]
+                process = context.Process(
+                    target=execute_job,
+                    args=(row["kind"], json.loads(row["params"]), self.path(job_id, "input"), self.path(job_id, "result")),
+                    daemon=True,
+                )
+                process.start()
+                self.processes[job_id] = process
+                self.spawn(self.wait(job_id, process))
+                self.notify()
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+
+    async def wait(self, job_id: str, process: multiprocessing.Process) -> None:
+        loop = asyncio.get_running_loop()
+        exited = loop.create_future()
+        loop.add_reader(process.sentinel, lambda: exited.done() or exited.set_result(None))
+        try:
+            await exited
+        finally:
+            loop.remove_reader(process.sentinel)
+        process.join()
+        self.processes.pop(job_id, None)
+
+        if process.exitcode == 0:
+            await asyncio.to_thread(self.store.finish, job_id, self.owner, DONE)
+        else:
+            error = {"code": ERROR_JOB_CRASHED, "message": f"Job process exited with {process.exitcode}"}
+            try:
+                with open(self.path(job_id, "result.error")) as f:
+                    error = json.load(f)
+            except (OSError, ValueError):
+                pass
+            # No-op when the job was cancelled, which is what terminated it
+            await asyncio.to_thread(self.store.finish, job_id, self.owner, FAILED, error)
+        self.wakeup.set()
+        self.notify()
+
+    def remove_expired(self) -> None:
+        expired = self.store.expired(time.time())
+        for job_id in expired:
+            for suffix in ("input", "result", "result.tmp", "result.error"):
+                try:
+                    os.remove(self.path(job_id, suffix))
+                except FileNotFoundError:
+                    pass
+        self.store.delete(expired)
+
+    async def cleanup(self) -> None:
+        while True:
+            await asyncio.to_thread(self.remove_expired)
+            await asyncio.sleep(CLEANUP_INTERVAL)
+
+    def status(self, row: sqlite3.Row) -> JobStatus:
+        error = ApiError(code=row["error_code"], message=row["error_message"]) if row["error_code"] else None
+        return JobStatus(
+            id=row["id"], kind=row["kind"], status=row["status"], created_at=row["created_at"],
+            started_at=row["started_at"], finished_at=row["finished_at"], expires_at=row["expires_at"],
+            result_url=f"/jobs/{row['id']}/result" if row["status"] == DONE else None, error=error,
+        )
+
+runner: Optional[JobRunner] = None
+
+async def start_jobs() -> None:
+    global runner
+    runner = JobRunner(JOBS_DIR, JOB_WORKERS)
+    if INLINE_RUNNER:
+        await runner.start()
+
+async def stop_jobs() -> None:
+    global runner
+    if runner is not None:
+        await runner.stop()
+        runner = None
+
+router = APIRouter(on_startup=[start_jobs], on_shutdown=[stop_jobs])
+
+def run_dedicated_runner() -> None:
+    """Run jobs in this process until SIGTERM or SIGINT; serve.py's job process."""
+
+    async def main():
+        stopping = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, stopping.set)
+        runner = JobRunner(JOBS_DIR, JOB_WORKERS)
+        await runner.start()
+        await stopping.wait()
+        await runner.stop()
+
+    asyncio.run(main())
+
+def error_response(request: Request, status_code: int, code: str, message: str) -> Response:
+    record_error(request, code)
+    return Response(content=JobStatus(error=ApiError(code=code, message=message)).model_dump_json(),
+                    status_code=status_code, media_type="application/json")
+
+def status_response(status: JobStatus, status_code: int = 200) -> Response:
+    return Response(content=status.model_dump_json(), status_code=status_code, media_type="application/json")
+
+@router.post("/jobs/{kind}", response_model=JobStatus, status_code=202)
+async def submit_job(request: Request, kind: str):
+    """Queue a batch, results, activity or splits job; query parameters are passed to the job"""
+    if kind not in JOB_KINDS:
+        return error_response(request, 404, ERROR_UNKNOWN_JOB_KIND, f"Job kind must be one of {', '.join(JOB_KINDS)}")
+    if await asyncio.to_thread(runner.store.count, QUEUED) >= MAX_QUEUED_JOBS:
+        return error_response(request, 429, ERROR_QUEUE_FULL, "Too many queued jobs, retry later")
+
+    body = bytearray()
+    async for chunk in request.stream():
+        body += chunk
+        if len(body) > MAX_UPLOAD_BYTES:
+            return error_response(request, 413, ERROR_UPLOAD_TOO_LARGE, "Job input is too large")
+    params = dict(request.query_params)
+    if kind == "results":
+        params.setdefault("input", "ndjson" if "json" in request.headers.get("content-type", "") else "csv")
+    job_id = await runner.submit(kind, params, bytes(body))
+    return status_response(runner.status(await asyncio.to_thread(runner.store.get, job_id)), 202)
+
+@router.get("/jobs/{job_id}", response_model=JobStatus)
+async def job_status(request: Request, job_id: str):
+    """Current status of a job"""
+    row = await asyncio.to_thread(runner.store.get, job_id)
+    if row is None:
+        return error_response(request, 404, ERROR_UNKNOWN_JOB, "Unknown or expired job")
+    return status_response(runner.status(row))
+
+@router.get("/jobs/{job_id}/events")
+async def job_events(request: Request, job_id: str):
+    """NDJSON stream of status updates, ending when the job finishes"""
+    if await asyncio.to_thread(runner.store.get, job_id) is None:
+        return error_response(request, 404, ERROR_UNKNOWN_JOB, "Unknown or expired job")
+
+    async def events():
+        last = None
+        while True:
+            changed = runner.changed
+            row = await asyncio.to_thread(runner.store.get, job_id)
+            if row is None:
+                return
+            status = runner.status(row).model_dump_json()
+            if status != last:
+                yield status + "\n"
+                last = status
+            if row["status"] in FINISHED:
+                return
+            try:
+                await asyncio.wait_for(changed.wait(), POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+@router.get("/jobs/{job_id}/result")
+async def job_result(request: Request, job_id: str):
+    """Result of a finished job, in the job kind's format"""
+    row = await asyncio.to_thread(runner.store.get, job_id)
+    if row is None:
+        return error_response(request, 404, ERROR_UNKNOWN_JOB, "Unknown or expired job")
+    if row["status"] == FAILED:
+        return error_response(request, 409, row["error_code"] or ERROR_JOB_FAILED, row["error_message"] or "Job failed")
+    if row["status"] != DONE:
+        return error_response(request, 409, ERROR_JOB_NOT_FINISHED, f"Job is {row['status']}")
+    return FileResponse(runner.path(job_id, "result"), media_type=row["media_type"])
+
+@router.delete("/jobs/{job_id}", response_model=JobStatus)
+async def cancel_job(request: Request, job_id: str):
+    """Cancel a queued or running job; finished jobs are left as they are"""
+    if await asyncio.to_thread(runner.store.get, job_id) is None:
+        return error_response(request, 404, ERROR_UNKNOWN_JOB, "Unknown or expired job")
+    await runner.cancel(job_id)
+    return status_response(runner.status(await asyncio.to_thread(runner.store.get, job_id)))
@@ -0,0 +1,357 @@
+"""Live pacing feed over WebSocket for track sessions and races.
+
+An athlete's device (or the coach's stopwatch) connects to /track/live,
+starts a session with a target pace and sends the elapsed time at each
+split; every split is answered with the target time at that mark, the
+ahead/behind delta and the projected finish. Viewers follow one session on
+/track/live/sessions/{session_id}, or every athlete of a training group on
+/track/live/groups/{group}.
+
+Every session and viewer lives on the worker's event loop. A session is one
+slotted object holding a few numbers, and each update is serialized once for
+all of its viewers. Each viewer has a small outbound buffer, drained by a
+send task of its own. When a viewer falls behind, its oldest updates are
+dropped; every update carries the athlete's full state, so the newest is
+enough. A viewer whose send stalls past VIEWER_SEND_TIMEOUT is disconnected,
+so a slow phone never delays the athlete or the other viewers.
+
+Sessions exist only in the worker that started them. With several serve.py
+workers, viewers must reach that same worker (one worker, or sticky routing).
+"""
+from __future__ import annotations
+from collections import deque
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+from pydantic import BaseModel, Field, ValidationError
+from typing import Dict, Optional
+import anyio
+import asyncio
+import json
+import math
+import os
+import re
+import secrets
+
+from api import validation_message
+from boot import lazy_import
+from calculations import CalculationError, ERROR_PACE_OUT_OF_RANGE
+from lookup import lookup_pace_seconds
+from splits import format_clock, validate_plan
+
+np = lazy_import("numpy")
+
+router = APIRouter()
+
+MAX_SESSIONS = int(os.environ.get("LIVE_MAX_SESSIONS", "10000"))
+MAX_VIEWERS = 1000                # per session or group
+MAX_CHANNELS = 2 * MAX_SESSIONS   # sessions plus groups with viewers
+MAX_MESSAGE_BYTES = 4096
+VIEWER_BUFFER = 8                 # updates queued per viewer before the oldest are dropped
+VIEWER_SEND_TIMEOUT = 10.0        # seconds one send may take before the viewer is disconnected
+ON_PACE_SECONDS = 0.05            # |delta| below which a split counts as on pace
+MAX_ELAPSED_SECONDS = 100 * 3600  # longest session a split may report
+MIN_MARK_M = 1.0                  # first mark; bounds the projected finish
+GROUP_ID = re.compile(r"[A-Za-z0-9_-]{1,64}")
+
+# Close codes
+CLOSE_POLICY = 1008
+CLOSE_TRY_AGAIN = 1013
+CLOSE_UNKNOWN = 4404
+
+# Error codes
+ERROR_INVALID_MESSAGE = "invalid_message"
+ERROR_NOT_STARTED = "not_started"
+ERROR_INVALID_ELAPSED = "invalid_elapsed"
+ERROR_FINISHED = "finished"
+ERROR_UNKNOWN_SESSION = "unknown_session"
+ERROR_INVALID_GROUP = "invalid_group"
+ERROR_TOO_MANY_SESSIONS = "too_many_sessions"
+ERROR_TOO_MANY_VIEWERS = "too_many_viewers"
+
+class StartMessage(BaseModel):
+    pace: str                                 # Target pace M:SS per km
+    distance_m: float = 400.0                 # Race or rep distance
+    lap_m: int = 400
+    split_m: int = 100
+    name: str = Field("", max_length=64)      # Athlete name shown to group viewers
+    group: Optional[str] = None               # Training group to publish to as well
+
+class SplitMessage(BaseModel):
+    elapsed: float                            # Seconds since the start
+    distance_m: Optional[float] = None        # Mark reached; defaults to the next split mark
+
+class Channel:
+    """Viewers of one session or group, and the last update of each athlete for late joiners."""
+    __slots__ = ("key", "viewers", "latest")
+
+    def __init__(self, key: str):
+        self.key = key
+        self.viewers: set = set()
+        self.latest: Dict[str, str] = {}
+
+    def publish(self, session_id: str, message: str, final: bool = False) -> None:
+        if final:
+            self.latest.pop(session_id, None)
+        else:
+            self.latest[session_id] = message
+        for viewer in self.viewers:
+            viewer.push(message)
+
+class Viewer:
+    """One viewer connection with a bounded outbound buffer."""
+    __slots__ = ("websocket", "pending", "ready")
+
+    def __init__(self, websocket: WebSocket):
+        self.websocket = websocket
+        self.pending: deque = deque(maxlen=VIEWER_BUFFER)
+        self.ready = asyncio.Event()
+
+    def push(self, message: Optional[str]) -> None:
+        """Queue a message, dropping the oldest when full; None asks the send task to close."""
+        self.pending.append(message)
+        self.ready.set()
+
+    async def send_loop(self) -> bool:
+        """Send until the close marker (True); False once a send fails or stalls."""
+        try:
+            while True:
+                await self.ready.wait()
+                self.ready.clear()
+                while self.pending:
+                    message = self.pending.popleft()
+                    if message is None:
+                        return True
+                    await asyncio.wait_for(self.websocket.send_text(message), VIEWER_SEND_TIMEOUT)
+        except (asyncio.TimeoutError, RuntimeError, OSError, anyio.ClosedResourceError, WebSocketDisconnect):
+            return False
+
+class PacingSession:
+    """Target and progress of one athlete."""
+    __slots__ = ("session_id", "name", "pace_seconds", "distance_m", "lap_m", "split_m",
+                 "split_index", "mark_m", "elapsed", "channel", "group")
+
+    def __init__(self, session_id: str, channel: Channel):
+        self.session_id = session_id
+        self.channel = channel
+        self.group: Optional[Channel] = None
+        self.name = ""
+        self.pace_seconds = 0             # 0 until the start message
+        self.distance_m = 0.0
+        self.lap_m = self.split_m = self.split_index = 0
+        self.mark_m = self.elapsed = 0.0
+
+    def start(self, message: StartMessage, pace_seconds: int, group: Optional[Channel]) -> None:
+        self.name = message.name
+        self.pace_seconds = pace_seconds
+        self.distance_m = message.distance_m
+        self.lap_m = message.lap_m
+        self.split_m = message.split_m
+        self.split_index = 0
+        self.mark_m = 0.0
+        self.elapsed = 0.0
+        self.group = group
+
+    @property
+    def started(self) -> bool:
+        return self.pace_seconds > 0
+
+    def record(self, message: SplitMessage) -> dict:
+        """Advance to the next mark and return the update for it."""
+        if self.mark_m >= self.distance_m:
+            raise CalculationError(ERROR_FINISHED, "The session has reached its distance")
+        elapsed = message.elapsed
+        if not math.isfinite(elapsed) or elapsed <= self.elapsed:
+            raise CalculationError(ERROR_INVALID_ELAPSED, "elapsed must be greater than at the previous split")
+        if elapsed > MAX_ELAPSED_SECONDS:
+            raise CalculationError(ERROR_INVALID_ELAPSED, f"elapsed must be at most {MAX_ELAPSED_SECONDS} seconds")
+        mark = message.distance_m if message.distance_m is not None else min(
+            (self.mark_m // self.split_m + 1) * self.split_m, self.distance_m)
+        if not max(self.mark_m, MIN_MARK_M - 1e-9) < mark <= self.distance_m:
+            raise CalculationError(ERROR_INVALID_ELAPSED, "distance_m must be at least 1 m, past the previous mark and within the distance")
+
+        split_seconds = elapsed - self.elapsed
+        split_pace = split_seconds * 1000 / (mark - self.mark_m)
+        self.split_index += 1
+        self.mark_m = mark
+        self.elapsed = elapsed
+        target = self.pace_seconds * mark / 1000
+        delta = elapsed - target
+        projected = elapsed * self.distance_m / mark
+        elapsed_clock, target_clock, projected_clock = format_clock(np.array([elapsed, target, projected]))
+        return {
+            "type": "split",
+            "session": self.session_id,
+            "name": self.name,
+            "index": self.split_index,
+            "lap": max(1, math.ceil(mark / self.lap_m - 1e-9)),
+            "distance_m": mark,
+            "elapsed": round(elapsed, 2),
+            "elapsed_time": elapsed_clock,
+            "split_seconds": round(split_seconds, 2),
+            "target_seconds": round(target, 2),
+            "target_time": target_clock,
+            "delta_seconds": round(delta, 2),     # Positive is behind the target
+            "status": "on_pace" if abs(delta) < ON_PACE_SECONDS else "behind" if delta > 0 else "ahead",
+            "split_pace_seconds": round(split_pace, 1),        # Per km, over this split
+            "average_pace_seconds": round(elapsed * 1000 / mark, 1),
+            "projected_seconds": round(projected, 2),
+            "projected_finish": projected_clock,
+            "finished": mark >= self.distance_m,
+        }
+
+    def publish(self, update: dict, final: bool = False) -> None:
+        message = json.dumps(update)
+        self.channel.publish(self.session_id, message, final)
+        if self.group is not None:
+            self.group.publish(self.session_id, message, final)
+
+sessions: Dict[str, PacingSession] = {}
+channels: Dict[str, Channel] = {}
+
+def get_channel(key: str) -> Optional[Channel]:
+    channel = channels.get(key)
+    if channel is None and len(channels) < MAX_CHANNELS:
+        channel = channels[key] = Channel(key)
+    return channel
+
+def release_channel(channel: Channel) -> None:
+    """Forget a group channel once nobody publishes to or watches it."""
+    if not channel.viewers and not channel.latest and channel.key.startswith("group:"):
+        channels.pop(channel.key, None)
+
+def error_message(code: str, message: str) -> str:
+    return json.dumps({"type": "error", "error": {"code": code, "message": message}})
+
+def parse_message(text: str):
+    if len(text) > MAX_MESSAGE_BYTES:
+        raise CalculationError(ERROR_INVALID_MESSAGE, f"Messages are limited to {MAX_MESSAGE_BYTES} bytes")
+    try:
+        data = json.loads(text)
+    except ValueError:
+        data = None
+    if not isinstance(data, dict) or data.get("type") not in ("start", "split"):
+        raise CalculationError(ERROR_INVALID_MESSAGE, "Send a JSON object with type 'start' or 'split'")
+    model = StartMessage if data["type"] == "start" else SplitMessage
+    try:
+        return model.model_validate(data)
+    except ValidationError as e:
+        raise CalculationError(ERROR_INVALID_MESSAGE, validation_message(e))
+
+@router.websocket("/track/live")
+async def live_session(websocket: WebSocket):
+    """Athlete side: start a session, then send the elapsed time of each split"""
+    await websocket.accept()
+    if len(sessions) >= MAX_SESSIONS:
+        await websocket.send_text(error_message(ERROR_TOO_MANY_SESSIONS, "Too many live sessions, try again later"))
+        await websocket.close(CLOSE_TRY_AGAIN)
+        return
+    session_id = secrets.token_urlsafe(9)
+    channel = channels[f"session:{session_id}"] = Channel(f"session:{session_id}")
+    session = sessions[session_id] = PacingSession(session_id, channel)
+    try:
+        while True:
+            frame = await websocket.receive()
+            if frame["type"] == "websocket.disconnect":
+                break
+            text = frame.get("text")
+            if text is None:
+                await websocket.send_text(error_message(ERROR_INVALID_MESSAGE, "Send messages as JSON text frames"))
+                continue
+            try:
+                message = parse_message(text)
+                if isinstance(message, StartMessage):
+                    pace_seconds = lookup_pace_seconds(message.pace.strip())
+                    if pace_seconds <= 0:
+                        raise CalculationError(ERROR_PACE_OUT_OF_RANGE, "Pace must be greater than 0")
+                    code = validate_plan(message.distance_m, message.lap_m, message.split_m)
+                    if code:
+                        raise CalculationError(code, "Invalid distance, lap or split length")
+                    group = None
+                    if message.group is not None:
+                        if not GROUP_ID.fullmatch(message.group):
+                            raise CalculationError(ERROR_INVALID_GROUP, "group must be 1-64 letters, digits, '-' or '_'")
+                        group = get_channel(f"group:{message.group}")
+                        if group is None:
+                            raise CalculationError(ERROR_TOO_MANY_SESSIONS, "Too many live groups, try again later")
+                    if session.group is not None and session.group is not group:
+                        session.group.publish(session_id, json.dumps({"type": "end", "session": session_id}), final=True)
+                        release_channel(session.group)
+                    session.start(message, pace_seconds, group)
+                    update = {"type": "started", "session": session_id, "name": session.name,
+                              "pace_seconds": pace_seconds, "distance_m": session.distance_m,
+                              "lap_m": session.lap_m, "split_m": session.split_m,
+                              "target_seconds": round(pace_seconds * session.distance_m / 1000, 2)}
+                else:
+                    if not session.started:
+                        raise CalculationError(ERROR_NOT_STARTED, "Send a start message first")
+                    update = session.record(message)
+            except CalculationError as e:
+                await websocket.send_text(error_message(e.code, str(e)))
+                continue
+            session.publish(update)
+            await websocket.send_text(json.dumps(update))
+    except WebSocketDisconnect:
+        pass
+    finally:
+        del sessions[session_id]
+        session.publish({"type": "end", "session": session_id}, final=True)
+        for viewer in channel.viewers:
+            viewer.push(None)
+        channels.pop(channel.key, None)
+        if session.group is not None:
+            release_channel(session.group)
+
+async def watch(websocket: WebSocket, channel: Channel) -> None:
+    """Send the channel's updates to one viewer until either side goes away."""
+    viewer = Viewer(websocket)
+    channel.viewers.add(viewer)
+    for message in channel.latest.values():
+        viewer.push(message)
+    sender = asyncio.create_task(viewer.send_loop())
+    receiver = asyncio.create_task(drain(websocket))
+    try:
+        done, _ = await asyncio.wait((sender, receiver), return_when=asyncio.FIRST_COMPLETED)
+        if sender in done and sender.result():
+            await websocket.close()
+    finally:
+        sender.cancel()
+        receiver.cancel()
+        channel.viewers.discard(viewer)
+        release_channel(channel)
+
+async def drain(websocket: WebSocket) -> None:
+    """Viewers only listen; read until they disconnect."""
+    while True:
+        message = await websocket.receive()
+        if message["type"] == "websocket.disconnect":
+            return
+
+async def reject(websocket: WebSocket, code: str, message: str, close_code: int) -> None:
+    await websocket.send_text(error_message(code, message))
+    await websocket.close(close_code)
+
+@router.websocket("/track/live/sessions/{session_id}")
+async def watch_session(websocket: WebSocket, session_id: str):
+    """Viewer side: every update of one athlete's session"""
+    await websocket.accept()
+    channel = channels.get(f"session:{session_id}")
+    if channel is None:
+        await reject(websocket, ERROR_UNKNOWN_SESSION, "No live session with this id", CLOSE_UNKNOWN)
+    elif len(channel.viewers) >= MAX_VIEWERS:
+        await reject(websocket, ERROR_TOO_MANY_VIEWERS, "Too many viewers for this session", CLOSE_TRY_AGAIN)
+    else:
+        await watch(websocket, channel)
+
+@router.websocket("/track/live/groups/{group}")
+async def watch_group(websocket: WebSocket, group: str):
+    """Viewer side: updates of every athlete publishing to a group, present or future"""
+    await websocket.accept()
+    if not GROUP_ID.fullmatch(group):
+        await reject(websocket, ERROR_INVALID_GROUP, "group must be 1-64 letters, digits, '-' or '_'", CLOSE_POLICY)
+        return
+    channel = get_channel(f"group:{group}")
+    if channel is None:
+        await reject(websocket, ERROR_TOO_MANY_SESSIONS, "Too many live groups, try again later", CLOSE_TRY_AGAIN)
+    elif len(channel.viewers) >= MAX_VIEWERS:
+        await reject(websocket, ERROR_TOO_MANY_VIEWERS, "Too many viewers for this group", CLOSE_TRY_AGAIN)
+    else:
+        await watch(websocket, channel)
@@ -0,0 +1,109 @@
+"""Precomputed pace lookup table and LRU result caches for the calculators.
+
+parse_pace caps minutes at 60 and seconds at 59, so /track/calculate has a
+finite domain of 3,660 paces. Every response is built and serialized once,
+then served by direct lookup.
+"""
+from functools import lru_cache
+from typing import Dict, List
+
+import aot
+import calculations
+import models
+import parsing
+from calculations import parse_pace, calculate_times, format_time, calculate_eph, calculate_time
+from models import PaceResponse, PaceApiResponse
+
+MAX_PACE_SECONDS = 60 * 60 + 59
+EPH_CACHE_SIZE = 4096
+TIME_CACHE_SIZE = 4096
+
+PACE_TABLE: List[bytes] = []        # Serialized PaceResponse indexed by pace seconds
+API_PACE_TABLE: List[bytes] = []    # Serialized PaceApiResponse indexed by pace seconds
+PACE_SECONDS: Dict[str, int] = {}   # Canonical pace strings ("4:30", "7") to pace seconds
+
+def build_pace_response(pace_seconds: int) -> PaceResponse:
+    """400m total time and 100m splits for a pace in seconds per km."""
+    total_seconds, total_minutes, total_rem_seconds, split_seconds = calculate_times(pace_seconds)
+
+    split_100m = int(split_seconds)
+    return PaceResponse(
+        total_time_min=format_time(total_minutes, total_rem_seconds),
+        total_time_sec=int(total_seconds),
+        split_100m=split_100m,
+        split_200m=split_100m * 2,
+        split_300m=split_100m * 3,
+        split_400m=int(total_seconds)
+    )
+
+def pace_table_key() -> str:
+    return aot.file_key(calculations.__file__, parsing.__file__, models.__file__, __file__)
+
+def build_pace_table(use_snapshot: bool = True) -> None:
+    """Render every reachable pace response once; safe to call repeatedly."""
+    if PACE_TABLE:
+        return
+    snapshot = aot.load("pace_table", pace_table_key()) if use_snapshot else None
+    if snapshot is not None:
+        table, api_table, seconds_by_pace = snapshot
+        API_PACE_TABLE.extend(api_table)
+        PACE_SECONDS.update(seconds_by_pace)
+        PACE_TABLE.extend(table)
+        return
+    responses = [build_pace_response(pace_seconds) for pace_seconds in range(MAX_PACE_SECONDS + 1)]
+    api_table = [
+        PaceApiResponse(pace_seconds=pace_seconds, **response.model_dump(exclude={"error"})).model_dump_json().encode()
+        for pace_seconds, response in enumerate(responses)
+    ]
+    seconds_by_pace = {}
+    for minutes in range(61):
+        seconds_by_pace[str(minutes)] = minutes * 60
+        for seconds in range(60):
+            seconds_by_pace[f"{minutes}:{seconds:02d}"] = minutes * 60 + seconds
+    API_PACE_TABLE.extend(api_table)
+    PACE_SECONDS.update(seconds_by_pace)
+    PACE_TABLE.extend(response.model_dump_json().encode() for response in responses)
+
+def save_pace_table() -> None:
+    build_pace_table()
+    aot.save("pace_table", pace_table_key(), (PACE_TABLE, API_PACE_TABLE, PACE_SECONDS))
+
+def lookup_pace_seconds(pace: str) -> int:
+    """Pace seconds for a pace string; raises CalculationError like parse_pace."""
+    if not PACE_TABLE:
+        build_pace_table()
+    pace_seconds = PACE_SECONDS.get(pace)
+    return parse_pace(pace) if pace_seconds is None else pace_seconds
+
+def pace_response_json(pace: str) -> bytes:
+    """Serialized PaceResponse for a pace string."""
+    return PACE_TABLE[lookup_pace_seconds(pace)]
+
+def pace_api_json(pace: str) -> bytes:
+    """Serialized PaceApiResponse for a pace string."""
+    return API_PACE_TABLE[lookup_pace_seconds(pace)]
+
+@lru_cache(maxsize=EPH_CACHE_SIZE)
+def _calculate_eph(distance_km: float, elevation_m: float, time_str: str) -> float:
+    return calculate_eph(distance_km, elevation_m, time_str)
+
+@lru_cache(maxsize=TIME_CACHE_SIZE)
+def _calculate_time(distance_km: float, elevation_m: float, eph: float) -> str:
+    return calculate_time(distance_km, elevation_m, eph)
+
+def cached_calculate_eph(distance_km: float, elevation_m: float, time_str: str) -> float:
+    """calculate_eph behind a bounded LRU keyed on normalized inputs. Errors are not cached."""
+    return _calculate_eph(float(distance_km), float(elevation_m), time_str.strip())
+
+def cached_calculate_time(distance_km: float, elevation_m: float, eph: float) -> str:
+    """calculate_time behind a bounded LRU keyed on normalized inputs. Errors are not cached."""
+    return _calculate_time(float(distance_km), float(elevation_m), float(eph))
+
+def cache_stats() -> dict:
+    """Hit/miss counters and occupancy of the result caches."""
+    stats = {}
+    for name, cached in (("calculate_eph", _calculate_eph), ("calculate_time", _calculate_time)):
+        info = cached.cache_info()
+        stats[name] = {"hits": info.hits, "misses": info.misses, "size": info.currsize, "max_size": info.maxsize}
+    stats["pace_table"] = {"size": len(PACE_TABLE)}
+    return stats
@@ -0,0 +1,255 @@
+"""Low-overhead request metrics exposed in Prometheus text format.
+
+Counters live in a flat int64 array with a fixed layout per route: request
+count, 5xx count, one counter per calculation error code, latency histogram
+buckets and the latency sum. Recording a request is a handful of integer
+increments with no locks, since each process has its own array and the event
+loop runs handlers one at a time.
+
+With METRICS_DIR set, each worker process maps its array onto its own file
+in that directory and /metrics sums every file with a matching layout, so
+the numbers stay correct under multiple uvicorn workers.
+"""
+from bisect import bisect_left
+from fastapi import Request
+from fastapi.responses import Response
+from typing import List, Optional
+import glob
+import mmap
+import os
+import time
+import zlib
+
+from calculations import (
+    ERROR_INVALID_MODE,
+    ERROR_EPH_REQUIRED,
+    ERROR_NON_POSITIVE_TIME,
+    ERROR_NON_POSITIVE_EPH,
+)
+from parsing import (
+    ERROR_TIME_REQUIRED,
+    ERROR_INVALID_TIME_FORMAT,
+    ERROR_INVALID_PACE_FORMAT,
+    ERROR_PACE_OUT_OF_RANGE,
+    ERROR_INVALID_DISTANCE_FORMAT,
+)
+
+METRICS_DIR = os.environ.get("METRICS_DIR", "")
+MAGIC = 0x45504833      # "EPH3"
+OTHER = "other"
+
+# Error codes with their own counter; routers add theirs with register_error_codes
+_error_codes = {
+    ERROR_INVALID_MODE,
+    ERROR_TIME_REQUIRED,
+    ERROR_EPH_REQUIRED,
+    ERROR_INVALID_TIME_FORMAT,
+    ERROR_NON_POSITIVE_TIME,
+    ERROR_NON_POSITIVE_EPH,
+    ERROR_INVALID_PACE_FORMAT,
+    ERROR_PACE_OUT_OF_RANGE,
+    ERROR_INVALID_DISTANCE_FORMAT,
+}
+
+def register_error_codes(*codes: str) -> None:
+    """Give error codes their own counters; call at import time, next to the ERROR_* constants."""
+    if registry.routes:
+        raise RuntimeError("error codes must be registered before the first request")
+    _error_codes.update(codes)
+
+BUCKETS_SECONDS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BUCKETS_NS = tuple(int(bound * 1e9) for bound in BUCKETS_SECONDS)
+
+# Slot offsets within one route's block; the error counters start at ERRORS and
+# the histogram and latency sum follow them (MetricsRegistry.bind)
+REQUESTS = 0
+SERVER_ERRORS = 1
+ERRORS = 2
+HEADER = 2
+
+def use_directory(directory: str) -> None:
+    """Share counters through files in directory; call in the master before forking workers.
+
+    Files left by an earlier run are removed so they do not count toward the
+    totals, while files of workers recycled during this run keep counting.
+    """
+    os.makedirs(directory, exist_ok=True)
+    for path in glob.glob(os.path.join(directory, "*.metrics")):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+    os.environ["METRICS_DIR"] = directory
+    registry.directory = directory
+    registry.counters = None
+
+def record_error(request: Request, code: str) -> None:
+    """Tag the current request with a calculation error code for the metrics middleware."""
+    request.state.error_code = code
+
+class MetricsRegistry:
+    """Per-process counter array plus the route table that maps requests to blocks."""
+
+    def __init__(self, directory: str = METRICS_DIR):
+        self.directory = directory
+        self.routes: List[str] = []
+        self.route_index = {}
+        self.error_codes: List[str] = []
+        self.error_index = {}
+        self.other_error = ERRORS
+        self.histogram = self.latency_sum = self.stride = 0
+        self.layout = 0
+        self.counters: Optional[memoryview] = None
+        self.path = ""
+        os.register_at_fork(after_in_child=self.reset)
+
+    def reset(self) -> None:
+        """Drop the parent's array after fork; the child maps its own on first request."""
+        self.counters = None
+
+    def bind(self, app) -> None:
+        """Derive the route table from the app; identical in every worker."""
+        routes, index = [], {}
+        for route in app.routes:
+            path = getattr(route, "path", None)
+            if path is None:
+                continue
+            if path not in routes:
+                routes.append(path)
+            endpoint = getattr(route, "endpoint", None) or getattr(route, "app", None)
+            if endpoint is not None:
+                index[endpoint] = routes.index(path)
+        routes.append(OTHER)
+        # Sorted, so the layout does not depend on the order routers were imported in
+        error_codes = sorted(_error_codes - {OTHER}) + [OTHER]
+        self.error_codes = error_codes
+        self.error_index = {code: ERRORS + i for i, code in enumerate(error_codes)}
+        self.other_error = self.error_index[OTHER]
+        self.histogram = ERRORS + len(error_codes)
+        self.latency_sum = self.histogram + len(BUCKETS_NS) + 1
+        self.stride = self.latency_sum + 1
+        self.routes = routes
+        self.route_index = index
+        layout = "|".join(routes) + "#" + "|".join(error_codes) + "#" + ",".join(map(str, BUCKETS_NS))
+        self.layout = zlib.crc32(layout.encode())
+        self.counters = None
+
+    def open(self) -> memoryview:
+        size = (HEADER + self.stride * len(self.routes)) * 8
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+            self.path = os.path.join(self.directory, f"{os.getpid()}.metrics")
+            with open(self.path, "wb") as f:
+                f.truncate(size)
+            with open(self.path, "r+b") as f:
+                buffer = mmap.mmap(f.fileno(), size)
+        else:
+            buffer = mmap.mmap(-1, size)
+        counters = memoryview(buffer).cast("q")
+        counters[0] = MAGIC
+        counters[1] = self.layout
+        self.counters = counters
+        return counters
+
+    def observe(self, endpoint, status: int, error_code: Optional[str], elapsed_ns: int) -> None:
+        counters = self.counters or self.open()
+        base = HEADER + self.stride * self.route_index.get(endpoint, len(self.routes) - 1)
+        counters[base + REQUESTS] += 1
+        if status >= 500:
+            counters[base + SERVER_ERRORS] += 1
+        if error_code is not None:
+            counters[base + self.error_index.get(error_code, self.other_error)] += 1
+        counters[base + self.histogram + bisect_left(BUCKETS_NS, elapsed_ns)] += 1
+        counters[base + self.latency_sum] += elapsed_ns
+
+    def totals(self) -> List[int]:
+        """Counters summed over this process, or over every worker file in METRICS_DIR."""
+        size = self.stride * len(self.routes)
+        if not self.directory:
+            counters = self.counters
+            return list(counters[HEADER:]) if counters is not None else [0] * size
+        totals = [0] * size
+        for path in glob.glob(os.path.join(self.directory, "*.metrics")):
+            with open(path, "rb") as f:
+                data = f.read()
+            values = memoryview(data).cast("q")
+            if len(values) != HEADER + size or values[0] != MAGIC or values[1] != self.layout:
+                continue
+            for i in range(size):
+                totals[i] += values[HEADER + i]
+        return totals
+
+    def render(self) -> str:
+        """Prometheus text exposition of all routes that have seen requests."""
+        totals = self.totals()
+        stride, histogram = self.stride, self.histogram
+        requests, server_errors, calc_errors, histograms = [], [], [], []
+        for r, route in enumerate(self.routes):
+            block = totals[stride * r:stride * (r + 1)]
+            if not block[REQUESTS]:
+                continue
+            label = f'route="{route}"'
+            requests.append(f"eph_http_requests_total{{{label}}} {block[REQUESTS]}")
+            server_errors.append(f"eph_http_server_errors_total{{{label}}} {block[SERVER_ERRORS]}")
+            for i, code in enumerate(self.error_codes):
+                if block[ERRORS + i]:
+                    calc_errors.append(f'eph_calculation_errors_total{{{label},code="{code}"}} {block[ERRORS + i]}')
+            cumulative = 0
+            for i, bound in enumerate(BUCKETS_SECONDS):
+                cumulative += block[histogram + i]
+                histograms.append(f'eph_http_request_duration_seconds_bucket{{{label},le="{bound}"}} {cumulative}')
+            cumulative += block[histogram + len(BUCKETS_SECONDS)]
+            histograms.append(f'eph_http_request_duration_seconds_bucket{{{label},le="+Inf"}} {cumulative}')
+            histograms.append(f"eph_http_request_duration_seconds_sum{{{label}}} {block[self.latency_sum] / 1e9}")
+            histograms.append(f"eph_http_request_duration_seconds_count{{{label}}} {block[REQUESTS]}")
+
+        lines = [
+            "# HELP eph_http_requests_total HTTP requests by route.",
+            "# TYPE eph_http_requests_total counter",
+            *requests,
+            "# HELP eph_http_server_errors_total HTTP 5xx responses by route.",
+            "# TYPE eph_http_server_errors_total counter",
+            *server_errors,
+            "# HELP eph_calculation_errors_total Calculation errors by route and error code.",
+            "# TYPE eph_calculation_errors_total counter",
+            *calc_errors,
+            "# HELP eph_http_request_duration_seconds Request latency by route.",
+            "# TYPE eph_http_request_duration_seconds histogram",
+            *histograms,
+        ]
+        return "\n".join(lines) + "\n"
+
+registry = MetricsRegistry()
+
+class MetricsMiddleware:
+    """Pure ASGI middleware timing every HTTP request; other scopes pass straight through."""
+
+    def __init__(self, app, registry: MetricsRegistry = registry):
+        self.app = app
+        self.registry = registry
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        if not self.registry.routes:
+            self.registry.bind(scope["app"])
+
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        start = time.perf_counter_ns()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            state = scope.get("state")
+            error_code = state.get("error_code") if state else None
+            self.registry.observe(scope.get("endpoint"), status, error_code, time.perf_counter_ns() - start)
+
+def metrics_response() -> Response:
+    return Response(content=registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
@@ -0,0 +1,88 @@
+"""Request and response models for the calculator endpoints."""
+from pydantic import BaseModel, ConfigDict
+from typing import Optional
+
+# Pydantic models for request validation
+class EpHRequest(BaseModel):
+    model_config = ConfigDict(allow_inf_nan=False)
+
+    mode: str                    # 'eph' or 'time'
+    distance: float             # Distance in kilometers
+    elevation: float            # Elevation gain in meters
+    time: Optional[str] = None  # Time in hh:mm:ss format
+    eph: Optional[float] = None # EpH value
+
+class EpHResponse(BaseModel):
+    result: str                 # Calculation result
+    error: str = ""            # Error message if any (empty string for no error)
+    
+    class Config:
+        # Ensure all fields are properly handled
+        extra = "forbid"
+        validate_assignment = True
+    
+    def __init__(self, **data):
+        # Ensure all fields are properly set
+        if 'result' not in data:
+            data['result'] = ""
+        if 'error' not in data:
+            data['error'] = ""
+        super().__init__(**data)
+
+# Track Calculator Models
+class PaceRequest(BaseModel):
+    pace: str
+
+class PaceResponse(BaseModel):
+    total_time_min: str = ""
+    total_time_sec: int = 0
+    split_100m: int = 0
+    split_200m: int = 0
+    split_300m: int = 0
+    split_400m: int = 0
+    error: str = ""
+    
+    class Config:
+        # Ensure all fields are properly handled
+        extra = "forbid"
+        validate_assignment = True
+    
+    def __init__(self, **data):
+        # Ensure all fields are properly set
+        if 'total_time_min' not in data:
+            data['total_time_min'] = ""
+        if 'total_time_sec' not in data:
+            data['total_time_sec'] = 0
+        if 'split_100m' not in data:
+            data['split_100m'] = 0
+        if 'split_200m' not in data:
+            data['split_200m'] = 0
+        if 'split_300m' not in data:
+            data['split_300m'] = 0
+        if 'split_400m' not in data:
+            data['split_400m'] = 0
+        if 'error' not in data:
+            data['error'] = ""
+        super().__init__(**data)
+
+# Versioned JSON API models (/api/v1)
+class ApiError(BaseModel):
+    code: str                   # Stable machine-readable error code
+    message: str                # User-facing message
+
+class EpHApiResponse(BaseModel):
+    mode: str = ""
+    eph: Optional[float] = None     # Calculated EpH (mode 'eph')
+    time: Optional[str] = None      # Estimated hh:mm:ss (mode 'time')
+    result: str = ""                # Display string, same as /calculate
+    error: Optional[ApiError] = None
+
+class PaceApiResponse(BaseModel):
+    pace_seconds: int = 0
+    total_time_min: str = ""
+    total_time_sec: int = 0
+    split_100m: int = 0
+    split_200m: int = 0
+    split_300m: int = 0
+    split_400m: int = 0
+    error: Optional[ApiError] = None
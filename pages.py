@@ -0,0 +1,225 @@
+"""Pre-rendered, precompressed HTML pages served with strong ETags.
+
+The calculator pages depend only on the template files and the static
+translation dicts, so every (page, lang) variant is rendered once, hashed and
+compressed. Variants are rebuilt only when a template file or translation
+dict changes. A snapshot written at image build time (see aot.py) is loaded
+at boot instead of rendering, and Jinja2 is only imported when a page
+actually has to be rendered.
+
+Inline <style> and <script> blocks of the rendered pages are moved into
+files under static/assets named after their content hash, with gzip and
+brotli variants next to them. A changed asset gets a new URL, so assets are
+served as immutable (AssetStaticFiles) and stay cached across pages and
+visits.
+"""
+from fastapi.responses import HTMLResponse, Response
+from fastapi.staticfiles import StaticFiles
+from starlette.datastructures import Headers
+from typing import Dict, List, Optional, Tuple
+import aot
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import time
+
+try:
+    import brotli
+except ImportError:  # Brotli is optional; gzip is always available
+    brotli = None
+
+LANGUAGES = ("en", "zh")
+CACHE_CONTROL = "public, max-age=0, must-revalidate"
+CHANGE_CHECK_INTERVAL = 1.0   # seconds between template/translation change checks
+ASSET_DIR = os.path.join("static", "assets")
+ASSET_URL = "/static/assets/"
+ASSET_CACHE_CONTROL = "public, max-age=31536000, immutable"
+INLINE_BLOCK = re.compile(r"<(style|script)>(.*?)</\1>", re.S)     # attribute-less blocks only
+FINGERPRINTED = re.compile(r"^assets/[\w-]+\.[0-9a-f]{16}\.(css|js)$")
+CODING_SUFFIXES = (("br", ".br"), ("gzip", ".gz"))
+
+class RenderedPage:
+    """One page/lang variant: identity, gzip and brotli bodies with an ETag each."""
+    __slots__ = ("bodies", "etags", "link")
+
+    def __init__(self, html: str, stylesheets: List[str] = ()):
+        # Lets the browser (or a CDN's early hints) fetch the render-blocking CSS before parsing the page
+        self.link = ", ".join(f"<{ASSET_URL}{name}>; rel=preload; as=style" for name in stylesheets)
+        identity = html.encode("utf-8")
+        digest = hashlib.sha256(identity).hexdigest()[:32]
+        self.bodies = {"identity": identity, "gzip": gzip.compress(identity, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            self.bodies["br"] = brotli.compress(identity, quality=11)
+        suffixes = {"identity": "", "gzip": "-gz", "br": "-br"}
+        self.etags = {coding: f'"{digest}{suffixes[coding]}"' for coding in self.bodies}
+
+def accepted_codings(accept_encoding: str) -> set:
+    """Content codings the client accepts with a non-zero q value."""
+    codings = set()
+    for item in accept_encoding.split(","):
+        name, _, params = item.partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = params.strip()
+        if q.startswith("q="):
+            try:
+                if float(q[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        codings.add(name)
+    return codings
+
+def select_coding(page: RenderedPage, accept_encoding: str) -> str:
+    if not accept_encoding:
+        return "identity"
+    codings = accepted_codings(accept_encoding)
+    if "br" in page.bodies and ("br" in codings or "*" in codings):
+        return "br"
+    if "gzip" in codings or "*" in codings:
+        return "gzip"
+    return "identity"
+
+def etag_matches(if_none_match: str, page: RenderedPage) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+    tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return not tags.isdisjoint(page.etags.values())
+
+def write_asset(content: bytes, stem: str, extension: str, directory: str = ASSET_DIR) -> str:
+    """Write content and its compressed variants once under its hash; returns the file name."""
+    name = f"{stem}.{hashlib.sha256(content).hexdigest()[:16]}.{extension}"
+    path = os.path.join(directory, name)
+    if os.path.exists(path):
+        return name
+    os.makedirs(directory, exist_ok=True)
+    variants = {"": content, ".gz": gzip.compress(content, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants[".br"] = brotli.compress(content, quality=11)
+    # Compressed variants first, so the identity file never exists without them
+    for suffix in sorted(variants, reverse=True):
+        with open(path + suffix + ".tmp", "wb") as f:
+            f.write(variants[suffix])
+        os.replace(path + suffix + ".tmp", path + suffix)
+    return name
+
+def extract_assets(html: str, stem: str, directory: str = ASSET_DIR) -> Tuple[str, List[str]]:
+    """Replace inline style and script blocks with links to asset files; returns (html, asset names)."""
+    names = []
+
+    def link(match) -> str:
+        tag, body = match.groups()
+        name = write_asset(body.strip().encode("utf-8"), stem, "css" if tag == "style" else "js", directory)
+        names.append(name)
+        if tag == "style":
+            return f'<link rel="stylesheet" href="{ASSET_URL}{name}">'
+        return f'<script src="{ASSET_URL}{name}"></script>'
+
+    return INLINE_BLOCK.sub(link, html), names
+
+class AssetStaticFiles(StaticFiles):
+    """StaticFiles serving fingerprinted assets precompressed, by Accept-Encoding, and immutable."""
+
+    async def get_response(self, path: str, scope):
+        if not FINGERPRINTED.match(path.replace(os.sep, "/")):
+            return await super().get_response(path, scope)
+        codings = accepted_codings(Headers(scope=scope).get("accept-encoding", ""))
+        for coding, suffix in CODING_SUFFIXES:
+            if coding in codings or "*" in codings:
+                full_path, stat_result = self.lookup_path(path + suffix)
+                if stat_result is not None:
+                    response = self.file_response(full_path, stat_result, scope)
+                    response.headers["Content-Type"] = mimetypes.guess_type(path)[0] + "; charset=utf-8"
+                    response.headers["Content-Encoding"] = coding
+                    break
+        else:
+            response = await super().get_response(path, scope)
+        response.headers["Cache-Control"] = ASSET_CACHE_CONTROL
+        response.headers["Vary"] = "Accept-Encoding"
+        return response
+
+class PageCache:
+    """Renders each registered template once per language and serves it with ETag/304 handling."""
+
+    def __init__(self, directory: str, pages: Dict[str, Tuple[str, dict]], snapshot: str = "pages",
+                 asset_dir: str = ASSET_DIR):
+        self.directory = directory
+        self.pages = pages            # name -> (template file, translations by lang)
+        self.snapshot = snapshot      # aot snapshot name
+        self.asset_dir = asset_dir    # where inline CSS/JS is extracted to
+        self.rendered: Dict[Tuple[str, str], RenderedPage] = {}
+        self.assets: List[str] = []
+        self.fingerprint: Optional[str] = None
+        self.checked_at = 0.0
+        self._templates = None
+
+    @property
+    def templates(self):
+        if self._templates is None:
+            from fastapi.templating import Jinja2Templates  # deferred: Jinja2 is only needed to render
+            self._templates = Jinja2Templates(directory=self.directory)
+        return self._templates
+
+    def source_fingerprint(self) -> str:
+        """Hash of template file stats and translation contents."""
+        digest = hashlib.sha256(self.asset_dir.encode())
+        for name, (template, translations) in sorted(self.pages.items()):
+            path = os.path.join(self.directory, template)
+            stat = os.stat(path)
+            digest.update(f"{name}:{template}:{stat.st_mtime_ns}:{stat.st_size}".encode())
+            digest.update(json.dumps(translations, sort_keys=True, ensure_ascii=False).encode())
+        return digest.hexdigest()
+
+    def build(self, use_snapshot: bool = True) -> None:
+        """Render every page variant; reuses the current set if sources are unchanged."""
+        fingerprint = self.source_fingerprint()
+        self.checked_at = time.monotonic()
+        if fingerprint == self.fingerprint:
+            return
+        snapshot = aot.load(self.snapshot, fingerprint) if use_snapshot and not self.rendered else None
+        # The snapshot is only usable if the assets its pages link to were written alongside it
+        if snapshot is not None and all(os.path.exists(os.path.join(self.asset_dir, name)) for name in snapshot[1]):
+            self.rendered, self.assets = snapshot
+            self.fingerprint = fingerprint
+            return
+        rendered, assets = {}, []
+        for name, (template, translations) in self.pages.items():
+            for lang in LANGUAGES:
+                html = self.templates.get_template(template).render(translations=translations[lang], lang=lang)
+                html, page_assets = extract_assets(html, name, self.asset_dir)
+                rendered[(name, lang)] = RenderedPage(html, [asset for asset in page_assets if asset.endswith(".css")])
+                assets.extend(page_assets)
+        self.rendered = rendered
+        self.assets = sorted(set(assets))
+        self.fingerprint = fingerprint
+
+    def save_snapshot(self) -> None:
+        self.build()
+        aot.save(self.snapshot, self.fingerprint, (self.rendered, self.assets))
+
+    def get(self, name: str, lang: str) -> RenderedPage:
+        if not self.rendered or time.monotonic() - self.checked_at > CHANGE_CHECK_INTERVAL:
+            self.build()
+        return self.rendered[(name, lang)]
+
+    def response(self, name: str, lang: str, headers) -> Response:
+        """Precompressed page for the request's Accept-Encoding, or 304 when the ETag matches."""
+        page = self.get(name, lang)
+        coding = select_coding(page, headers.get("accept-encoding", ""))
+        response_headers = {
+            "ETag": page.etags[coding],
+            "Cache-Control": CACHE_CONTROL,
+            "Vary": "Accept-Encoding",
+        }
+        if page.link:
+            response_headers["Link"] = page.link
+        if_none_match = headers.get("if-none-match")
+        if if_none_match and etag_matches(if_none_match, page):
+            return Response(status_code=304, headers=response_headers)
+        if coding != "identity":
+            response_headers["Content-Encoding"] = coding
+        return HTMLResponse(content=page.bodies[coding], headers=response_headers)
@@ -0,0 +1,275 @@
+"""Race pace planner: per-segment target paces over a course elevation profile.
+
+Uses the same effort model as calculate_eph, effort km = distance + gain/100.
+The course's cumulative effort curve is computed once when the course is
+registered. Solving a plan then only interpolates that curve at the segment
+boundaries, and a live re-plan from a given km only solves the remaining
+segments.
+"""
+from __future__ import annotations
+from collections import OrderedDict
+from fastapi import APIRouter, Request
+from pydantic import BaseModel, ValidationError
+from typing import List, Optional
+import hashlib
+import math
+
+from api import ERROR_INVALID_REQUEST, json_response, request_body_schema, validation_message
+from batch import hours_to_hms_array
+from boot import lazy_import
+from calculations import CalculationError, ERROR_NON_POSITIVE_EPH, ERROR_NON_POSITIVE_TIME, format_time, hms_to_hours
+from metrics import record_error, register_error_codes
+from models import ApiError
+
+np = lazy_import("numpy")
+
+router = APIRouter(prefix="/api/v1")
+
+MAX_COURSE_POINTS = 200_000
+MAX_SEGMENTS = 10_000
+MAX_PLAN_HOURS = 10_000.0         # latest arrival a plan may give, elapsed time included
+MAX_COURSES = 256                 # registered course profiles kept in memory, least recently used dropped
+
+# Error codes
+ERROR_INVALID_COURSE = "invalid_course"
+ERROR_UNKNOWN_COURSE = "unknown_course"
+ERROR_TARGET_REQUIRED = "target_required"
+ERROR_INVALID_POSITION = "invalid_position"
+ERROR_TARGET_PASSED = "target_passed"
+ERROR_INVALID_SPLIT = "invalid_split"
+ERROR_PLAN_OUT_OF_RANGE = "plan_out_of_range"
+register_error_codes(
+    ERROR_INVALID_COURSE,
+    ERROR_UNKNOWN_COURSE,
+    ERROR_TARGET_REQUIRED,
+    ERROR_INVALID_POSITION,
+    ERROR_TARGET_PASSED,
+    ERROR_INVALID_SPLIT,
+    ERROR_PLAN_OUT_OF_RANGE,
+)
+
+class CourseRequest(BaseModel):
+    distance_km: List[float]                # Cumulative distance of each profile point
+    elevation_m: List[float]                # Altitude of each profile point
+
+class CourseResponse(BaseModel):
+    course_id: str = ""
+    point_count: int = 0
+    distance_km: float = 0.0
+    elevation_gain_m: float = 0.0
+    effort_km: float = 0.0
+    error: Optional[ApiError] = None
+
+class PlanRequest(BaseModel):
+    course_id: Optional[str] = None         # A registered course, or an inline profile below
+    distance_km: Optional[List[float]] = None
+    elevation_m: Optional[List[float]] = None
+    target_time: Optional[str] = None       # Finish time hh:mm:ss, or
+    eph: Optional[float] = None             # target EpH
+    split: str = "km"                       # 'km' or 'checkpoints'
+    split_km: float = 1.0
+    checkpoints: List[float] = []           # Checkpoint km marks (split 'checkpoints')
+    from_km: float = 0.0                    # Re-plan: current position
+    elapsed_time: Optional[str] = None      # Re-plan: time taken to reach from_km
+
+class PlanSegment(BaseModel):
+    index: int
+    start_km: float
+    end_km: float
+    distance_km: float
+    elevation_gain_m: float
+    effort_km: float
+    pace: str                               # Target pace M:SS per km
+    pace_seconds: float
+    split_time: str
+    arrival_time: str                       # Cumulative from the start of the race
+
+class PlanResponse(BaseModel):
+    course_id: str = ""
+    distance_km: float = 0.0
+    elevation_gain_m: float = 0.0
+    effort_km: float = 0.0
+    eph: Optional[float] = None             # EpH required over the planned segments
+    finish_time: str = ""
+    from_km: float = 0.0
+    segments: List[PlanSegment] = []
+    error: Optional[ApiError] = None
+
+class CourseProfile:
+    """Cumulative distance and elevation gain at every profile point."""
+    __slots__ = ("course_id", "distance_km", "cum_gain_m")
+
+    def __init__(self, distance_km: np.ndarray, elevation_m: np.ndarray):
+        self.distance_km = distance_km
+        self.cum_gain_m = np.concatenate(([0.0], np.cumsum(np.maximum(np.diff(elevation_m), 0.0))))
+        digest = hashlib.sha256(distance_km.tobytes())
+        digest.update(elevation_m.tobytes())
+        self.course_id = digest.hexdigest()[:24]
+
+    @property
+    def total_km(self) -> float:
+        return float(self.distance_km[-1])
+
+    def gain_at(self, km: np.ndarray) -> np.ndarray:
+        return np.interp(km, self.distance_km, self.cum_gain_m)
+
+    def effort_at(self, km: np.ndarray) -> np.ndarray:
+        return km + self.gain_at(km) / 100
+
+_courses: "OrderedDict[str, CourseProfile]" = OrderedDict()
+
+def build_course(distance_km: List[float], elevation_m: List[float]) -> CourseProfile:
+    """Validate a profile and precompute its cumulative gain curve."""
+    distance = np.asarray(distance_km, dtype=np.float64)
+    elevation = np.asarray(elevation_m, dtype=np.float64)
+    if len(distance) != len(elevation):
+        raise CalculationError(ERROR_INVALID_COURSE, "distance_km and elevation_m must have the same length")
+    if not 2 <= len(distance) <= MAX_COURSE_POINTS:
+        raise CalculationError(ERROR_INVALID_COURSE, f"A course needs between 2 and {MAX_COURSE_POINTS} points")
+    if not (np.isfinite(distance).all() and np.isfinite(elevation).all()):
+        raise CalculationError(ERROR_INVALID_COURSE, "Course values must be finite numbers")
+    if distance[0] < 0 or (np.diff(distance) < 0).any() or distance[-1] <= distance[0]:
+        raise CalculationError(ERROR_INVALID_COURSE, "distance_km must start at 0 or more and never decrease")
+    return CourseProfile(distance, elevation)
+
+def store_course(course: CourseProfile) -> None:
+    _courses[course.course_id] = course
+    _courses.move_to_end(course.course_id)
+    while len(_courses) > MAX_COURSES:
+        _courses.popitem(last=False)
+
+def get_course(course_id: str) -> CourseProfile:
+    course = _courses.get(course_id)
+    if course is None:
+        raise CalculationError(ERROR_UNKNOWN_COURSE, "Unknown course_id; register the course first")
+    _courses.move_to_end(course_id)
+    return course
+
+def segment_edges(course: CourseProfile, from_km: float, split: str, split_km: float, checkpoints: List[float]) -> np.ndarray:
+    """Segment boundaries from from_km to the finish."""
+    total = course.total_km
+    if split == "km":
+        if not math.isfinite(split_km) or split_km <= 0 or (total - from_km) / split_km > MAX_SEGMENTS:
+            raise CalculationError(ERROR_INVALID_SPLIT, f"split_km must be positive and give at most {MAX_SEGMENTS} segments")
+        marks = np.arange(np.floor(from_km / split_km) + 1, np.ceil(total / split_km)) * split_km
+    elif split == "checkpoints":
+        if len(checkpoints) > MAX_SEGMENTS:
+            raise CalculationError(ERROR_INVALID_SPLIT, f"At most {MAX_SEGMENTS} checkpoints are allowed")
+        marks = np.unique(np.asarray(checkpoints, dtype=np.float64))
+    else:
+        raise CalculationError(ERROR_INVALID_SPLIT, "split must be 'km' or 'checkpoints'")
+    marks = marks[(marks > from_km) & (marks < total)]
+    return np.concatenate(([from_km], marks, [total]))
+
+def solve_plan(course: CourseProfile, target_hours: Optional[float] = None, eph: Optional[float] = None,
+               from_km: float = 0.0, elapsed_hours: float = 0.0, split: str = "km", split_km: float = 1.0,
+               checkpoints: List[float] = ()) -> dict:
+    """Target pace and arrival time of every segment from from_km to the finish.
+
+    With a target time, the EpH that spreads the remaining time over the
+    remaining effort is solved first; with an EpH it is used as given.
+    """
+    if not (math.isfinite(from_km) and course.distance_km[0] <= from_km < course.total_km):
+        raise CalculationError(ERROR_INVALID_POSITION, "from_km must lie on the course, before the finish")
+    edges = segment_edges(course, from_km, split, split_km, list(checkpoints))
+    effort = course.effort_at(edges)
+    if target_hours is not None:
+        remaining_hours = target_hours - elapsed_hours
+        if remaining_hours <= 0:
+            raise CalculationError(ERROR_TARGET_PASSED, "Elapsed time already exceeds the target time")
+        eph = float(effort[-1] - effort[0]) / remaining_hours
+    if eph is None:
+        raise CalculationError(ERROR_TARGET_REQUIRED, "target_time or eph is required")
+    if not (math.isfinite(eph) and eph > 0):
+        raise CalculationError(ERROR_NON_POSITIVE_EPH, "EpH must be greater than 0")
+
+    segment_km = np.diff(edges)
+    segment_effort = np.diff(effort)
+    segment_hours = segment_effort / eph
+    arrival_hours = elapsed_hours + np.cumsum(segment_hours)
+    if not arrival_hours[-1] <= MAX_PLAN_HOURS:
+        raise CalculationError(ERROR_PLAN_OUT_OF_RANGE, f"The plan must finish within {MAX_PLAN_HOURS:g} hours")
+    pace_seconds = segment_hours * 3600 / segment_km
+    pace_total = np.rint(pace_seconds).astype(np.int64)
+    split_times = hours_to_hms_array(segment_hours)
+    arrival_times = hours_to_hms_array(arrival_hours)
+    segments = [
+        {
+            "index": i + 1,
+            "start_km": round(start, 3),
+            "end_km": round(end, 3),
+            "distance_km": round(km, 3),
+            "elevation_gain_m": round(gain, 1),
+            "effort_km": round(seg_effort, 3),
+            "pace": format_time(*divmod(pace, 60)),
+            "pace_seconds": round(seconds, 1),
+            "split_time": split_time,
+            "arrival_time": arrival_time,
+        }
+        for i, (start, end, km, gain, seg_effort, pace, seconds, split_time, arrival_time) in enumerate(zip(
+            edges[:-1].tolist(), edges[1:].tolist(), segment_km.tolist(), np.diff(course.gain_at(edges)).tolist(),
+            segment_effort.tolist(), pace_total.tolist(), pace_seconds.tolist(), split_times, arrival_times,
+        ))
+    ]
+    full_effort = course.effort_at(course.distance_km[[0, -1]])
+    return {
+        "course_id": course.course_id,
+        "distance_km": round(course.total_km - float(course.distance_km[0]), 3),
+        "elevation_gain_m": round(float(course.cum_gain_m[-1]), 1),
+        "effort_km": round(float(full_effort[1] - full_effort[0]), 3),
+        "eph": round(eph, 3),
+        "finish_time": arrival_times[-1],
+        "from_km": from_km,
+        "segments": segments,
+    }
+
+def course_summary(course: CourseProfile) -> CourseResponse:
+    distance = course.total_km - float(course.distance_km[0])
+    gain = float(course.cum_gain_m[-1])
+    return CourseResponse(course_id=course.course_id, point_count=len(course.distance_km),
+                          distance_km=round(distance, 3), elevation_gain_m=round(gain, 1),
+                          effort_km=round(distance + gain / 100, 3))
+
+@router.post("/plan/courses", response_model=CourseResponse, openapi_extra=request_body_schema(CourseRequest))
+async def register_course(request: Request):
+    """Register a course profile once; plans and live re-plans then refer to it by course_id"""
+    try:
+        payload = CourseRequest.model_validate_json(await request.body())
+        course = build_course(payload.distance_km, payload.elevation_m)
+    except ValidationError as e:
+        record_error(request, ERROR_INVALID_REQUEST)
+        return json_response(CourseResponse(error=ApiError(code=ERROR_INVALID_REQUEST, message=validation_message(e))), 400)
+    except CalculationError as e:
+        record_error(request, e.code)
+        return json_response(CourseResponse(error=ApiError(code=e.code, message=str(e))), 400)
+    store_course(course)
+    return json_response(course_summary(course))
+
+@router.post("/plan", response_model=PlanResponse, openapi_extra=request_body_schema(PlanRequest))
+async def plan(request: Request):
+    """Per-km or per-checkpoint target paces and arrival times for a target finish time or EpH"""
+    try:
+        payload = PlanRequest.model_validate_json(await request.body())
+    except ValidationError as e:
+        record_error(request, ERROR_INVALID_REQUEST)
+        return json_response(PlanResponse(error=ApiError(code=ERROR_INVALID_REQUEST, message=validation_message(e))), 400)
+
+    try:
+        if payload.course_id:
+            course = get_course(payload.course_id)
+        elif payload.distance_km is not None and payload.elevation_m is not None:
+            course = build_course(payload.distance_km, payload.elevation_m)
+        else:
+            raise CalculationError(ERROR_INVALID_COURSE, "course_id or distance_km and elevation_m are required")
+        target_hours = None
+        if payload.target_time:
+            target_hours = hms_to_hours(payload.target_time)
+            if target_hours <= 0:
+                raise CalculationError(ERROR_NON_POSITIVE_TIME, "Time must be greater than 0")
+        elapsed_hours = hms_to_hours(payload.elapsed_time) if payload.elapsed_time else 0.0
+        result = solve_plan(course, target_hours, payload.eph, payload.from_km, elapsed_hours,
+                            payload.split, payload.split_km, payload.checkpoints)
+    except CalculationError as e:
+        record_error(request, e.code)
+        return json_response(PlanResponse(error=ApiError(code=e.code, message=str(e))), 400)
+    return json_response(PlanResponse(**result))
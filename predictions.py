@@ -0,0 +1,147 @@
+"""Cross-distance finish-time predictions from one reference performance.
+
+Layers a Riegel-style fatigue exponent over the EpH effort model: with
+effort km = distance + gain/100 (as in calculate_eph), a reference time T1
+over E1 effort km predicts T2 = T1 * (E2 / E1) ** k over E2. k = 1 is the
+constant-EpH assumption of calculate_time; Riegel's 1.06 is the default.
+
+Since T2 = (T1 / E1 ** k) * E2 ** k, the E2 ** k grid over every standard
+distance/elevation combination is computed for every allowed exponent in
+one vectorized pass on first use. A prediction scales one precomputed row
+by a scalar, and its serialized response is kept in an LRU keyed by the
+normalized reference, so a repeated reference is a single lookup.
+"""
+from __future__ import annotations
+from fastapi import APIRouter, Request
+from fastapi.responses import Response
+from functools import lru_cache
+from pydantic import BaseModel
+from typing import List, Optional
+
+from api import json_response
+from batch import hours_to_hms_array
+from boot import lazy_import
+from calculations import CalculationError, ERROR_NON_POSITIVE_TIME, hms_to_hours
+from metrics import record_error, register_error_codes
+from models import ApiError
+
+np = lazy_import("numpy")
+
+router = APIRouter(prefix="/api/v1")
+
+DISTANCES_KM = (5.0, 10.0, 21.1, 42.2, 50.0, 80.0, 100.0, 160.0)
+ELEVATIONS_M = (0.0, 500.0, 1000.0, 2000.0, 3000.0, 5000.0, 7500.0, 10000.0)
+DEFAULT_EXPONENT = 1.06
+MIN_EXPONENT = 1.0
+MAX_EXPONENT = 1.2
+EXPONENT_STEP = 0.01              # exponents are rounded to this step
+MAX_DISTANCE_KM = 1000.0
+MAX_REFERENCE_HOURS = MAX_DISTANCE_KM   # 1 km/h over the longest reference distance
+PREDICTION_CACHE_SIZE = 4096
+
+# Error codes
+ERROR_INVALID_REFERENCE = "invalid_reference"
+ERROR_INVALID_EXPONENT = "invalid_exponent"
+register_error_codes(ERROR_INVALID_REFERENCE, ERROR_INVALID_EXPONENT)
+
+class Prediction(BaseModel):
+    distance_km: float
+    elevation_m: float
+    effort_km: float
+    time: str                     # Predicted finish time hh:mm:ss
+    seconds: int
+    eph: float
+    pace: str                     # Average pace M:SS per km
+
+class PredictionResponse(BaseModel):
+    distance_km: float = 0.0      # Reference performance
+    elevation_m: float = 0.0
+    effort_km: float = 0.0
+    time: str = ""
+    eph: Optional[float] = None
+    exponent: float = DEFAULT_EXPONENT
+    distances_km: List[float] = []
+    elevations_m: List[float] = []
+    predictions: List[Prediction] = []  # Row-major: every elevation of the first distance, then the next
+    error: Optional[ApiError] = None
+
+EXPONENTS: List[float] = [round(MIN_EXPONENT + i * EXPONENT_STEP, 2)
+                          for i in range(round((MAX_EXPONENT - MIN_EXPONENT) / EXPONENT_STEP) + 1)]
+
+_grid = None                      # (distance, elevation, effort) columns of the standard combinations
+_effort_powers = None             # effort ** k, one row per exponent of EXPONENTS
+
+def effort_grid():
+    """Columns of the standard grid and effort ** k for every allowed k, built once."""
+    global _grid, _effort_powers
+    if _grid is None:
+        distance, elevation = np.meshgrid(np.array(DISTANCES_KM), np.array(ELEVATIONS_M), indexing="ij")
+        distance, elevation = distance.ravel(), elevation.ravel()
+        effort = distance + elevation / 100
+        _effort_powers = effort[None, :] ** np.array(EXPONENTS)[:, None]
+        _grid = (distance, elevation, effort)
+    return _grid, _effort_powers
+
+def exponent_index(exponent: float) -> int:
+    if not (MIN_EXPONENT - EXPONENT_STEP / 2 <= exponent <= MAX_EXPONENT + EXPONENT_STEP / 2):
+        raise CalculationError(ERROR_INVALID_EXPONENT, f"exponent must be between {MIN_EXPONENT} and {MAX_EXPONENT}")
+    return round((exponent - MIN_EXPONENT) / EXPONENT_STEP)
+
+def format_paces(pace_seconds: np.ndarray) -> List[str]:
+    minutes, seconds = np.divmod(np.rint(pace_seconds).astype(np.int64), 60)
+    return [f"{m}:{s:02d}" for m, s in zip(minutes.tolist(), seconds.tolist())]
+
+def predict_seconds(effort_km: float, seconds: int, index: int) -> np.ndarray:
+    """Predicted seconds over the standard grid for T1 = seconds over effort_km."""
+    _, powers = effort_grid()
+    return powers[index] * (seconds / effort_km ** EXPONENTS[index])
+
+@lru_cache(maxsize=PREDICTION_CACHE_SIZE)
+def prediction_json(distance_km: float, elevation_m: float, seconds: int, index: int) -> bytes:
+    """Serialized PredictionResponse for a normalized reference."""
+    (distance, elevation, effort), _ = effort_grid()
+    reference_effort = distance_km + elevation_m / 100
+    predicted = predict_seconds(reference_effort, seconds, index)
+    hours = predicted / 3600
+    cells = zip(distance.tolist(), elevation.tolist(), np.round(effort, 3).tolist(), hours_to_hms_array(hours),
+                np.rint(predicted).astype(np.int64).tolist(), np.round(effort / hours, 3).tolist(),
+                format_paces(predicted / distance))
+    return PredictionResponse(
+        distance_km=distance_km, elevation_m=elevation_m, effort_km=round(reference_effort, 3),
+        time=hours_to_hms_array(np.array([seconds / 3600]))[0], eph=round(reference_effort * 3600 / seconds, 3),
+        exponent=EXPONENTS[index], distances_km=list(DISTANCES_KM), elevations_m=list(ELEVATIONS_M),
+        predictions=[
+            Prediction(distance_km=d, elevation_m=e, effort_km=f, time=t, seconds=s, eph=r, pace=p)
+            for d, e, f, t, s, r, p in cells
+        ],
+    ).model_dump_json().encode()
+
+def predict(distance_km: float, elevation_m: float, time_str: str, exponent: float = DEFAULT_EXPONENT) -> bytes:
+    """Validate and normalize a reference, then serve its response from the cache."""
+    if not (0 < distance_km <= MAX_DISTANCE_KM) or not (0 <= elevation_m <= 100 * MAX_DISTANCE_KM):
+        raise CalculationError(ERROR_INVALID_REFERENCE,
+                               f"distance must be above 0 and at most {MAX_DISTANCE_KM:g} km, elevation 0 or more")
+    distance_km, elevation_m = round(float(distance_km), 3), round(float(elevation_m))
+    if distance_km <= 0:
+        raise CalculationError(ERROR_INVALID_REFERENCE, "distance must be at least 0.001 km")
+    seconds = round(hms_to_hours(time_str) * 3600)
+    if seconds <= 0:
+        raise CalculationError(ERROR_NON_POSITIVE_TIME, "Time must be greater than 0")
+    if seconds > MAX_REFERENCE_HOURS * 3600:
+        raise CalculationError(ERROR_INVALID_REFERENCE, f"time must be at most {MAX_REFERENCE_HOURS:g} hours")
+    return prediction_json(distance_km, elevation_m, seconds, exponent_index(exponent))
+
+def prediction_cache_stats() -> dict:
+    info = prediction_json.cache_info()
+    return {"hits": info.hits, "misses": info.misses, "size": info.currsize, "max_size": info.maxsize}
+
+@router.get("/predictions", response_model=PredictionResponse)
+async def predictions(request: Request, distance: float, time: str, elevation: float = 0.0,
+                      exponent: float = DEFAULT_EXPONENT):
+    """Predicted finish times over standard distance/elevation combinations from one reference performance"""
+    try:
+        content = predict(distance, elevation, time, exponent)
+    except CalculationError as e:
+        record_error(request, e.code)
+        return json_response(PredictionResponse(error=ApiError(code=e.code, message=str(e))), 400)
+    return Response(content=content, media_type="application/json")
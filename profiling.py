@@ -0,0 +1,146 @@
+"""Opt-in request profiling: sampled cProfile dumps and a slowest-requests list.
+
+Off unless PROFILE_SAMPLE_RATE is above 0 or PROFILE_TOKEN is set; app.py
+then does not install the middleware at all, so a disabled profiler costs
+nothing. When on:
+
+- a PROFILE_SAMPLE_RATE fraction of requests, and any request carrying
+  `X-Profile: <PROFILE_TOKEN>`, runs under cProfile and is written to
+  PROFILE_DIR as a .pstats file (`python -m pstats`, snakeviz, or flameprof
+  for a flamegraph). Only the newest PROFILE_KEEP files are kept;
+- every request's duration is kept for the last RECENT_REQUESTS requests,
+  and GET /debug/slow-requests lists the slowest of them.
+
+The debug endpoints expose request paths and profile dumps, so they always
+need the X-Profile token; with sampling on but no PROFILE_TOKEN, profiles are
+still written to PROFILE_DIR but the endpoints answer 404.
+
+cProfile follows the thread, not the request: while one request is being
+profiled, other requests the event loop interleaves with it show up in its
+profile too, so only one request is profiled at a time. Profiles taken under
+low concurrency (or via the header on a quiet worker) are the clean ones.
+"""
+from collections import deque
+from fastapi import APIRouter, Request
+from fastapi.responses import FileResponse, JSONResponse
+import asyncio
+import cProfile
+import hmac
+import os
+import pstats
+import random
+import re
+import time
+
+PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_TOKEN = os.environ.get("PROFILE_TOKEN", "")
+PROFILE_DIR = os.environ.get("PROFILE_DIR", "profiles")
+PROFILE_KEEP = int(os.environ.get("PROFILE_KEEP", "200"))
+RECENT_REQUESTS = 1000
+PROFILE_HEADER = b"x-profile"
+
+def profiling_enabled() -> bool:
+    return PROFILE_SAMPLE_RATE > 0 or bool(PROFILE_TOKEN)
+
+# (duration_ms, finished_at, method, path, route, status, profile file or None), newest last
+recent = deque(maxlen=RECENT_REQUESTS)
+
+def token_matches(value: str) -> bool:
+    return bool(PROFILE_TOKEN) and hmac.compare_digest(value.encode(), PROFILE_TOKEN.encode())
+
+def write_profile(profiler: cProfile.Profile, name: str) -> None:
+    """Dump one profile and drop the oldest files beyond PROFILE_KEEP."""
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    pstats.Stats(profiler).dump_stats(os.path.join(PROFILE_DIR, name))
+    files = sorted(entry for entry in os.listdir(PROFILE_DIR) if entry.endswith(".pstats"))
+    for old in files[:-PROFILE_KEEP]:
+        try:
+            os.remove(os.path.join(PROFILE_DIR, old))
+        except FileNotFoundError:
+            pass
+
+class ProfilingMiddleware:
+    """Pure ASGI middleware timing every HTTP request and profiling the sampled ones."""
+
+    def __init__(self, app, sample_rate: float = PROFILE_SAMPLE_RATE):
+        self.app = app
+        self.sample_rate = sample_rate
+        self.active = False               # a cProfile session is running on this thread
+        self.sequence = 0
+
+    def wants_profile(self, scope) -> bool:
+        if self.active or scope["path"].startswith("/debug/"):
+            return False
+        if PROFILE_TOKEN:
+            for name, value in scope["headers"]:
+                if name == PROFILE_HEADER:
+                    return token_matches(value.decode("latin-1"))
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        profiler = None
+        name = None
+        if self.wants_profile(scope):
+            self.active = True
+            self.sequence += 1
+            route = re.sub(r"[^\w-]+", "_", scope["path"].strip("/")) or "root"
+            name = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{self.sequence:06d}-{scope['method']}-{route[:60]}.pstats"
+            profiler = cProfile.Profile()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if profiler is not None:
+                    message.setdefault("headers", []).append((b"x-profile-file", name.encode()))
+            await send(message)
+
+        start = time.perf_counter()
+        if profiler is not None:
+            profiler.enable()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            if profiler is not None:
+                profiler.disable()
+                self.active = False
+            duration_ms = (time.perf_counter() - start) * 1000
+            route = scope.get("route")
+            recent.append((duration_ms, time.time(), scope["method"], scope["path"],
+                           getattr(route, "path", None), status, name))
+            if profiler is not None:
+                await asyncio.to_thread(write_profile, profiler, name)
+
+router = APIRouter()
+
+def guarded(request: Request) -> bool:
+    """Debug endpoints need the profile token; without a configured token they stay closed."""
+    return token_matches(request.headers.get("x-profile", ""))
+
+@router.get("/debug/slow-requests")
+async def slow_requests(request: Request, limit: int = 20):
+    """Slowest of the recent requests, with the profile file of those that were profiled"""
+    if not profiling_enabled() or not guarded(request):
+        return JSONResponse({"error": "Profiling is disabled or the X-Profile token is missing"}, status_code=404)
+    slowest = sorted(recent, key=lambda entry: entry[0], reverse=True)[:max(1, min(limit, RECENT_REQUESTS))]
+    return {
+        "window": len(recent),
+        "requests": [
+            {"duration_ms": round(duration, 3), "finished_at": finished, "method": method, "path": path,
+             "route": route, "status": status, "profile": profile}
+            for duration, finished, method, path, route, status, profile in slowest
+        ],
+    }
+
+@router.get("/debug/profiles/{name}")
+async def download_profile(request: Request, name: str):
+    """A saved .pstats file"""
+    path = os.path.join(PROFILE_DIR, os.path.basename(name))
+    if not profiling_enabled() or not guarded(request) or not name.endswith(".pstats") or not os.path.isfile(path):
+        return JSONResponse({"error": "Unknown profile"}, status_code=404)
+    return FileResponse(path, media_type="application/octet-stream", filename=os.path.basename(name))
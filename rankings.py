@@ -0,0 +1,308 @@
+"""EpH ranking index: "your EpH is in the top 12% for this race / distance band".
+
+Each race, each distance band and each (race, band) pair keeps a t-digest of
+the EpH values seen, instead of the values themselves. A digest is about a
+hundred centroids that is finest at the tails, so ranking an EpH is a binary
+search over the centroids, and adding a result or a whole race only merges
+new centroids in. Digests merge exactly like they add, which is how every
+server process shares one index. Each process collects new results in
+in-memory digests and periodically merges them into the digest files in
+RANKINGS_DIR under a file lock. Queries combine the latest file with
+whatever the process has not flushed yet.
+"""
+from __future__ import annotations
+from fastapi import APIRouter, Query, Request
+from pydantic import BaseModel
+from typing import Dict, Optional, Tuple
+import asyncio
+import fcntl
+import math
+import os
+import pickle
+import re
+
+from api import ERROR_INVALID_REQUEST, json_response
+from batch import to_float_array
+from boot import lazy_import
+from ingest import IngestError, RowParser, iter_line_blocks, score_block
+from metrics import record_error, register_error_codes
+from models import ApiError
+
+np = lazy_import("numpy")
+
+RANKINGS_DIR = os.environ.get("RANKINGS_DIR", os.path.join("data", "rankings"))
+COMPRESSION = 200                 # t-digest delta; about COMPRESSION / 2 centroids per digest
+BUFFER_SIZE = 4096                # values buffered before a digest compresses
+FLUSH_INTERVAL = 5.0              # seconds between merges of local results into the shared files
+RACE_ID = re.compile(r"[A-Za-z0-9][A-Za-z0-9_-]{0,63}")
+ALL = ""                          # race or band key meaning all of them
+
+# Distance bands in km, by upper edge (inclusive, so a 42.195 km marathon is in 21.1-42.2); the last is open-ended
+BAND_EDGES = (10.0, 21.1, 42.2, 60.0, 100.0)
+BAND_LABELS = ("0-10", "10-21.1", "21.1-42.2", "42.2-60", "60-100", "100+")
+
+# Error codes
+ERROR_INVALID_RACE = "invalid_race"
+ERROR_INVALID_BAND = "invalid_band"
+ERROR_NO_RESULTS = "no_results"
+register_error_codes(ERROR_INVALID_RACE, ERROR_INVALID_BAND, ERROR_NO_RESULTS)
+
+class RankingResponse(BaseModel):
+    race: str = ""                          # Empty when ranking across all races
+    band: str = ""                          # Empty when ranking across all distances
+    eph: float = 0.0
+    count: int = 0                          # Results ranked against
+    percentile: float = 0.0                 # Share of results with a lower EpH, in %
+    top_percent: float = 0.0                # Share of results with this EpH or higher, in %
+    median_eph: float = 0.0
+    error: Optional[ApiError] = None
+
+class RankingIngestResponse(BaseModel):
+    race: str = ""
+    added: int = 0                          # Rows added to the index
+    rejected: int = 0                       # Malformed rows or rows whose EpH could not be calculated
+    error: Optional[ApiError] = None
+
+class QuantileSketch:
+    """Merging t-digest over float values.
+
+    Centroids are sorted by mean. Compressing groups neighbours whose
+    cumulative quantile falls into the same unit of the arcsine scale
+    function, so centroids hold few values near q=0 and q=1 and many in
+    the middle.
+    """
+    __slots__ = ("means", "weights", "min", "max", "buffer", "buffered")
+
+    def __init__(self):
+        self.means = np.empty(0)
+        self.weights = np.empty(0)
+        self.min = math.inf
+        self.max = -math.inf
+        self.buffer = []
+        self.buffered = 0
+
+    def __getstate__(self):
+        self.compress()
+        return self.means, self.weights, self.min, self.max
+
+    def __setstate__(self, state):
+        self.means, self.weights, self.min, self.max = state
+        self.buffer = []
+        self.buffered = 0
+
+    @property
+    def count(self) -> int:
+        return int(self.weights.sum()) + self.buffered
+
+    def add(self, values: np.ndarray) -> None:
+        if not len(values):
+            return
+        self.add_centroids(values, np.ones(len(values)))
+
+    def merge(self, other: QuantileSketch) -> None:
+        other.compress()
+        if len(other.means):
+            self.add_centroids(other.means, other.weights)
+
+    def add_centroids(self, means: np.ndarray, weights: np.ndarray) -> None:
+        self.min = min(self.min, float(means.min()))
+        self.max = max(self.max, float(means.max()))
+        self.buffer.append((means, weights))
+        self.buffered += int(weights.sum())
+        if self.buffered >= BUFFER_SIZE:
+            self.compress()
+
+    def compress(self) -> None:
+        if not self.buffer:
+            return
+        means = np.concatenate([self.means] + [m for m, _ in self.buffer])
+        weights = np.concatenate([self.weights] + [w for _, w in self.buffer])
+        self.buffer = []
+        self.buffered = 0
+        order = np.argsort(means, kind="stable")
+        means, weights = means[order], weights[order]
+        cumulative = np.cumsum(weights)
+        q = (cumulative - weights / 2) / cumulative[-1]
+        k = np.floor(COMPRESSION / (2 * math.pi) * np.arcsin(2 * q - 1))
+        starts = np.flatnonzero(np.concatenate(([True], k[1:] != k[:-1])))
+        self.weights = np.add.reduceat(weights, starts)
+        self.means = np.add.reduceat(means * weights, starts) / self.weights
+
+    def cdf(self, x: float) -> float:
+        """Estimated share of values below x."""
+        self.compress()
+        if not len(self.means):
+            return math.nan
+        if x <= self.min:
+            return 0.0
+        if x >= self.max:
+            return 1.0
+        total = self.weights.sum()
+        midpoints = np.cumsum(self.weights) - self.weights / 2
+        return float(np.interp(x, np.concatenate(([self.min], self.means, [self.max])),
+                               np.concatenate(([0.0], midpoints, [total])))) / total
+
+    def quantile(self, q: float) -> float:
+        self.compress()
+        if not len(self.means):
+            return math.nan
+        total = self.weights.sum()
+        midpoints = np.cumsum(self.weights) - self.weights / 2
+        return float(np.interp(q * total, np.concatenate(([0.0], midpoints, [total])),
+                               np.concatenate(([self.min], self.means, [self.max]))))
+
+def band_of(distance_km: float) -> str:
+    return BAND_LABELS[np.searchsorted(BAND_EDGES, distance_km)]
+
+class RankingIndex:
+    """Digests keyed by (race, band), shared with other processes through RANKINGS_DIR."""
+
+    def __init__(self, directory: str = RANKINGS_DIR):
+        self.directory = directory
+        self.shared: Dict[Tuple[str, str], Tuple[int, QuantileSketch]] = {}   # key -> (file mtime_ns, digest)
+        self.local: Dict[Tuple[str, str], QuantileSketch] = {}                # results not flushed yet
+
+    def path(self, key: Tuple[str, str]) -> str:
+        race, band = key
+        return os.path.join(self.directory, f"{race or '_'}--{band or '_'}.tdigest")
+
+    def add(self, race: str, distance_km: np.ndarray, eph: np.ndarray) -> int:
+        """Add every finite, positive EpH; returns how many were added."""
+        valid = np.isfinite(eph) & (eph > 0) & np.isfinite(distance_km) & (distance_km >= 0)
+        distance_km, eph = distance_km[valid], eph[valid]
+        bands = np.searchsorted(BAND_EDGES, distance_km)
+        for band in np.unique(bands).tolist():
+            values = eph[bands == band]
+            for key in ((race, BAND_LABELS[band]), (ALL, BAND_LABELS[band])):
+                self.local.setdefault(key, QuantileSketch()).add(values)
+        for key in ((race, ALL), (ALL, ALL)):
+            self.local.setdefault(key, QuantileSketch()).add(eph)
+        return len(eph)
+
+    def load(self, key: Tuple[str, str]) -> Optional[QuantileSketch]:
+        """The shared digest, re-read only when another process has rewritten its file."""
+        try:
+            mtime = os.stat(self.path(key)).st_mtime_ns
+        except FileNotFoundError:
+            return None
+        cached = self.shared.get(key)
+        if cached is None or cached[0] != mtime:
+            with open(self.path(key), "rb") as f:
+                cached = self.shared[key] = (mtime, pickle.load(f))
+        return cached[1]
+
+    def flush(self) -> None:
+        """Merge the local digests into their files, one exclusive lock per file."""
+        if not self.local:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        for key, sketch in list(self.local.items()):
+            path = self.path(key)
+            with open(path + ".lock", "w") as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                merged = QuantileSketch()
+                if os.path.exists(path):
+                    with open(path, "rb") as f:
+                        merged = pickle.load(f)
+                merged.merge(sketch)
+                with open(path + ".tmp", "wb") as f:
+                    pickle.dump(merged, f, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(path + ".tmp", path)
+                self.shared[key] = (os.stat(path).st_mtime_ns, merged)
+            del self.local[key]
+
+    def rank(self, race: str, band: str, eph: float) -> Optional[dict]:
+        """Share of results below eph, combining the shared and the unflushed digests."""
+        parts = [sketch for sketch in (self.load((race, band)), self.local.get((race, band))) if sketch is not None]
+        counts = [sketch.count for sketch in parts]
+        total = sum(counts)
+        if not total:
+            return None
+        below = sum(count * sketch.cdf(eph) for count, sketch in zip(counts, parts)) / total
+        median = parts[0]
+        if len(parts) > 1:
+            median = QuantileSketch()
+            for sketch in parts:
+                median.merge(sketch)
+        return {"count": total, "below": below, "median": median.quantile(0.5)}
+
+index = RankingIndex()
+
+async def flush_periodically() -> None:
+    while True:
+        await asyncio.sleep(FLUSH_INTERVAL)
+        index.flush()
+
+flush_task: Optional[asyncio.Task] = None
+
+def start_flushing() -> None:
+    global flush_task
+    flush_task = asyncio.get_running_loop().create_task(flush_periodically())
+
+def stop_flushing() -> None:
+    if flush_task is not None:
+        flush_task.cancel()
+    index.flush()
+
+router = APIRouter(prefix="/api/v1", on_startup=[start_flushing], on_shutdown=[stop_flushing])
+
+def record_scored(race: str):
+    """on_scored callback of the results stream feeding the index."""
+    def record(distance, eph) -> None:
+        index.add(race, to_float_array(list(distance)), eph)
+    return record
+
+@router.post("/rankings/{race}/results", response_model=RankingIngestResponse)
+async def add_race_results(request: Request, race: str):
+    """Add a race's results (CSV with bib,distance,elevation,time header, or NDJSON) to the ranking index"""
+    if not RACE_ID.fullmatch(race):
+        record_error(request, ERROR_INVALID_RACE)
+        return json_response(RankingIngestResponse(error=ApiError(
+            code=ERROR_INVALID_RACE, message="race must be 1-64 letters, digits, '-' or '_'")), 400)
+    parser = RowParser("ndjson" if "json" in request.headers.get("content-type", "") else "csv")
+    added = rejected = 0
+    try:
+        async for lines in iter_line_blocks(request.stream()):
+            rows, failed = parser.parse(lines)
+            rejected += len(failed)
+            if rows:
+                _, _, distance, elevation, times = zip(*rows)
+                eph, _ = score_block(list(distance), list(elevation), list(times))
+                count = index.add(race, to_float_array(list(distance)), eph)
+                added += count
+                rejected += len(rows) - count
+    except IngestError as e:
+        record_error(request, ERROR_INVALID_REQUEST)
+        return json_response(RankingIngestResponse(race=race, added=added, rejected=rejected, error=ApiError(
+            code=ERROR_INVALID_REQUEST, message=f"Upload stopped at line {parser.line_no}: {e.code}")), 400)
+    return json_response(RankingIngestResponse(race=race, added=added, rejected=rejected))
+
+@router.get("/rankings", response_model=RankingResponse)
+async def ranking(request: Request, eph: float, race: str = "", distance: Optional[float] = Query(None, ge=0),
+                  band: str = ""):
+    """Percentile of an EpH within a race and/or distance band (by distance km or band label)"""
+    if not math.isfinite(eph):
+        record_error(request, ERROR_INVALID_REQUEST)
+        return json_response(RankingResponse(error=ApiError(
+            code=ERROR_INVALID_REQUEST, message="eph must be a finite number")), 400)
+    if race and not RACE_ID.fullmatch(race):
+        record_error(request, ERROR_INVALID_RACE)
+        return json_response(RankingResponse(error=ApiError(
+            code=ERROR_INVALID_RACE, message="race must be 1-64 letters, digits, '-' or '_'")), 400)
+    if distance is not None:
+        band = band_of(distance)
+    elif band and band not in BAND_LABELS:
+        record_error(request, ERROR_INVALID_BAND)
+        return json_response(RankingResponse(error=ApiError(
+            code=ERROR_INVALID_BAND, message=f"band must be one of {', '.join(BAND_LABELS)}")), 400)
+
+    result = index.rank(race, band, eph)
+    if result is None:
+        record_error(request, ERROR_NO_RESULTS)
+        return json_response(RankingResponse(race=race, band=band, eph=eph, error=ApiError(
+            code=ERROR_NO_RESULTS, message="No results recorded for this race and band")), 404)
+    return json_response(RankingResponse(
+        race=race, band=band, eph=eph, count=result["count"],
+        percentile=round(100 * result["below"], 1), top_percent=round(100 * (1 - result["below"]), 1),
+        median_eph=round(result["median"], 3),
+    ))
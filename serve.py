@@ -0,0 +1,264 @@
+"""Pre-forking server: one master process and N uvicorn workers sharing a socket.
+
+The master imports the app and builds the read-only precomputed data (pace
+tables, rendered pages) once, then freezes the GC so those objects are never
+touched again. Workers are forked from it and share the pages copy-on-write
+instead of rebuilding them. Background jobs run in one more child, the job
+runner, which is left alone by worker recycling and reloads.
+
+Signals to the master:
+    SIGHUP           rolling restart: rebuild pages, start fresh workers, then retire the old ones
+    SIGTTIN/SIGTTOU  add / remove one worker
+    SIGTERM/SIGINT   graceful shutdown
+Workers exit after --max-requests requests (with jitter) and are replaced,
+and crashed workers and a crashed job runner are respawned.
+
+    python serve.py --workers 4 --port 8080
+"""
+import boot  # first, so the startup report covers every import below
+import argparse
+import asyncio
+import gc
+import os
+import random
+import shutil
+import signal
+import socket
+import sys
+import tempfile
+import time
+
+import uvicorn
+
+boot.mark("import server")
+
+DEFAULT_WORKERS = int(os.environ.get("WEB_CONCURRENCY", os.cpu_count() or 1))
+DEFAULT_MAX_REQUESTS = int(os.environ.get("MAX_REQUESTS", 0))
+GRACEFUL_TIMEOUT = 30.0            # seconds a retiring worker gets to finish in-flight requests
+RESPAWN_BACKOFF = 1.0              # seconds between respawns of a worker that keeps crashing at boot
+MIN_WORKER_LIFETIME = 1.0
+ACCEPT_DRAIN = 0.25                # seconds between closing the listener and closing idle connections
+
+def preload():
+    """Import the app and build everything workers only read."""
+    import app as application
+    from lookup import build_pace_table
+
+    boot.mark("import app")
+    build_pace_table()
+    boot.mark("pace table")
+    application.page_cache.build()
+    boot.mark("pages")
+    return application.app
+
+def bind_socket(host: str, port: int, backlog: int) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    # An explicit IPPROTO_TCP makes asyncio set TCP_NODELAY on accepted connections
+    sock = socket.socket(family, socket.SOCK_STREAM, socket.IPPROTO_TCP)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+class WorkerServer(uvicorn.Server):
+    """uvicorn server that lets just-accepted connections deliver their request before shutdown.
+
+    Stock shutdown closes every connection without a request in flight at
+    once, which resets clients whose request had not been read yet. Other
+    workers keep accepting on the shared socket meanwhile.
+    """
+
+    async def shutdown(self, sockets=None) -> None:
+        for server in self.servers:
+            server.close()
+        await asyncio.sleep(ACCEPT_DRAIN)
+        await super().shutdown(sockets)
+
+class Master:
+    """Forks, supervises and recycles uvicorn worker processes and the job runner."""
+
+    def __init__(self, app, sock: socket.socket, workers: int, max_requests: int, log_level: str):
+        self.app = app
+        self.sock = sock
+        self.target = max(1, workers)
+        self.max_requests = max_requests
+        self.log_level = log_level
+        self.workers = {}          # pid -> start time
+        self.retiring = {}         # pid -> deadline for SIGKILL
+        self.job_runner = None     # (pid, start time) of the job runner process
+        self.pending = []          # signals received since the last loop pass
+        self.running = True
+
+    def log(self, message: str) -> None:
+        print(f"[serve {os.getpid()}] {message}", file=sys.stderr, flush=True)
+
+    def worker_config(self) -> uvicorn.Config:
+        limit = None
+        if self.max_requests:
+            # Jitter keeps workers from recycling in lockstep
+            limit = self.max_requests + random.randint(0, max(1, self.max_requests // 10))
+        return uvicorn.Config(self.app, log_level=self.log_level, limit_max_requests=limit,
+                              timeout_graceful_shutdown=GRACEFUL_TIMEOUT)
+
+    def spawn(self) -> None:
+        config = self.worker_config()
+        pid = os.fork()
+        if pid:
+            self.workers[pid] = time.monotonic()
+            return
+        # Worker: default signal handling, uvicorn installs its own
+        for sig in (signal.SIGHUP, signal.SIGTTIN, signal.SIGTTOU, signal.SIGCHLD):
+            signal.signal(sig, signal.SIG_DFL)
+        status = 0
+        try:
+            WorkerServer(config).run(sockets=[self.sock])
+        except BaseException:
+            status = 1
+        finally:
+            os._exit(status)
+
+    def spawn_job_runner(self) -> None:
+        import jobs
+
+        pid = os.fork()
+        if pid:
+            self.job_runner = (pid, time.monotonic())
+            return
+        for sig in (signal.SIGHUP, signal.SIGTTIN, signal.SIGTTOU, signal.SIGCHLD, signal.SIGTERM, signal.SIGINT):
+            signal.signal(sig, signal.SIG_DFL)
+        status = 0
+        try:
+            jobs.run_dedicated_runner()
+        except BaseException:
+            status = 1
+        finally:
+            os._exit(status)
+
+    def retire(self, pid: int) -> None:
+        self.workers.pop(pid, None)
+        self.retiring[pid] = time.monotonic() + GRACEFUL_TIMEOUT
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            self.retiring.pop(pid, None)
+
+    def reap(self) -> None:
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if not pid:
+                return
+            self.retiring.pop(pid, None)
+            started = self.workers.pop(pid, None)
+            if self.job_runner and self.job_runner[0] == pid:
+                started = self.job_runner[1]
+                self.job_runner = None
+            if started is not None and self.running:
+                code = os.waitstatus_to_exitcode(status)
+                self.log(f"process {pid} exited with {code}, respawning")
+                if time.monotonic() - started < MIN_WORKER_LIFETIME:
+                    time.sleep(RESPAWN_BACKOFF)
+
+    def reload(self) -> None:
+        """Rolling restart; new workers are up before the old ones stop accepting."""
+        from app import page_cache
+
+        gc.unfreeze()
+        page_cache.build()
+        gc.freeze()
+        old = list(self.workers)
+        for _ in range(self.target):
+            self.spawn()
+        for pid in old:
+            self.retire(pid)
+        self.log(f"reloaded {self.target} workers")
+
+    def handle(self, sig: int) -> None:
+        if sig in (signal.SIGTERM, signal.SIGINT):
+            self.running = False
+        elif sig == signal.SIGHUP:
+            self.reload()
+        elif sig == signal.SIGTTIN:
+            self.target += 1
+        elif sig == signal.SIGTTOU:
+            self.target = max(1, self.target - 1)
+
+    def kill_overdue(self) -> None:
+        now = time.monotonic()
+        for pid, deadline in list(self.retiring.items()):
+            if now > deadline:
+                try:
+                    os.kill(pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    self.retiring.pop(pid, None)
+
+    def run(self) -> None:
+        for sig in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP, signal.SIGTTIN, signal.SIGTTOU, signal.SIGCHLD):
+            signal.signal(sig, lambda signum, frame: self.pending.append(signum))
+        # Keep the preloaded objects out of GC passes so their pages stay shared
+        gc.freeze()
+        self.log(boot.report())
+        self.log(f"listening on {self.sock.getsockname()[:2]} with {self.target} workers")
+
+        while self.running:
+            self.reap()
+            while self.pending and self.running:
+                self.handle(self.pending.pop(0))
+            if not self.running:
+                break
+            if self.job_runner is None:
+                self.spawn_job_runner()
+            while len(self.workers) < self.target:
+                self.spawn()
+            while len(self.workers) > self.target:
+                self.retire(max(self.workers, key=self.workers.get))
+            self.kill_overdue()
+            time.sleep(0.1)
+
+        for pid in list(self.workers):
+            self.retire(pid)
+        if self.job_runner:
+            # Running jobs are re-queued by the runner and resume on the next start
+            self.retire(self.job_runner[0])
+            self.job_runner = None
+        while self.retiring:
+            self.reap()
+            self.kill_overdue()
+            time.sleep(0.1)
+        self.log("stopped")
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Pre-forking server for the calculator app")
+    parser.add_argument("--host", default=os.environ.get("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.environ.get("PORT", 8080)))
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="worker processes (WEB_CONCURRENCY)")
+    parser.add_argument("--max-requests", type=int, default=DEFAULT_MAX_REQUESTS,
+                        help="recycle a worker after this many requests, 0 to disable (MAX_REQUESTS)")
+    parser.add_argument("--backlog", type=int, default=2048)
+    parser.add_argument("--log-level", default="info")
+    parser.add_argument("--metrics-dir", default=os.environ.get("METRICS_DIR", ""),
+                        help="directory the workers share /metrics counters through (METRICS_DIR); "
+                             "a temporary one is used when unset")
+    args = parser.parse_args(argv)
+
+    app = preload()
+    import jobs
+    import metrics
+
+    # Web workers leave jobs to the job runner, which outlives their recycling
+    jobs.INLINE_RUNNER = False
+    # Workers must see the directory from their first request, so it is set before any fork
+    metrics_dir = args.metrics_dir or tempfile.mkdtemp(prefix="eph-metrics-")
+    metrics.use_directory(metrics_dir)
+    sock = bind_socket(args.host, args.port, args.backlog)
+    try:
+        Master(app, sock, args.workers, args.max_requests, args.log_level).run()
+    finally:
+        if not args.metrics_dir:
+            shutil.rmtree(metrics_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
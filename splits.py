@@ -0,0 +1,189 @@
+"""Track split tables for any distance, lap length and split granularity.
+
+Splits are computed as arrays over a range of split indices, so a page or a
+streamed block of a 100 km track ultra costs the same as a 1500 m race and
+no full table is ever materialized.
+"""
+from __future__ import annotations
+from fastapi import APIRouter, Request, Query
+from fastapi.responses import Response, StreamingResponse
+from pydantic import BaseModel
+from typing import Iterator, List, Optional
+import json
+
+from boot import lazy_import
+from calculations import CalculationError
+from lookup import lookup_pace_seconds
+from metrics import record_error, register_error_codes
+
+np = lazy_import("numpy")
+
+router = APIRouter()
+
+MAX_DISTANCE_M = 1_000_000        # 1000 km
+MAX_SPLITS = 1_000_000
+MIN_LAP_M = 50
+MAX_LAP_M = 10_000
+DEFAULT_PAGE_SIZE = 500
+MAX_PAGE_SIZE = 10_000
+BLOCK_ROWS = 2048                 # rows per streamed chunk
+
+# Error codes
+ERROR_INVALID_DISTANCE = "invalid_distance"
+ERROR_INVALID_LAP = "invalid_lap"
+ERROR_INVALID_SPLIT = "invalid_split"
+ERROR_TOO_MANY_SPLITS = "too_many_splits"
+register_error_codes(ERROR_INVALID_DISTANCE, ERROR_INVALID_LAP, ERROR_INVALID_SPLIT, ERROR_TOO_MANY_SPLITS)
+
+class SplitRow(BaseModel):
+    index: int                    # 1-based split number
+    lap: int                      # 1-based lap the split ends in
+    distance_m: float             # Cumulative distance at the split
+    split_seconds: float          # Time for this split
+    lap_seconds: float            # Time since the start of the current lap
+    elapsed_seconds: float        # Cumulative time
+    elapsed: str                  # Cumulative time as [H:]MM:SS.s
+
+class TrackSplitsResponse(BaseModel):
+    pace_seconds: int = 0
+    distance_m: float = 0.0
+    lap_m: int = 0
+    split_m: int = 0
+    total_seconds: float = 0.0
+    total_time: str = ""
+    full_laps: int = 0
+    remaining_m: float = 0.0      # Distance past the last full lap
+    lap_seconds: float = 0.0      # Time per full lap
+    split_seconds: float = 0.0    # Time per full split
+    split_count: int = 0
+    offset: int = 0
+    next_offset: Optional[int] = None
+    splits: List[SplitRow] = []
+    error: str = ""               # Error code, empty string for no error
+
+def split_count(distance_m: float, split_m: int) -> int:
+    """Number of splits, counting a trailing partial split."""
+    full = int(distance_m // split_m)
+    return full + (distance_m - full * split_m > 1e-9)
+
+def validate_plan(distance_m: float, lap_m: int, split_m: int) -> Optional[str]:
+    """Error code for an unusable distance/lap/split combination, or None."""
+    if not 0 < distance_m <= MAX_DISTANCE_M:
+        return ERROR_INVALID_DISTANCE
+    if not MIN_LAP_M <= lap_m <= MAX_LAP_M:
+        return ERROR_INVALID_LAP
+    # Splits must tile the lap so every lap starts on a split boundary
+    if split_m <= 0 or split_m > lap_m or lap_m % split_m:
+        return ERROR_INVALID_SPLIT
+    if split_count(distance_m, split_m) > MAX_SPLITS:
+        return ERROR_TOO_MANY_SPLITS
+    return None
+
+def format_clock(seconds: np.ndarray) -> List[str]:
+    """Format seconds as MM:SS.s, or H:MM:SS.s from one hour."""
+    tenths = np.rint(seconds * 10).astype(np.int64)
+    hours, rem = np.divmod(tenths, 36000)
+    minutes, rem = np.divmod(rem, 600)
+    secs, tenth = np.divmod(rem, 10)
+    return [
+        f"{h}:{m:02d}:{s:02d}.{t}" if h else f"{m:02d}:{s:02d}.{t}"
+        for h, m, s, t in zip(hours.tolist(), minutes.tolist(), secs.tolist(), tenth.tolist())
+    ]
+
+def split_rows(pace_seconds: int, distance_m: float, lap_m: int, split_m: int, start: int, stop: int) -> dict:
+    """Columns for splits start..stop-1 (0-based), computed in one vectorized pass."""
+    index = np.arange(start, stop, dtype=np.int64)
+    seconds_per_m = pace_seconds / 1000
+    marks = np.minimum((index + 1) * split_m, distance_m).astype(np.float64)
+    previous = np.minimum(index * split_m, distance_m).astype(np.float64)
+    lap = (index * split_m) // lap_m + 1
+    return {
+        "index": index + 1,
+        "lap": lap,
+        "distance_m": marks,
+        "split_seconds": (marks - previous) * seconds_per_m,
+        "lap_seconds": (marks - (lap - 1) * lap_m) * seconds_per_m,
+        "elapsed_seconds": marks * seconds_per_m,
+    }
+
+def split_records(columns: dict) -> Iterator[tuple]:
+    return zip(
+        columns["index"].tolist(),
+        columns["lap"].tolist(),
+        np.round(columns["distance_m"], 3).tolist(),
+        np.round(columns["split_seconds"], 2).tolist(),
+        np.round(columns["lap_seconds"], 2).tolist(),
+        np.round(columns["elapsed_seconds"], 2).tolist(),
+        format_clock(columns["elapsed_seconds"]),
+    )
+
+ROW_FIELDS = ("index", "lap", "distance_m", "split_seconds", "lap_seconds", "elapsed_seconds", "elapsed")
+
+def plan_summary(pace_seconds: int, distance_m: float, lap_m: int, split_m: int) -> dict:
+    total_seconds = distance_m * pace_seconds / 1000
+    full_laps = int(distance_m // lap_m)
+    return {
+        "pace_seconds": pace_seconds,
+        "distance_m": distance_m,
+        "lap_m": lap_m,
+        "split_m": split_m,
+        "total_seconds": round(total_seconds, 2),
+        "total_time": format_clock(np.array([total_seconds]))[0],
+        "full_laps": full_laps,
+        "remaining_m": round(distance_m - full_laps * lap_m, 3),
+        "lap_seconds": round(lap_m * pace_seconds / 1000, 2),
+        "split_seconds": round(split_m * pace_seconds / 1000, 2),
+        "split_count": split_count(distance_m, split_m),
+    }
+
+def split_table_stream(pace_seconds: int, distance_m: float, lap_m: int, split_m: int,
+                       output_format: str) -> Iterator[str]:
+    """Yield the whole split table as NDJSON or CSV, one block of rows at a time."""
+    count = split_count(distance_m, split_m)
+    if output_format == "csv":
+        yield ",".join(ROW_FIELDS) + "\n"
+    for start in range(0, count, BLOCK_ROWS):
+        records = split_records(split_rows(pace_seconds, distance_m, lap_m, split_m, start, min(start + BLOCK_ROWS, count)))
+        if output_format == "csv":
+            yield "".join(",".join(map(str, record)) + "\n" for record in records)
+        else:
+            yield "".join(json.dumps(dict(zip(ROW_FIELDS, record))) + "\n" for record in records)
+
+def json_response(payload: dict) -> Response:
+    return Response(content=json.dumps(payload), media_type="application/json")
+
+@router.get("/track/splits", response_model=TrackSplitsResponse)
+async def track_splits(request: Request,
+                       pace: str = Query(..., description="Pace per km, M:SS or M"),
+                       distance_m: float = Query(400, description="Race distance in meters"),
+                       lap_m: int = Query(400, description="Lap length in meters, e.g. 200 indoors"),
+                       split_m: int = Query(100, description="Split length in meters; must divide the lap"),
+                       offset: int = Query(0, ge=0, description="First split of the page (0-based)"),
+                       limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Splits per page"),
+                       output: str = Query("json", description="json (paginated), or ndjson/csv (whole table, streamed)")):
+    """Lap and split table for any distance, lap length and split length"""
+    try:
+        pace_seconds = lookup_pace_seconds(pace)
+    except CalculationError as e:
+        record_error(request, e.code)
+        return json_response({"error": e.code})
+    code = validate_plan(distance_m, lap_m, split_m)
+    if code:
+        record_error(request, code)
+        return json_response({"error": code})
+
+    if output in ("ndjson", "csv"):
+        return StreamingResponse(
+            split_table_stream(pace_seconds, distance_m, lap_m, split_m, output),
+            media_type="text/csv" if output == "csv" else "application/x-ndjson",
+        )
+
+    summary = plan_summary(pace_seconds, distance_m, lap_m, split_m)
+    count = summary["split_count"]
+    stop = min(offset + limit, count)
+    rows = []
+    if offset < stop:
+        records = split_records(split_rows(pace_seconds, distance_m, lap_m, split_m, offset, stop))
+        rows = [dict(zip(ROW_FIELDS, record)) for record in records]
+    summary.update(offset=offset, next_offset=stop if stop < count else None, splits=rows, error="")
+    return json_response(summary)
@@ -0,0 +1,44 @@
+from fastapi.testclient import TestClient
+
+from activity import analyze_track
+from app import app
+from jobs import run_activity_job
+
+client = TestClient(app)
+
+GPX = b"""<?xml version="1.0"?>
+<gpx><trk><trkseg>
+<trkpt lat="0" lon="0"><ele>100</ele><time>2024-01-01T00:00:00Z</time></trkpt>
+<trkpt lat="3" lon="0"><ele>200</ele><time>2024-01-02T00:00:00Z</time></trkpt>
+</trkseg></trk></gpx>"""
+
+def test_tiny_split_km_is_rejected_not_allocated():
+    result = analyze_track(GPX, "km", 1e-6)
+    assert result["error"] == "invalid_split" and result["splits"] == []
+
+def test_split_km_within_limit_still_splits():
+    result = analyze_track(GPX, "km", 100.0)
+    assert result["error"] == "" and len(result["splits"]) == 4
+
+def test_route_rejects_non_finite_split_km():
+    for value in ("nan", "inf"):
+        response = client.post(f"/activity/analyze?split_km={value}", content=GPX)
+        assert response.status_code == 200
+        assert response.json()["error"] == "invalid_split"
+
+def test_activity_job_rejects_non_finite_split_km():
+    class Out(bytearray):
+        write = bytearray.extend
+
+    out = Out()
+    run_activity_job({"split_km": "nan"}, GPX, out)
+    assert b'"error":"invalid_split"' in bytes(out)
+
+def test_non_finite_points_are_dropped():
+    track = GPX.replace(b'<trkpt lat="3"', b'<trkpt lat="inf" lon="0"><ele>1</ele></trkpt>\n<trkpt lat="3"') \
+               .replace(b"<ele>200</ele>", b"<ele>inf</ele>")
+    response = client.post("/activity/analyze?split_km=100", content=track)
+    assert response.status_code == 200
+    body = response.json()
+    assert body["error"] == "" and body["point_count"] == 2 and body["elevation_gain_m"] == 0.0
+    assert len(body["splits"]) == 4
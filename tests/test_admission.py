@@ -0,0 +1,110 @@
+import asyncio
+
+import pytest
+
+from admission import HIGH, LOW, NORMAL, AdmissionController, Shed
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+async def queued(controller: AdmissionController, priority: int, order: list) -> asyncio.Task:
+    async def wait():
+        await controller.acquire(priority)
+        order.append(priority)
+
+    task = asyncio.create_task(wait())
+    await asyncio.sleep(0)
+    return task
+
+def test_freed_slots_go_to_the_most_important_waiter():
+    async def scenario():
+        controller = AdmissionController(limit=1, reserved=0, target_ms=1000)
+        await controller.acquire(NORMAL)
+        order = []
+        tasks = [await queued(controller, priority, order) for priority in (LOW, NORMAL, HIGH)]
+        for _ in tasks:
+            controller.release()
+            await asyncio.sleep(0)
+        await asyncio.gather(*tasks)
+        return order
+
+    assert run(scenario()) == [HIGH, NORMAL, LOW]
+
+def test_reserved_slots_admit_only_high():
+    async def scenario():
+        controller = AdmissionController(limit=2, reserved=1, target_ms=1000)
+        await controller.acquire(NORMAL)
+        order = []
+        waiting = await queued(controller, LOW, order)
+        await controller.acquire(HIGH)                         # the reserved slot, at once
+        assert order == [] and controller.in_flight == 2
+        controller.release()                                   # HIGH leaves; its slot stays reserved
+        await asyncio.sleep(0)
+        assert order == []
+        controller.release()
+        await waiting
+        return order
+
+    assert run(scenario()) == [LOW]
+
+def test_reservation_is_kept_exactly_or_refused():
+    assert AdmissionController(limit=2, reserved=1).capacity[NORMAL] == 1
+    assert AdmissionController(limit=1, reserved=0).capacity[LOW] == 1
+    with pytest.raises(ValueError):
+        AdmissionController(limit=1, reserved=1)
+
+def test_arrivals_are_shed_on_the_delay_of_their_own_priority_and_above():
+    async def scenario():
+        controller = AdmissionController(limit=1, reserved=0, target_ms=100)
+        await controller.acquire(NORMAL)
+        old_low = await queued(controller, LOW, [])
+        # Past the NORMAL shedding delay (1x target), before the LOW waiter times out (2x)
+        await asyncio.sleep(0.15)
+        with pytest.raises(Shed) as shed:
+            await controller.acquire(LOW)
+        assert shed.value.reason == "delay" and shed.value.retry_after >= 1
+        # Only LOW requests are old; HIGH and NORMAL arrivals wait behind nobody and queue
+        order = []
+        high = await queued(controller, HIGH, order)
+        normal = await queued(controller, NORMAL, order)
+        for _ in range(3):
+            controller.release()
+            await asyncio.sleep(0)
+        await asyncio.gather(high, normal, old_low, return_exceptions=True)
+        return order, controller.stats()["priorities"]
+
+    order, priorities = run(scenario())
+    assert order == [HIGH, NORMAL]
+    assert priorities["low"]["shed_delay"] == 1 and priorities["normal"]["shed_delay"] == 0
+
+def test_queued_requests_time_out():
+    async def scenario():
+        controller = AdmissionController(limit=1, reserved=0, target_ms=5)
+        await controller.acquire(NORMAL)
+        with pytest.raises(Shed) as shed:
+            await controller.acquire(NORMAL)                   # sheds after 4x target
+        assert shed.value.reason == "timeout"
+        assert not any(controller.queues) and controller.in_flight == 1
+
+    run(scenario())
+
+def test_cancelled_waiter_passes_a_handed_over_slot_on():
+    async def scenario():
+        controller = AdmissionController(limit=1, reserved=0, target_ms=1000)
+        await controller.acquire(NORMAL)
+        order = []
+        first = await queued(controller, NORMAL, order)
+        second = await queued(controller, NORMAL, order)
+        controller.release()                                   # hands the slot to first...
+        first.cancel()                                         # ...which is cancelled before it resumes
+        [outcome] = await asyncio.gather(first, return_exceptions=True)
+        if not isinstance(outcome, asyncio.CancelledError):
+            controller.release()                               # wait_for kept the slot (3.11); its holder frees it
+        await second
+        assert order[-1:] == [NORMAL] and controller.in_flight == 1
+        third = await queued(controller, LOW, order)
+        third.cancel()                                         # cancelled while still queued
+        await asyncio.gather(third, return_exceptions=True)
+        assert not any(controller.queues) and controller.in_flight == 1
+
+    run(scenario())
@@ -0,0 +1,70 @@
+import os
+import sys
+
+import aot
+import boot
+import lookup
+from pages import PageCache
+
+def test_snapshot_round_trip_and_stale_keys(tmp_path, monkeypatch):
+    monkeypatch.setattr(aot, "AOT_DIR", str(tmp_path))
+    aot.save("table", "key-1", {"a": 1})
+    assert aot.load("table", "key-1") == {"a": 1}
+    assert aot.load("table", "key-2") is None
+    assert aot.load("missing", "key-1") is None
+    (tmp_path / "table.pickle").write_bytes(b"not a pickle")
+    assert aot.load("table", "key-1") is None
+
+def test_pace_table_loads_its_snapshot_and_rebuilds_when_sources_change(tmp_path, monkeypatch):
+    monkeypatch.setattr(aot, "AOT_DIR", str(tmp_path))
+    lookup.save_pace_table()
+    expected = list(lookup.PACE_TABLE)
+    build_pace_response, built = lookup.build_pace_response, []
+    monkeypatch.setattr(lookup, "build_pace_response", lambda seconds: built.append(seconds) or build_pace_response(seconds))
+    for key, rebuilt in ((lookup.pace_table_key(), False), ("changed", True)):
+        monkeypatch.setattr(lookup, "pace_table_key", lambda: key)
+        monkeypatch.setattr(lookup, "PACE_TABLE", [])
+        monkeypatch.setattr(lookup, "API_PACE_TABLE", [])
+        monkeypatch.setattr(lookup, "PACE_SECONDS", {})
+        lookup.build_pace_table()
+        assert bool(built) == rebuilt
+        assert lookup.PACE_TABLE == expected
+
+def make_cache(tmp_path) -> PageCache:
+    pages = {"index": ("index.html", {"en": {"title": "Hello"}, "zh": {"title": "你好"}})}
+    return PageCache(str(tmp_path / "templates"), pages, asset_dir=str(tmp_path / "assets"))
+
+def test_pages_load_their_snapshot_and_rebuild_when_sources_change(tmp_path, monkeypatch):
+    monkeypatch.setattr(aot, "AOT_DIR", str(tmp_path / "build"))
+    template = tmp_path / "templates" / "index.html"
+    template.parent.mkdir()
+    template.write_text("<html><style>p {}</style><p>{{ translations.title }}</p></html>")
+    make_cache(tmp_path).save_snapshot()
+
+    cache = make_cache(tmp_path)
+    cache.build()
+    assert cache._templates is None   # served from the snapshot without rendering
+    assert "Hello" in cache.get("index", "en").bodies["identity"].decode()
+
+    template.write_text("<html><style>p {}</style><p>{{ translations.title }}!</p></html>")
+    os.utime(template, ns=(0, os.stat(template).st_mtime_ns + 10**9))
+    cache = make_cache(tmp_path)
+    cache.build()
+    assert cache._templates is not None
+    assert "你好!" in cache.get("index", "zh").bodies["identity"].decode()
+
+def test_lazy_import_defers_the_module_body(tmp_path, monkeypatch):
+    marker = tmp_path / "imported"
+    (tmp_path / "lazy_probe.py").write_text(f"open({str(marker)!r}, 'w').close()\nVALUE = 7\n")
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.delitem(sys.modules, "lazy_probe", raising=False)
+    module = boot.lazy_import("lazy_probe")
+    assert not marker.exists()
+    assert module.VALUE == 7
+    assert marker.exists()
+    assert boot.lazy_import("lazy_probe") is module
+
+def test_report_lists_marked_phases(monkeypatch):
+    monkeypatch.setattr(boot, "PHASES", [])
+    boot.mark("probe")
+    assert "probe" in boot.report()
@@ -0,0 +1,29 @@
+from fastapi.testclient import TestClient
+
+from app import app
+
+client = TestClient(app)
+
+def post_eph(body: str):
+    return client.post("/api/v1/eph", content=body, headers={"content-type": "application/json"})
+
+def test_non_finite_values_are_rejected_by_validation():
+    for body in ('{"mode": "time", "distance": 50, "elevation": 0, "eph": NaN}',
+                 '{"mode": "eph", "distance": Infinity, "elevation": 0, "time": "1:00"}'):
+        response = post_eph(body)
+        assert response.status_code == 400
+        assert response.json()["error"]["code"] == "invalid_request"
+
+def test_time_that_does_not_fit_is_a_400():
+    response = post_eph('{"mode": "time", "distance": 1e308, "elevation": 0, "eph": 1e-10}')
+    assert response.status_code == 400
+    assert response.json()["error"] == {"code": "invalid_request", "message": "Please enter valid values"}
+
+def test_infinite_eph_is_a_400():
+    response = post_eph('{"mode": "eph", "distance": 1e308, "elevation": 0, "time": "0:00:01"}')
+    assert response.status_code == 400
+    assert response.json()["error"]["code"] == "invalid_request"
+
+def test_valid_request_still_succeeds():
+    response = post_eph('{"mode": "eph", "distance": 50, "elevation": 2500, "time": "7:30:00"}')
+    assert response.status_code == 200 and response.json()["eph"] == 10.0
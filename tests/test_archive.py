@@ -0,0 +1,82 @@
+import csv
+import gzip
+import io
+import json
+import random
+
+import pytest
+
+import archive
+
+HEADER = "bib,distance,elevation,time\n"
+
+def csv_rows(count: int, seed: int = 3) -> list:
+    rng = random.Random(seed)
+    return [f"{i},{rng.uniform(5, 170):.{rng.randint(0, 3)}f}{rng.choice(['', 'km'])},{rng.randint(0, 9000)},"
+            f"{rng.randint(0, 40)}:{rng.randint(0, 59):02d}:{rng.randint(0, 59):02d}\n" for i in range(count)]
+
+def run(tmp_path, name: str, *args) -> str:
+    output = tmp_path / f"{name}.out"
+    assert archive.main([*args, "-o", str(output), "--quiet"]) == 0
+    return output.read_text()
+
+@pytest.fixture
+def small_shards(monkeypatch):
+    # Shards of a few hundred bytes and blocks of a few lines, so a small file crosses every boundary
+    monkeypatch.setattr(archive, "MIN_SHARD_BYTES", 1)
+    monkeypatch.setattr(archive, "BLOCK_LINES", 7)
+
+def test_shards_split_at_line_breaks(tmp_path):
+    path = tmp_path / "results.csv"
+    rows = csv_rows(60)
+    path.write_text(HEADER + "".join(rows))
+    header = {str(path): HEADER.encode()}
+    for shard_bytes in range(1, 200):
+        shards = archive.plan_shards([str(path)], shard_bytes, header)
+        lines = [line for shard in shards for line in archive.iter_shard_lines(shard)]
+        assert b"".join(lines).decode() == "".join(rows), shard_bytes
+        assert sum(shard.size for shard in shards) == path.stat().st_size
+
+def test_many_shards_and_workers_merge_in_input_order(tmp_path, small_shards):
+    path = tmp_path / "results.csv"
+    rows = csv_rows(500)
+    path.write_text(HEADER + "".join(rows))
+    single = run(tmp_path, "single", "eph", str(path), "--workers", "1", "--shard-mb", "1")
+    sharded = run(tmp_path, "sharded", "eph", str(path), "--workers", "3", "--shard-mb", "0.0005")
+    assert sharded == single
+    table = list(csv.DictReader(io.StringIO(sharded)))
+    assert [row["bib"] for row in table] == [str(i) for i in range(500)]
+    assert all(row["eph"] and not row["error"] for row in table)
+
+def test_gzipped_input_matches_plain(tmp_path, small_shards):
+    rows = "".join(csv_rows(100))
+    plain, packed = tmp_path / "a.csv", tmp_path / "b.csv.gz"
+    plain.write_text(HEADER + rows)
+    packed.write_bytes(gzip.compress((HEADER + rows).encode()))
+    assert run(tmp_path, "packed", "eph", str(packed), "--workers", "2") == \
+        run(tmp_path, "plain", "eph", str(plain), "--workers", "2", "--shard-mb", "0.0005")
+
+def test_malformed_rows_keep_their_place(tmp_path, small_shards):
+    path = tmp_path / "results.csv"
+    rows = csv_rows(20)
+    rows[3] = "3,50\n"
+    rows[9] = "9,abc,1000,5:00:00\n"
+    path.write_text(HEADER + "".join(rows))
+    table = list(csv.reader(io.StringIO(run(tmp_path, "out", "eph", str(path), "--workers", "2"))))[1:]
+    assert [row[0] for row in table] == [str(i) for i in range(20)]
+    # A short row is echoed as it is, so its error is the last field rather than under the header
+    assert table[3] == ["3", "50", "", "malformed_row"]
+    assert table[9][-2:] == ["", "invalid_distance_format"]
+    assert sum(bool(row[-1]) for row in table) == 2
+
+def test_ndjson_malformed_rows_keep_their_place(tmp_path, small_shards):
+    path = tmp_path / "runners.ndjson"
+    lines = [json.dumps({"bib": i, "distance": "42km", "elevation": 2000}) + "\n" for i in range(20)]
+    lines[5] = "not json\n"
+    lines[12] = json.dumps({"bib": 12, "distance": "42 laps", "elevation": 2000}) + "\n"
+    path.write_text("".join(lines))
+    records = [json.loads(line) for line in run(tmp_path, "out", "time", str(path), "--eph", "7.5").splitlines()]
+    assert records[5] == {"input": "not json", "error": "malformed_row"}
+    assert records[12]["error"] == "invalid_distance_format"
+    assert [record.get("bib") for record in records] == [i if i != 5 else None for i in range(20)]
+    assert records[0]["predicted_time"] and records[0]["error"] is None
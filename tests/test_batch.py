@@ -0,0 +1,37 @@
+import math
+
+import numpy as np
+from fastapi.testclient import TestClient
+
+from app import app
+from batch import calculate_eph_batch, calculate_time_batch, hours_to_hms_array, to_float_array
+
+client = TestClient(app)
+
+def test_to_float_array_maps_oversized_integers_to_nan():
+    column = to_float_array([10, 10 ** 400, "7.5"])
+    assert column[0] == 10 and math.isnan(column[1]) and column[2] == 7.5
+
+def test_eph_batch_flags_oversized_distance_row_only():
+    eph, codes = calculate_eph_batch([10 ** 400, 50], [0, 2500], ["1:00:00", "7:30:00"])
+    assert codes == ["invalid_value", None]
+    assert math.isnan(eph[0]) and eph[1] == 10.0
+
+def test_eph_batch_flags_infinite_eph():
+    _, codes = calculate_eph_batch([1e308], [0], ["0:00:01"])
+    assert codes == ["invalid_value"]
+
+def test_time_batch_flags_hours_beyond_int64_seconds():
+    times, codes = calculate_time_batch([50, 50], [0, 0], [1e-300, 10])
+    assert codes == ["invalid_value", None]
+    assert times == [None, "05:00:00"]
+
+def test_hours_to_hms_array_leaves_unformattable_hours_empty():
+    assert hours_to_hms_array(np.array([1.5, 1e300, -1.0, np.nan])) == ["01:30:00", None, None, None]
+
+def test_batch_route_answers_per_row_errors():
+    response = client.post("/calculate/batch", content=b'{"mode": "time", "distance": [' + b"9" * 400
+                           + b', 50], "elevation": [0, 0], "eph": [10, 1e-300]}',
+                           headers={"content-type": "application/json"})
+    assert response.status_code == 200
+    assert response.json()["errors"] == ["invalid_value", "invalid_value"]
@@ -0,0 +1,67 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import events
+from app import app
+
+TOKEN = "admin-secret"
+EVENTS = [
+    {"id": "utmb", "name": "UTMB", "date": "2025-08-29", "location": "Chamonix", "distance_km": 174, "elevation_m": 10000},
+    {"id": "zegama", "name": "Zegama Marathon", "date": "2025-05-18", "location": "Zegama", "distance_km": 42.195,
+     "elevation_m": 2736},
+    {"id": "hk100", "name": "Hong Kong 100", "date": "2025-01-18", "location": "Sai Kung", "distance_km": 103,
+     "elevation_m": 5300},
+    {"id": "lavaredo", "name": "Lavaredo Ultra Trail", "date": "2025-06-26", "location": "Cortina", "distance_km": 120,
+     "elevation_m": 5800},
+]
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(events, "EVENTS_DB", str(tmp_path / "events.sqlite3"))
+    monkeypatch.setattr(events, "EVENTS_ADMIN_TOKEN", TOKEN)
+    with TestClient(app) as client:
+        assert put(client, EVENTS).status_code == 200
+        yield client
+
+def put(client, items: list, token: str = TOKEN):
+    return client.put("/api/v1/events", json={"events": items}, headers={"authorization": f"Bearer {token}"})
+
+def search(client, **params) -> list:
+    return [event["id"] for event in client.get("/api/v1/events", params=params).json()["events"]]
+
+def test_search_filters_combine_in_date_order(client):
+    assert search(client) == ["hk100", "zegama", "lavaredo", "utmb"]
+    assert search(client, q="ultra") == ["lavaredo"]
+    assert search(client, q="ma") == ["zegama"]                  # word prefixes match
+    assert search(client, q="hong kong") == ["hk100"]
+    assert search(client, date_from="2025-05-18", date_to="2025-06-26") == ["zegama", "lavaredo"]
+    assert search(client, band="100+") == ["hk100", "lavaredo", "utmb"]
+    assert search(client, distance_min=100, distance_max=150) == ["hk100", "lavaredo"]
+    assert search(client, elevation_min=5500, q="trail") == ["lavaredo"]
+    assert search(client, q="nowhere") == []
+
+def test_invalid_filters_are_rejected(client):
+    assert client.get("/api/v1/events", params={"date_from": "18/05/2025"}).json()["error"]["code"] == "invalid_date"
+    assert client.get("/api/v1/events", params={"band": "5k"}).json()["error"]["code"] == "invalid_band"
+
+def test_delta_sync_returns_only_changes_after_since(client):
+    full = client.get("/api/v1/events/sync").json()
+    assert full["version"] == 4 and len(full["events"]) == 4
+    assert put(client, [{**EVENTS[0], "name": "UTMB Mont-Blanc"}]).json()["version"] == 5
+    assert client.delete("/api/v1/events/hk100", headers={"authorization": f"Bearer {TOKEN}"}).json()["version"] == 6
+    delta = client.get("/api/v1/events/sync", params={"since": 4}).json()
+    assert [event["name"] for event in delta["events"]] == ["UTMB Mont-Blanc"]
+    assert delta["deleted"] == ["hk100"] and delta["version"] == 6
+    assert client.get("/api/v1/events/sync", params={"since": 6}).json()["events"] == []
+
+def test_unchanged_catalog_answers_304(client):
+    etag = client.get("/api/v1/events").headers["etag"]
+    assert client.get("/api/v1/events", headers={"if-none-match": etag}).status_code == 304
+
+def test_writes_need_the_admin_token(client, monkeypatch):
+    assert put(client, EVENTS[:1], token="wrong").status_code == 401
+    assert client.delete("/api/v1/events/utmb").status_code == 401
+    monkeypatch.setattr(events, "EVENTS_ADMIN_TOKEN", "")
+    response = put(client, EVENTS[:1], token="")
+    assert response.status_code == 401 and response.json()["error"]["code"] == "unauthorized"
+    assert client.get("/api/v1/events/sync").json()["version"] == 4
@@ -0,0 +1,59 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import history
+from app import app
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(history, "HISTORY_DB", str(tmp_path / "history.sqlite3"))
+    with TestClient(app) as client:
+        token = client.post("/api/v1/history/runner-1/token").json()["token"]
+        client.headers["authorization"] = f"Bearer {token}"
+        yield client
+
+def sync(client, body: str, headers: dict = None):
+    return client.post("/api/v1/history/runner-1/sync", content=body,
+                       headers={"content-type": "application/json", **(headers or {})})
+
+def test_since_beyond_sqlite_integers_is_a_validation_error(client):
+    response = sync(client, '{"since": ' + str(2 ** 63) + '}')
+    assert response.status_code == 400
+    assert response.json()["error"]["code"] == "invalid_request"
+
+def test_created_at_beyond_sqlite_integers_is_a_validation_error(client):
+    response = sync(client, '{"changes": [{"id": "a", "created_at": ' + str(2 ** 64) + ', "item": {}}]}')
+    assert response.status_code == 400
+    assert response.json()["error"]["code"] == "invalid_request"
+
+def test_cursor_beyond_sqlite_integers_is_invalid(client):
+    response = client.get("/api/v1/history/runner-1", params={"before": f"{2 ** 63}:a"})
+    assert response.status_code == 400
+    assert response.json()["error"]["code"] == "invalid_cursor"
+
+def test_sync_within_range_succeeds(client):
+    response = sync(client, '{"changes": [{"id": "a", "created_at": 1700000000000, "item": {"eph": 10}}]}')
+    assert response.status_code == 200 and response.json()["cursor"] == 1
+
+def test_every_route_requires_the_user_token(client):
+    sync(client, '{"changes": [{"id": "a", "item": {"eph": 10}}]}')
+    for headers in ({"authorization": ""}, {"authorization": "Bearer wrong"}):
+        assert client.get("/api/v1/history/runner-1", headers=headers).status_code == 401
+        assert sync(client, "{}", headers=headers).json()["error"]["code"] == "unauthorized"
+        assert client.delete("/api/v1/history/runner-1/a", headers=headers).status_code == 401
+    # Another user's token does not open runner-1's history
+    other = client.post("/api/v1/history/runner-2/token").json()["token"]
+    assert client.get("/api/v1/history/runner-1", headers={"authorization": f"Bearer {other}"}).status_code == 401
+    assert [item["id"] for item in client.get("/api/v1/history/runner-1").json()["items"]] == ["a"]
+
+def test_a_user_id_is_claimed_once(client):
+    response = client.post("/api/v1/history/runner-1/token")
+    assert response.status_code == 409
+    assert response.json()["error"]["code"] == "user_taken"
+
+def test_delete_is_synced_as_a_tombstone(client):
+    sync(client, '{"changes": [{"id": "a", "item": {"eph": 10}}]}')
+    assert client.delete("/api/v1/history/runner-1/a").status_code == 204
+    changes = sync(client, '{"since": 1}').json()["changes"]
+    assert [(change["id"], change["deleted"]) for change in changes] == [("a", True)]
+    assert client.get("/api/v1/history/runner-1").json()["items"] == []
@@ -0,0 +1,30 @@
+import json
+
+from fastapi.testclient import TestClient
+
+import ingest
+from app import app
+
+client = TestClient(app)
+
+def test_stream_keeps_valid_rows_next_to_oversized_value():
+    body = ('{"bib": "1", "distance": 50, "elevation": 2500, "time": "7:30:00"}\n'
+            '{"bib": "2", "distance": ' + "9" * 400 + ', "elevation": 0, "time": "1:00:00"}\n')
+    response = client.post("/results/stream", content=body, headers={"content-type": "application/x-ndjson"})
+    assert response.status_code == 200
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert [(row["bib"], row["eph"], row["error"]) for row in rows] == [("1", 10.0, None), ("2", None, "invalid_value")]
+
+def test_failed_block_is_scored_row_by_row(monkeypatch):
+    real = ingest.calculate_eph_batch
+
+    def fail_on_blocks(distance, elevation, times):
+        if len(times) > 1:
+            raise RuntimeError("block failed")
+        if times == ["bad"]:
+            raise RuntimeError("row failed")
+        return real(distance, elevation, times)
+
+    monkeypatch.setattr(ingest, "calculate_eph_batch", fail_on_blocks)
+    eph, codes = ingest.score_block([50, 10], [2500, 0], ["7:30:00", "bad"])
+    assert eph[0] == 10.0 and codes == [None, "invalid_value"]
@@ -0,0 +1,79 @@
+import asyncio
+import sqlite3
+
+from fastapi.testclient import TestClient
+
+import jobs
+from app import app
+from jobs import DONE, QUEUED, RUNNING, JobRunner, JobStore
+
+def queued_store(tmp_path, count: int = 1) -> JobStore:
+    store = JobStore(str(tmp_path))
+    for i in range(count):
+        store.insert(f"job{i}", "batch", {}, "application/json")
+    return store
+
+def expire_leases(store: JobStore) -> None:
+    store.db.execute("UPDATE jobs SET lease_until = 0 WHERE status = ?", (RUNNING,))
+
+def test_expired_lease_is_requeued_and_claimable(tmp_path):
+    store = queued_store(tmp_path)
+    assert store.claim_next("killed-server", 1)["id"] == "job0"
+    assert store.requeue_expired(jobs.time.time()) == 0
+    expire_leases(store)
+    assert store.requeue_expired(jobs.time.time()) == 1
+    assert store.get("job0")["status"] == QUEUED
+    assert store.claim_next("new-server", 1)["owner"] == "new-server"
+
+def test_expired_leases_do_not_count_against_the_limit(tmp_path):
+    store = queued_store(tmp_path, 2)
+    store.claim_next("killed-server", 1)
+    assert store.claim_next("new-server", 1) is None
+    expire_leases(store)
+    assert store.claim_next("new-server", 1)["id"] == "job1"
+
+def test_finish_by_a_runner_that_lost_the_lease_is_ignored(tmp_path):
+    store = queued_store(tmp_path)
+    store.claim_next("old", 1)
+    expire_leases(store)
+    store.requeue_expired(jobs.time.time())
+    store.claim_next("new", 1)
+    store.finish("job0", "old", DONE)
+    assert store.get("job0")["status"] == RUNNING
+    store.finish("job0", "new", DONE)
+    assert store.get("job0")["status"] == DONE
+
+def test_store_without_leases_is_migrated_and_its_running_jobs_requeued(tmp_path):
+    db = sqlite3.connect(str(tmp_path / "jobs.sqlite3"))
+    db.execute("CREATE TABLE jobs (id TEXT PRIMARY KEY, kind TEXT NOT NULL, params TEXT NOT NULL, "
+               "media_type TEXT NOT NULL, status TEXT NOT NULL, owner INTEGER, created_at REAL NOT NULL, "
+               "started_at REAL, finished_at REAL, expires_at REAL, error_code TEXT, error_message TEXT)")
+    db.execute("INSERT INTO jobs (id, kind, params, media_type, status, owner, created_at) "
+               "VALUES ('job0', 'batch', '{}', 'application/json', 'running', 1, 0)")
+    db.commit()
+    db.close()
+    store = JobStore(str(tmp_path))
+    assert store.requeue_expired(jobs.time.time()) == 1
+    assert store.get("job0")["status"] == QUEUED
+
+def test_web_workers_leave_jobs_to_the_dedicated_runner(tmp_path, monkeypatch):
+    monkeypatch.setattr(jobs, "JOBS_DIR", str(tmp_path))
+    monkeypatch.setattr(jobs, "INLINE_RUNNER", False)
+    with TestClient(app) as client:
+        job_id = client.post("/jobs/splits", params={"pace": "4:30", "distance_m": 1000}).json()["id"]
+        assert client.get(f"/jobs/{job_id}").json()["status"] == QUEUED
+    # Recycling the web worker neither ran nor touched the job
+    assert JobStore(str(tmp_path)).get(job_id)["status"] == QUEUED
+
+    async def run_jobs():
+        runner = JobRunner(str(tmp_path), 1)
+        await runner.start()
+        for _ in range(200):
+            if (await asyncio.to_thread(runner.store.get, job_id))["status"] == DONE:
+                break
+            await asyncio.sleep(0.05)
+        await runner.stop()
+
+    asyncio.run(run_jobs())
+    assert JobStore(str(tmp_path)).get(job_id)["status"] == DONE
+    assert len((tmp_path / f"{job_id}.result").read_text().splitlines()) == 10
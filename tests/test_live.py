@@ -0,0 +1,34 @@
+import json
+
+from fastapi.testclient import TestClient
+
+import live
+from app import app
+
+client = TestClient(app)
+
+def exchange(websocket, message: dict) -> dict:
+    websocket.send_text(json.dumps(message))
+    return json.loads(websocket.receive_text())
+
+def test_elapsed_beyond_the_cap_is_rejected_and_not_broadcast():
+    with client.websocket_connect("/track/live") as websocket:
+        assert exchange(websocket, {"type": "start", "pace": "4:00", "distance_m": 400})["type"] == "started"
+        reply = exchange(websocket, {"type": "split", "elapsed": 1e300})
+        assert reply["type"] == "error" and reply["error"]["code"] == "invalid_elapsed"
+        update = exchange(websocket, {"type": "split", "elapsed": 24.5})
+        assert update["elapsed_time"] == "00:24.5" and update["index"] == 1
+
+def test_mark_below_one_meter_is_rejected():
+    with client.websocket_connect("/track/live") as websocket:
+        exchange(websocket, {"type": "start", "pace": "4:00", "distance_m": 400})
+        reply = exchange(websocket, {"type": "split", "elapsed": 1, "distance_m": 1e-300})
+        assert reply["error"]["code"] == "invalid_elapsed"
+
+def test_binary_frame_is_answered_with_an_error():
+    with client.websocket_connect("/track/live") as websocket:
+        websocket.send_bytes(b'{"type": "start", "pace": "4:00"}')
+        assert json.loads(websocket.receive_text())["error"]["code"] == "invalid_message"
+        assert exchange(websocket, {"type": "start", "pace": "4:00", "distance_m": 400})["type"] == "started"
+    # Closing the socket ends the session
+    assert not live.sessions
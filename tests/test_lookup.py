@@ -0,0 +1,37 @@
+import pytest
+
+import lookup
+from calculations import CalculationError, calculate_eph, parse_pace
+
+def outcome(fn, pace: str):
+    try:
+        return fn(pace), None
+    except CalculationError as e:
+        return None, e.code
+
+def test_every_table_pace_matches_parse_pace():
+    lookup.build_pace_table()
+    assert len(lookup.PACE_SECONDS) == 61 * 61
+    for pace, seconds in lookup.PACE_SECONDS.items():
+        assert parse_pace(pace) == seconds
+
+@pytest.mark.parametrize("pace", ["4:30", "04:30", "4:5", "+4:30", " 4:30", "61", "60:60", "-1:00", "abc", "", "4:30:00"])
+def test_lookup_matches_parse_pace_off_the_table(pace):
+    assert outcome(lookup.lookup_pace_seconds, pace) == outcome(parse_pace, pace)
+
+def test_table_responses_match_a_fresh_build():
+    lookup.build_pace_table()
+    for seconds in (0, 1, 270, 3599, lookup.MAX_PACE_SECONDS):
+        assert lookup.PACE_TABLE[seconds] == lookup.build_pace_response(seconds).model_dump_json().encode()
+
+def test_snapshot_and_fresh_tables_are_identical(monkeypatch):
+    lookup.build_pace_table()
+    tables = (list(lookup.PACE_TABLE), list(lookup.API_PACE_TABLE), dict(lookup.PACE_SECONDS))
+    monkeypatch.setattr(lookup, "PACE_TABLE", [])
+    monkeypatch.setattr(lookup, "API_PACE_TABLE", [])
+    monkeypatch.setattr(lookup, "PACE_SECONDS", {})
+    lookup.build_pace_table(use_snapshot=False)
+    assert (lookup.PACE_TABLE, lookup.API_PACE_TABLE, lookup.PACE_SECONDS) == tables
+
+def test_cached_eph_matches_calculate_eph():
+    assert lookup.cached_calculate_eph(50, 2500, " 7:30:00 ") == calculate_eph(50, 2500, "7:30:00")
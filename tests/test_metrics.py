@@ -0,0 +1,44 @@
+import os
+
+import pytest
+from fastapi.testclient import TestClient
+
+import metrics
+from app import app
+
+client = TestClient(app)
+
+def test_router_error_codes_get_their_own_counters():
+    client.get("/health")
+    codes = metrics.registry.error_codes
+    assert codes == sorted(codes[:-1]) + [metrics.OTHER]
+    for code in ("invalid_request", "invalid_split", "queue_full", "overloaded", "invalid_reference",
+                 "invalid_distance_format", "upload_too_large"):
+        assert code in codes
+
+def test_recorded_code_is_rendered():
+    client.post("/api/v1/eph", content=b"{}", headers={"content-type": "application/json"})
+    assert 'route="/api/v1/eph",code="invalid_request"' in client.get("/metrics").text
+
+def test_registering_after_the_first_request_fails():
+    client.get("/health")
+    with pytest.raises(RuntimeError):
+        metrics.register_error_codes("late_code")
+
+def test_directory_drops_stale_files_and_sums_forked_workers(tmp_path, monkeypatch):
+    client.get("/health")
+    monkeypatch.setattr(metrics.registry, "directory", "")
+    monkeypatch.setattr(metrics.registry, "counters", None)
+    monkeypatch.setenv("METRICS_DIR", "")
+    stale = tmp_path / "12345.metrics"
+    stale.write_bytes(b"\0" * 64)
+    metrics.use_directory(str(tmp_path))
+    assert not stale.exists()
+
+    pid = os.fork()
+    if not pid:
+        client.get("/health")
+        os._exit(0)
+    assert os.waitstatus_to_exitcode(os.waitpid(pid, 0)[1]) == 0
+    assert (tmp_path / f"{pid}.metrics").exists()
+    assert 'eph_http_requests_total{route="/health"} 1' in metrics.registry.render()
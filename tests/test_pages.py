@@ -0,0 +1,22 @@
+import re
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import app
+
+pytest.importorskip("brotli")
+
+client = TestClient(app)
+
+def test_page_is_served_brotli_compressed():
+    response = client.get("/", headers={"accept-encoding": "br, gzip"})
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "br"
+
+def test_index_checks_numbers_before_posting():
+    for lang, message in (("en", "Please enter valid values"), ("zh", "請輸入有效的數值")):
+        html = client.get(f"/?lang={lang}").text
+        script = client.get(re.search(r'<script src="([^"]+)"', html).group(1)).text
+        assert "Number.isFinite(payload.distance)" in script
+        assert f"showError('{message}')" in script
@@ -0,0 +1,19 @@
+import math
+
+from parsing import CalculationError, parse_distance, parse_distances
+
+def test_oversized_integer_distance_is_a_row_error():
+    values, codes = parse_distances([10, 10 ** 400, "5km"])
+    assert values[0] == 10 and math.isnan(values[1]) and values[2] == 5
+    assert codes == [None, "invalid_distance_format", None]
+
+def test_bulk_distances_follow_the_scalar_rules_on_mixed_columns():
+    for column in (["-0", "10"], ["-0", "10km"], [True, 5], [-0.0, 5], [5, 2.5, "3km"], ["10", "1e3"]):
+        values, codes = parse_distances(column)
+        for value, got, code in zip(column, values.tolist(), codes):
+            try:
+                expected = parse_distance(value if isinstance(value, str) else str(value))
+            except CalculationError as e:
+                assert code == e.code and math.isnan(got)
+            else:
+                assert code is None and got == expected
@@ -0,0 +1,38 @@
+from fastapi.testclient import TestClient
+
+from app import app
+
+client = TestClient(app)
+
+COURSE = {"distance_km": [0, 5, 10], "elevation_m": [100, 400, 100]}
+
+def plan(body: str):
+    return client.post("/api/v1/plan", content=body, headers={"content-type": "application/json"})
+
+def error_code(response) -> str:
+    assert response.status_code == 400
+    return response.json()["error"]["code"]
+
+def test_nan_split_km_is_rejected():
+    assert error_code(plan('{"distance_km": [0, 5, 10], "elevation_m": [100, 400, 100], "eph": 6, "split_km": NaN}')) \
+        == "invalid_split"
+
+def test_non_finite_eph_is_rejected():
+    assert error_code(plan('{"distance_km": [0, 5, 10], "elevation_m": [100, 400, 100], "eph": NaN}')) \
+        == "non_positive_eph"
+
+def test_nan_from_km_is_rejected():
+    assert error_code(plan('{"distance_km": [0, 5, 10], "elevation_m": [100, 400, 100], "eph": 6, "from_km": NaN}')) \
+        == "invalid_position"
+
+def test_tiny_eph_is_out_of_range_not_negative():
+    response = client.post("/api/v1/plan", json={**COURSE, "eph": 1e-300})
+    assert error_code(response) == "plan_out_of_range"
+
+def test_huge_target_time_is_out_of_range():
+    response = client.post("/api/v1/plan", json={**COURSE, "target_time": "99999999999999999999:00"})
+    assert error_code(response) == "plan_out_of_range"
+
+def test_valid_plan_still_succeeds():
+    response = client.post("/api/v1/plan", json={**COURSE, "eph": 8})
+    assert response.status_code == 200 and response.json()["finish_time"] == "01:37:30"
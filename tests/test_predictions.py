@@ -0,0 +1,23 @@
+from fastapi.testclient import TestClient
+
+from app import app
+
+client = TestClient(app)
+
+def predictions(**params):
+    return client.get("/api/v1/predictions", params=params)
+
+def test_reference_time_beyond_the_cap_is_rejected():
+    response = predictions(distance=50, time="99999999999999999999:00")
+    assert response.status_code == 400
+    assert response.json()["error"]["code"] == "invalid_reference"
+
+def test_distance_that_rounds_to_zero_is_rejected():
+    response = predictions(distance=0.0001, time="1:00:00")
+    assert response.status_code == 400
+    assert response.json()["error"]["code"] == "invalid_reference"
+
+def test_longest_reference_still_formats_every_cell():
+    response = predictions(distance=0.001, time="1000:00:00", exponent=1.2)
+    assert response.status_code == 200
+    assert all(not cell["time"].startswith("-") for cell in response.json()["predictions"])
@@ -0,0 +1,17 @@
+from fastapi.testclient import TestClient
+
+import profiling
+from app import app
+
+client = TestClient(app)
+
+def test_debug_endpoints_stay_closed_without_a_token(monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILE_SAMPLE_RATE", 1.0)
+    monkeypatch.setattr(profiling, "PROFILE_TOKEN", "")
+    assert client.get("/debug/slow-requests").status_code == 404
+    assert client.get("/debug/profiles/x.pstats", headers={"x-profile": ""}).status_code == 404
+
+def test_debug_endpoints_need_the_configured_token(monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILE_TOKEN", "secret")
+    assert client.get("/debug/slow-requests", headers={"x-profile": "wrong"}).status_code == 404
+    assert client.get("/debug/slow-requests", headers={"x-profile": "secret"}).status_code == 200
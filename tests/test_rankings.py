@@ -0,0 +1,55 @@
+import pickle
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+import rankings
+from app import app
+from rankings import QuantileSketch, RankingIndex
+
+client = TestClient(app)
+
+def sample(seed: int = 7, size: int = 200_000) -> np.ndarray:
+    return np.random.default_rng(seed).lognormal(np.log(6.0), 0.3, size)
+
+@pytest.mark.parametrize("q", [0.001, 0.01, 0.1, 0.5, 0.9, 0.99, 0.999])
+def test_quantiles_and_cdf_track_the_exact_values(q):
+    values = sample()
+    sketch = QuantileSketch()
+    for chunk in np.array_split(values, 37):
+        sketch.add(chunk)
+    assert sketch.count == len(values)
+    exact = np.quantile(values, q)
+    # Rank error: the share of values below the estimate is within 0.1 points of q
+    assert abs(np.mean(values < sketch.quantile(q)) - q) < 0.001
+    assert abs(sketch.cdf(exact) - q) < 0.001
+
+def test_merged_digests_match_one_digest_over_all_values():
+    values = sample()
+    whole, merged = QuantileSketch(), QuantileSketch()
+    whole.add(values)
+    for part in np.array_split(values, 5):
+        sketch = QuantileSketch()
+        sketch.add(part)
+        merged.merge(pickle.loads(pickle.dumps(sketch)))
+    assert merged.count == whole.count
+    assert len(merged.means) <= rankings.COMPRESSION
+    for q in (0.01, 0.25, 0.5, 0.75, 0.99):
+        assert merged.quantile(q) == pytest.approx(whole.quantile(q), rel=0.005)
+
+def test_flushed_and_local_results_rank_together(tmp_path):
+    index = RankingIndex(str(tmp_path))
+    index.add("utmb", np.full(3, 170.0), np.array([4.0, 5.0, 6.0]))
+    index.flush()
+    index.add("utmb", np.full(1, 170.0), np.array([7.0]))
+    result = index.rank("utmb", "100+", 6.5)
+    assert result["count"] == 4
+    assert result["below"] == pytest.approx(0.75, abs=0.1)
+    assert RankingIndex(str(tmp_path)).rank("utmb", rankings.ALL, 6.5)["count"] == 3
+
+@pytest.mark.parametrize("eph", ["nan", "inf", "-inf"])
+def test_non_finite_eph_is_rejected(eph):
+    response = client.get("/api/v1/rankings", params={"eph": eph})
+    assert response.status_code == 400
+    assert response.json()["error"]["code"] == "invalid_request"
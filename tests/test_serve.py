@@ -0,0 +1,79 @@
+import os
+import re
+import signal
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+pytestmark = pytest.mark.skipif(not hasattr(os, "fork"), reason="serve.py forks its workers")
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def wait_for(condition, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        result = condition()
+        if result:
+            return result
+        time.sleep(0.1)
+    raise AssertionError("timed out")
+
+def get(port: int, path: str) -> str:
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}{path}", timeout=5) as response:
+            return response.read().decode()
+    except OSError:
+        return ""
+
+@pytest.fixture
+def server(tmp_path):
+    port = free_port()
+    metrics_dir = tmp_path / "metrics"
+    metrics_dir.mkdir()
+    (metrics_dir / "1.metrics").write_bytes(b"\0" * 64)
+    log = open(tmp_path / "serve.log", "w+")
+    process = subprocess.Popen(
+        [sys.executable, "serve.py", "--host", "127.0.0.1", "--port", str(port), "--workers", "2",
+         "--max-requests", "5", "--metrics-dir", str(metrics_dir), "--log-level", "warning"],
+        cwd=ROOT, stderr=log, env={**os.environ, "AOT_DIR": str(tmp_path / "build")})
+    try:
+        wait_for(lambda: get(port, "/health"))
+        yield process, port, metrics_dir, lambda: (log.seek(0), log.read())[1]
+    finally:
+        if process.poll() is None:
+            # SIGTERM, so the master stops its workers instead of orphaning them
+            process.terminate()
+            try:
+                process.wait(timeout=60)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.wait()
+        log.close()
+
+def test_workers_share_metrics_and_are_recycled(server):
+    process, port, metrics_dir, read_log = server
+    assert not (metrics_dir / "1.metrics").exists()
+    for _ in range(30):
+        assert get(port, "/health")
+    wait_for(lambda: "respawning" in read_log())
+    totals = wait_for(lambda: re.search(r'eph_http_requests_total\{route="/health"\} (\d+)', get(port, "/metrics")))
+    # No worker lives past 6 requests, so this counts files of recycled workers too
+    assert int(totals.group(1)) >= 30
+
+def test_reload_keeps_serving_and_sigterm_stops(server):
+    process, port, metrics_dir, read_log = server
+    process.send_signal(signal.SIGHUP)
+    wait_for(lambda: "reloaded 2 workers" in read_log())
+    assert get(port, "/health")
+    process.send_signal(signal.SIGTERM)
+    assert process.wait(timeout=60) == 0
+    assert "stopped" in read_log()
@@ -0,0 +1,45 @@
+import csv
+import io
+import json
+
+from fastapi.testclient import TestClient
+
+import splits
+from app import app
+
+client = TestClient(app)
+
+PLAN = {"pace": "4:30", "distance_m": 5050.5, "lap_m": 400, "split_m": 1}
+
+def paged_rows(limit: int) -> list:
+    rows, offset = [], 0
+    while offset is not None:
+        page = client.get("/track/splits", params={**PLAN, "offset": offset, "limit": limit}).json()
+        rows += page["splits"]
+        offset = page["next_offset"]
+    return rows
+
+def test_pages_cover_the_table_once():
+    rows = paged_rows(1000)
+    assert rows == paged_rows(777)
+    assert [row["index"] for row in rows] == list(range(1, 5052))
+    assert rows[-1]["distance_m"] == 5050.5
+    assert rows[-1]["split_seconds"] == 0.14
+
+def test_streamed_formats_match_the_pages():
+    assert 5051 > splits.BLOCK_ROWS * 2
+    rows = paged_rows(splits.MAX_PAGE_SIZE)
+    ndjson = client.get("/track/splits", params={**PLAN, "output": "ndjson"}).text
+    assert [json.loads(line) for line in ndjson.splitlines()] == rows
+    table = list(csv.DictReader(io.StringIO(client.get("/track/splits", params={**PLAN, "output": "csv"}).text)))
+    assert [{key: str(value) for key, value in row.items()} for row in rows] == table
+
+def test_offset_past_the_end_is_an_empty_last_page():
+    page = client.get("/track/splits", params={**PLAN, "offset": 9000}).json()
+    assert page["splits"] == [] and page["next_offset"] is None
+    assert page["split_count"] == 5051
+
+def test_invalid_plans_report_their_code():
+    for params, code in (({"distance_m": "nan"}, "invalid_distance"), ({"lap_m": 20}, "invalid_lap"),
+                         ({"split_m": 300}, "invalid_split"), ({"pace": "61:00"}, "pace_out_of_range")):
+        assert client.get("/track/splits", params={**PLAN, **params}).json()["error"] == code
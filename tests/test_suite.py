@@ -0,0 +1,17 @@
+from benchmarks import suite
+
+RESULTS = {"metrics": {"micro parse_pace ns": {"value": 100.0, "better": suite.LOWER}}}
+
+def run(monkeypatch, tmp_path, *args):
+    monkeypatch.setattr(suite, "run_suite", lambda quick=False: RESULTS)
+    return suite.main(["--output", str(tmp_path / "latest.json"), "--baseline", str(tmp_path / "baseline.json"), *args])
+
+def test_missing_baseline_fails_with_explicit_threshold(monkeypatch, tmp_path):
+    assert run(monkeypatch, tmp_path, "--threshold", "0.25") == 1
+
+def test_missing_baseline_is_only_reported_by_default(monkeypatch, tmp_path):
+    assert run(monkeypatch, tmp_path) == 0
+
+def test_saved_baseline_is_compared(monkeypatch, tmp_path):
+    assert run(monkeypatch, tmp_path, "--save-baseline") == 0
+    assert run(monkeypatch, tmp_path, "--threshold", "0.25") == 0